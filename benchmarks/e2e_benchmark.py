@@ -0,0 +1,435 @@
+"""
+Offline end-to-end benchmark for the Universal Video Downloader API.
+
+Generates test clips with the bundled imageio_ffmpeg binary, serves them from a
+local HTTP server (a DASH manifest over the mp4 plus an HLS master playlist, both
+declaring codecs and resolution so the API's format selection can pick them) so
+yt-dlp resolves them through its generic extractor, starts the API in a scratch
+directory and drives:
+
+    POST /api/video-info, POST /api/download (whole video and a clip range), WS /ws/download/{id},
+    POST /api/upload-video, POST /api/convert-video, WS /ws/convert/{id}
+
+at a configurable concurrency. Results (throughput, p50/p95/p99 latency, errors,
+peak server RSS) are written as JSON so runs can be compared between commits.
+A scenario in which every request fails is flagged and makes the run exit 1:
+
+    python benchmarks/e2e_benchmark.py --requests 20 --concurrency 4 --output bench.json
+    python benchmarks/e2e_benchmark.py --output new.json --compare bench.json
+"""
+import argparse
+import asyncio
+import functools
+import http.server
+import json
+import math
+import os
+import platform
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+import imageio_ffmpeg
+import websockets
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FFMPEG_PATH = imageio_ffmpeg.get_ffmpeg_exe()
+ALL_SCENARIOS = ["video_info", "download", "download_clip", "download_hls", "ws_download", "upload", "convert", "ws_convert"]
+# The clip is encoded as H.264 High@3.0 + AAC-LC, which is what these RFC 6381 codec strings declare
+CLIP_CODECS = "avc1.64001e,mp4a.40.2"
+
+
+# ============================================
+# Fixtures: test clips & local media server
+# ============================================
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def generate_clips(media_dir: str, duration: int, resolution: str) -> Dict[str, str]:
+    """
+    Render a synthetic H.264/AAC clip plus manifests that describe it. yt-dlp reports no
+    codecs or height for a bare .mp4 or media playlist, and the API's format selection
+    skips such formats, so downloads go through a DASH manifest (one progressive
+    representation pointing at clip.mp4) and an HLS master playlist instead.
+    """
+    clip_path = os.path.join(media_dir, "clip.mp4")
+    subprocess.run([
+        FFMPEG_PATH, '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={resolution}:rate=30',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100',
+        '-t', str(duration),
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-profile:v', 'high', '-level', '3.0', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-shortest', '-movflags', '+faststart',
+        '-y', clip_path
+    ], check=True)
+    width, height = resolution.split("x")
+    bandwidth = os.path.getsize(clip_path) * 8 // max(1, duration)
+
+    dash_path = os.path.join(media_dir, "clip.mpd")
+    with open(dash_path, "w") as f:
+        f.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{duration}S" '
+            'minBufferTime="PT2S" profiles="urn:mpeg:dash:profile:isoff-on-demand:2011">\n'
+            '  <Period>\n    <AdaptationSet mimeType="video/mp4">\n'
+            f'      <Representation id="{height}p" codecs="{CLIP_CODECS}" width="{width}" height="{height}" bandwidth="{bandwidth}">\n'
+            '        <BaseURL>clip.mp4</BaseURL>\n'
+            '      </Representation>\n    </AdaptationSet>\n  </Period>\n</MPD>\n'
+        )
+
+    hls_dir = os.path.join(media_dir, "hls")
+    os.makedirs(hls_dir, exist_ok=True)
+    subprocess.run([
+        FFMPEG_PATH, '-v', 'error', '-i', clip_path,
+        '-c', 'copy', '-f', 'hls', '-hls_time', '2', '-hls_playlist_type', 'vod',
+        '-y', os.path.join(hls_dir, "stream.m3u8")
+    ], check=True)
+    with open(os.path.join(hls_dir, "index.m3u8"), "w") as f:
+        f.write(f'#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={resolution},CODECS="{CLIP_CODECS}"\nstream.m3u8\n')
+    return {"clip": clip_path, "dash": dash_path, "hls": os.path.join(hls_dir, "index.m3u8")}
+
+def media_duration(path: str) -> Optional[float]:
+    """Duration from ffmpeg's own banner (imageio_ffmpeg ships no ffprobe)"""
+    output = subprocess.run([FFMPEG_PATH, '-hide_banner', '-i', path], capture_output=True, text=True).stderr
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", output)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def start_media_server(media_dir: str, port: int) -> http.server.ThreadingHTTPServer:
+    class QuietHandler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    handler = functools.partial(QuietHandler, directory=media_dir)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, name="media-server", daemon=True).start()
+    return server
+
+
+# ============================================
+# API server process
+# ============================================
+class ApiServer:
+    def __init__(self, work_dir: str, port: int):
+        self.work_dir = work_dir
+        self.port = port
+        self.process: Optional[subprocess.Popen] = None
+        self.peak_rss_kb = 0
+        self.startup_seconds: Optional[float] = None
+        self._stop = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self):
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        started = time.perf_counter()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--log-level", "warning"],
+            cwd=self.work_dir, env=env,
+        )
+        async with httpx.AsyncClient() as client:
+            for _ in range(600):
+                if self.process.poll() is not None:
+                    raise RuntimeError("API server exited during startup")
+                try:
+                    await client.get(f"{self.base_url}/", timeout=1)
+                    break
+                except httpx.HTTPError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("API server did not become ready")
+        self.startup_seconds = time.perf_counter() - started
+        threading.Thread(target=self._sample_rss, name="rss-sampler", daemon=True).start()
+
+    def _sample_rss(self):
+        # VmHWM is the kernel's own peak-RSS watermark; fall back to sampling VmRSS
+        status_path = f"/proc/{self.process.pid}/status"
+        while not self._stop.wait(0.2):
+            try:
+                with open(status_path) as f:
+                    for line in f:
+                        if line.startswith(("VmHWM:", "VmRSS:")):
+                            self.peak_rss_kb = max(self.peak_rss_kb, int(line.split()[1]))
+            except OSError:
+                return
+
+    def stop(self):
+        self._stop.set()
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+# ============================================
+# Scenarios
+# ============================================
+class ScenarioContext:
+    def __init__(self, api: ApiServer, media_url: str, clip_path: str, args):
+        self.api = api
+        self.media_url = media_url
+        self.clip_path = clip_path
+        self.args = args
+        self.client = httpx.AsyncClient(base_url=api.base_url, timeout=args.timeout)
+        self.uploaded_ids: List[str] = []
+
+    @property
+    def ws_url(self) -> str:
+        return self.api.base_url.replace("http://", "ws://")
+
+async def op_video_info(ctx: ScenarioContext, i: int):
+    r = await ctx.client.post("/api/video-info", json={"url": f"{ctx.media_url}/clip.mp4"})
+    r.raise_for_status()
+
+async def op_download(ctx: ScenarioContext, i: int):
+    r = await ctx.client.post("/api/download", json={"url": f"{ctx.media_url}/clip.mpd", "quality": ctx.args.quality, "type": "video"})
+    r.raise_for_status()
+
+async def op_download_clip(ctx: ScenarioContext, i: int):
+    # Clip ranges run through yt-dlp's ffmpeg downloader; check the file really is the range asked for
+    end = min(2, ctx.args.clip_duration)
+    r = await ctx.client.post("/api/download", json={"url": f"{ctx.media_url}/clip.mpd", "quality": ctx.args.quality, "type": "video", "start": 0, "end": end})
+    r.raise_for_status()
+    fd, path = tempfile.mkstemp(suffix=".mp4")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(r.content)
+        probe = subprocess.run([FFMPEG_PATH, '-v', 'error', '-i', path, '-f', 'null', '-'], capture_output=True, text=True)
+        if probe.returncode != 0:
+            raise RuntimeError(f"clip is not decodable: {probe.stderr.strip()[-200:]}")
+        duration = media_duration(path)
+    finally:
+        os.remove(path)
+    if duration is None or abs(duration - end) > 1.0:
+        raise RuntimeError(f"clip lasts {duration}s, expected about {end}s")
+
+async def op_download_hls(ctx: ScenarioContext, i: int):
+    r = await ctx.client.post("/api/download", json={"url": f"{ctx.media_url}/hls/index.m3u8", "quality": ctx.args.quality, "type": "video"})
+    r.raise_for_status()
+
+async def op_ws_download(ctx: ScenarioContext, i: int):
+    async with websockets.connect(f"{ctx.ws_url}/ws/download/bench-{uuid.uuid4()}", max_size=None) as ws:
+        await ws.send(json.dumps({"url": f"{ctx.media_url}/clip.mpd", "type": "video", "quality": ctx.args.quality}))
+        async for raw in ws:
+            msg = json.loads(raw)
+            if msg.get("status") == "completed":
+                return
+            if msg.get("status") in ("error", "cancelled"):
+                raise RuntimeError(msg.get("message"))
+    raise RuntimeError("websocket closed before completion")
+
+async def op_upload(ctx: ScenarioContext, i: int):
+    with open(ctx.clip_path, "rb") as f:
+        r = await ctx.client.post("/api/upload-video", files={"file": ("clip.mp4", f, "video/mp4")})
+    r.raise_for_status()
+    ctx.uploaded_ids.append(r.json()["file_id"])
+
+async def op_convert(ctx: ScenarioContext, i: int):
+    file_id = ctx.uploaded_ids[i % len(ctx.uploaded_ids)]
+    r = await ctx.client.post("/api/convert-video", json={"filename": file_id, "output_format": "mp4", "quality": "smallest", "resolution": "original"})
+    r.raise_for_status()
+
+async def op_ws_convert(ctx: ScenarioContext, i: int):
+    file_id = ctx.uploaded_ids[-(i % len(ctx.uploaded_ids)) - 1]
+    async with websockets.connect(f"{ctx.ws_url}/ws/convert/bench-{uuid.uuid4()}", max_size=None) as ws:
+        await ws.send(json.dumps({"filename": file_id, "output_format": "webm", "quality": "smallest", "resolution": "original"}))
+        async for raw in ws:
+            msg = json.loads(raw)
+            if msg.get("status") == "completed":
+                return
+            if msg.get("status") == "error":
+                raise RuntimeError(msg.get("message"))
+    raise RuntimeError("websocket closed before completion")
+
+SCENARIO_OPS: Dict[str, Callable] = {
+    "video_info": op_video_info,
+    "download": op_download,
+    "download_clip": op_download_clip,
+    "download_hls": op_download_hls,
+    "ws_download": op_ws_download,
+    "upload": op_upload,
+    "convert": op_convert,
+    "ws_convert": op_ws_convert,
+}
+
+
+# ============================================
+# Runner & reporting
+# ============================================
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+async def run_scenario(ctx: ScenarioContext, name: str, count: int, concurrency: int) -> Dict[str, Any]:
+    op = SCENARIO_OPS[name]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await op(ctx, i)
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    wall_started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    wall = time.perf_counter() - wall_started
+
+    latencies.sort()
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "count": count,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "failed": count > 0 and not latencies,
+        "error_samples": errors[:5],
+        "wall_seconds": round(wall, 3),
+        "throughput_per_sec": round(len(latencies) / wall, 3) if wall > 0 else None,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "max": ms(latencies[-1]) if latencies else None,
+        },
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def print_comparison(current: Dict[str, Any], baseline: Dict[str, Any]):
+    print(f"\n{'scenario':<14} {'metric':<12} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, result in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base or base.get("failed") or result["failed"]:
+            continue
+        rows = [("throughput", base["throughput_per_sec"], result["throughput_per_sec"])]
+        rows += [(p, base["latency_ms"][p], result["latency_ms"][p]) for p in ("p50", "p95", "p99")]
+        for metric, old, new in rows:
+            change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else "n/a"
+            print(f"{name:<14} {metric:<12} {old if old is not None else '-':>12} {new if new is not None else '-':>12} {change:>9}")
+    old_rss = baseline.get("server", {}).get("peak_rss_mb")
+    new_rss = current["server"]["peak_rss_mb"]
+    if old_rss:
+        print(f"{'server':<14} {'peak_rss_mb':<12} {old_rss:>12} {new_rss:>12} {(new_rss - old_rss) / old_rss * 100:+8.1f}%")
+
+async def main_async(args) -> Dict[str, Any]:
+    scenarios = args.scenarios.split(",") if args.scenarios else ALL_SCENARIOS
+    unknown = set(scenarios) - set(SCENARIO_OPS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    scratch = tempfile.mkdtemp(prefix="uvd-bench-")
+    media_dir = os.path.join(scratch, "media")
+    work_dir = os.path.join(scratch, "server")
+    os.makedirs(media_dir)
+    os.makedirs(work_dir)
+
+    media_server = None
+    api = ApiServer(work_dir, args.port or free_port())
+    try:
+        print(f"Generating {args.clip_duration}s {args.clip_resolution} test clip...")
+        clips = generate_clips(media_dir, args.clip_duration, args.clip_resolution)
+        media_port = free_port()
+        media_server = start_media_server(media_dir, media_port)
+        await api.start()
+        print(f"API ready in {api.startup_seconds:.2f}s, media server on :{media_port}")
+
+        ctx = ScenarioContext(api, f"http://127.0.0.1:{media_port}", clips["clip"], args)
+        results: Dict[str, Any] = {}
+        if any(s in scenarios for s in ("convert", "ws_convert")) and "upload" not in scenarios:
+            scenarios = ["upload"] + scenarios
+        for name in scenarios:
+            count = args.requests
+            if name == "upload" and "ws_convert" in scenarios:
+                count = args.requests * 2  # convert and ws_convert each get their own sources
+            print(f"Running {name} x{count} (concurrency {args.concurrency})...")
+            results[name] = await run_scenario(ctx, name, count, args.concurrency)
+            r = results[name]
+            if r["failed"]:
+                print(f"  FAILED: all {r['count']} requests errored, no timings recorded. First error: {r['error_samples'][0]}")
+            else:
+                print(f"  {r['ok']}/{r['count']} ok, {r['throughput_per_sec']}/s, p50 {r['latency_ms']['p50']}ms, p95 {r['latency_ms']['p95']}ms")
+        await ctx.client.aclose()
+    finally:
+        api.stop()
+        if media_server:
+            media_server.shutdown()
+        if not args.keep:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "clip": {"duration": args.clip_duration, "resolution": args.clip_resolution},
+        },
+        "server": {
+            "startup_seconds": round(api.startup_seconds, 3) if api.startup_seconds else None,
+            "peak_rss_mb": round(api.peak_rss_kb / 1024, 1),
+        },
+        "scenarios": results,
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10, help="operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--scenarios", help=f"comma separated subset of: {','.join(ALL_SCENARIOS)}")
+    parser.add_argument("--quality", default="360p")
+    parser.add_argument("--clip-duration", type=int, default=10)
+    parser.add_argument("--clip-resolution", default="640x360")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--port", type=int, help="API port (default: random free port)")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="baseline JSON results to diff against")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main_async(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        print(f"Results written to {args.output}")
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+    failed = [name for name, result in report["scenarios"].items() if result["failed"]]
+    if failed:
+        print(f"\nFAILED scenarios (100% errors): {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,198 @@
+"""
+Memory held per job by extraction metadata: full yt-dlp info dicts vs compact_info().
+
+Each mode runs in its own child process that simulates `--jobs` concurrent jobs:
+every job "extracts" an info dict and keeps what the server keeps while it
+downloads (the raw dict before, the MediaInfo from compact_info() now). The
+child reports peak RSS, memory still held by the jobs (tracemalloc) and the
+format selection result, so both modes are checked to pick the same formats.
+
+By default the info dict is synthetic but shaped like a YouTube extraction
+(DASH formats with fragment lists and HTTP headers, automatic captions in
+every language, thumbnails, heatmap). Pass --url to extract a real one once
+with yt-dlp and reuse it for every job.
+
+    python benchmarks/metadata_memory_benchmark.py --jobs 50 --output metadata.json
+    python benchmarks/metadata_memory_benchmark.py --url https://www.youtube.com/watch?v=... --jobs 20
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from typing import Any, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def synthetic_info(seed: int, playlist_entries: int = 0) -> Dict[str, Any]:
+    video_id = f"vid{seed:08d}"
+    base_url = f"https://rr3---sn-example.googlevideo.com/videoplayback?id={video_id}&expire=1700000000&ei=" + "x" * 600
+    headers = {
+        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "en-us,en;q=0.5",
+        "Sec-Fetch-Mode": "navigate",
+    }
+    formats = []
+    for i, (height, vcodec, acodec, ext) in enumerate(
+        [(None, "none", "opus", "webm"), (None, "none", "mp4a.40.2", "m4a")] * 3
+        + [(h, codec, "none", ext) for h in (144, 240, 360, 480, 720, 1080, 1440, 2160)
+           for codec, ext in (("avc1.640028", "mp4"), ("vp09.00.51.08", "webm"))]
+        + [(360, "avc1.42001E", "mp4a.40.2", "mp4")]
+    ):
+        fmt = {
+            "format_id": str(100 + i),
+            "format_note": f"{height}p" if height else "medium",
+            "ext": ext,
+            "height": height,
+            "width": height * 16 // 9 if height else None,
+            "resolution": f"{height * 16 // 9}x{height}" if height else "audio only",
+            "vcodec": vcodec,
+            "acodec": acodec,
+            "tbr": float(50 + i * 37),
+            "filesize": 1_000_000 + i * 250_000,
+            "url": f"{base_url}&itag={100 + i}",
+            "manifest_url": f"https://manifest.googlevideo.com/api/manifest/dash/id/{video_id}/" + "y" * 300,
+            "http_headers": dict(headers),
+            "downloader_options": {"http_chunk_size": 10485760},
+            "protocol": "http_dash_segments",
+            "fragments": [{"url": f"sq/{n}/lmt/1700000000", "duration": 5.0} for n in range(240)],
+        }
+        formats.append(fmt)
+    languages = [f"l{n:03d}" for n in range(150)]
+    info = {
+        "id": video_id,
+        "title": f"Synthetic video {seed}",
+        "webpage_url": f"https://www.youtube.com/watch?v={video_id}",
+        "extractor_key": "Youtube",
+        "duration": 1200,
+        "description": "d" * 4000,
+        "uploader": "Synthetic Channel",
+        "upload_date": "20240101",
+        "view_count": 123456,
+        "thumbnail": f"https://i.ytimg.com/vi/{video_id}/maxresdefault.jpg",
+        "formats": formats,
+        "thumbnails": [{"url": f"https://i.ytimg.com/vi/{video_id}/{n}.jpg", "preference": -n, "id": str(n)} for n in range(40)],
+        "automatic_captions": {
+            lang: [{"ext": ext, "url": f"https://www.youtube.com/api/timedtext?v={video_id}&lang={lang}&fmt={ext}&" + "z" * 400}
+                   for ext in ("json3", "srv1", "srv2", "srv3", "ttml", "vtt")]
+            for lang in languages
+        },
+        "subtitles": {},
+        "heatmap": [{"start_time": n * 12.0, "end_time": n * 12.0 + 12, "value": 0.5} for n in range(100)],
+        "chapters": [{"start_time": n * 60.0, "end_time": n * 60.0 + 60, "title": f"Chapter {n}"} for n in range(20)],
+    }
+    if playlist_entries:
+        return {"_type": "playlist", "id": f"pl{seed}", "title": f"Playlist {seed}", "extractor_key": "YoutubeTab",
+                "entries": [synthetic_info(seed * 1000 + n) for n in range(playlist_entries)]}
+    return info
+
+def run_child(mode: str, jobs: int, playlist_entries: int, info_path: str) -> Dict[str, Any]:
+    """Runs inside the child process (cwd is a scratch dir, main.py creates its folders there)"""
+    import main
+
+    template = None
+    if info_path:
+        with open(info_path) as f:
+            template = json.load(f)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    held: List[Any] = []
+    for seed in range(jobs):
+        info = copy.deepcopy(template) if template else synthetic_info(seed, playlist_entries)
+        held.append(main.compact_info(info) if mode == "compact" else info)
+        del info
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    sample = held[0]
+    if sample.get("_type") == "playlist":
+        sample = sample["entries"][0]
+    selected = main.find_best_format(sample.get("formats", []), 720, "video", "youtube")
+    video_formats, audio_formats = main.get_format_details(sample.get("formats", []))
+    return {
+        "mode": mode,
+        "jobs": jobs,
+        "held_bytes": current - baseline,
+        "held_bytes_per_job": (current - baseline) // jobs,
+        "traced_peak_bytes": peak - baseline,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "selected_format": selected.get("format_id") if selected else None,
+        "video_formats": len(video_formats),
+        "audio_formats": len(audio_formats),
+    }
+
+def extract_real_info(url: str, path: str):
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL({"quiet": True, "skip_download": True}) as ydl:
+        info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+    with open(path, "w") as f:
+        json.dump(info, f)
+
+def measure(mode: str, args, info_path: str) -> Dict[str, Any]:
+    scratch = tempfile.mkdtemp(prefix="uvd-metadata-")
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    try:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", mode, "--jobs", str(args.jobs),
+             "--playlist-entries", str(args.playlist_entries), "--info-file", info_path],
+            cwd=scratch, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=50, help="concurrent jobs simulated per mode")
+    parser.add_argument("--playlist-entries", type=int, default=0, help="make each synthetic job a playlist of this many videos")
+    parser.add_argument("--url", help="extract this URL once with yt-dlp instead of using synthetic metadata")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--child", choices=["full", "compact"], help=argparse.SUPPRESS)
+    parser.add_argument("--info-file", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.jobs, args.playlist_entries, args.info_file)))
+        return
+
+    info_path = ""
+    if args.url:
+        fd, info_path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        extract_real_info(args.url, info_path)
+    try:
+        results = {mode: measure(mode, args, info_path) for mode in ("full", "compact")}
+    finally:
+        if info_path:
+            os.remove(info_path)
+
+    full, compact = results["full"], results["compact"]
+    for result in (full, compact):
+        print(f"{result['mode']:>8}: {result['held_bytes_per_job'] / 1024:.1f} KiB held per job, "
+              f"peak RSS {result['peak_rss_kb'] / 1024:.1f} MiB")
+    report = {
+        "source": args.url or "synthetic",
+        "results": results,
+        "held_reduction": round(1 - compact["held_bytes"] / full["held_bytes"], 4) if full["held_bytes"] else None,
+        "same_selection": full["selected_format"] == compact["selected_format"]
+                          and (full["video_formats"], full["audio_formats"]) == (compact["video_formats"], compact["audio_formats"]),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
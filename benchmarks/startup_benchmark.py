@@ -0,0 +1,104 @@
+"""
+Cold start measurement for the API.
+
+Spawns `uvicorn main:app` in a scratch directory several times and records how
+long it takes until the process answers GET / and until /api/ready reports
+ready, together with the import/warm-up timings the server reports itself.
+
+    python benchmarks/startup_benchmark.py --runs 5 --output startup.json
+    WARMUP_ON_STARTUP=0 python benchmarks/startup_benchmark.py
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def get_json(url: str) -> Optional[Dict[str, Any]]:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read()) if e.code == 503 else None
+    except (urllib.error.URLError, OSError):
+        return None
+
+def measure_once(timeout: float) -> Dict[str, Any]:
+    scratch = tempfile.mkdtemp(prefix="uvd-startup-")
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=scratch, env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    first_response = ready = None
+    report = None
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            if first_response is None and get_json(f"{base}/") is not None:
+                first_response = time.perf_counter() - started
+            if first_response is not None:
+                report = get_json(f"{base}/api/ready")
+                if report and report.get("ready"):
+                    ready = time.perf_counter() - started
+                    break
+            time.sleep(0.02)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {
+        "first_response_seconds": round(first_response, 4) if first_response else None,
+        "ready_seconds": round(ready, 4) if ready else None,
+        "server_timings": (report or {}).get("timings", {}),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    runs = []
+    for i in range(args.runs):
+        result = measure_once(args.timeout)
+        print(f"run {i + 1}: first response {result['first_response_seconds']}s, ready {result['ready_seconds']}s")
+        runs.append(result)
+
+    summary = {}
+    for key in ("first_response_seconds", "ready_seconds"):
+        values = [r[key] for r in runs if r[key] is not None]
+        summary[key] = {"median": round(statistics.median(values), 4), "min": min(values), "max": max(values)} if values else None
+    report = {"warmup_on_startup": os.environ.get("WARMUP_ON_STARTUP", "1") != "0", "summary": summary, "runs": runs}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
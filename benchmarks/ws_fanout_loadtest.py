@@ -0,0 +1,402 @@
+"""
+Websocket fan-out load test for /ws/download/{id} progress delivery.
+
+Starts the API in a child process with yt-dlp replaced by a synthetic
+downloader that emits a fixed number of progress events per job (no network),
+then opens many websocket clients, each starting its own stubbed job. A share
+of clients drops its socket mid-download and reconnects to the same id so the
+reconnection branch of websocket_download is exercised.
+
+The synthetic downloader writes a real (tiny, faststart) mp4 in chunks as it
+reports progress, to a .part file that is moved home on completion like
+yt-dlp does, so the server's post-download steps (including the pipelined
+audio encode for mp3 jobs) run on decodable media.
+
+The synthetic downloader puts the emit wall-clock time into `_speed_str`, which
+the server forwards verbatim as `speed`, so send latency is measured end to end
+on one host. Reported: connect errors, per-message latency percentiles, dropped
+messages, event-loop lag (sampled inside the server), websocket send failures
+and server memory per connection.
+
+    python benchmarks/ws_fanout_loadtest.py --clients 2000 --ramp 200 --output ws.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ============================================
+# Stub server (runs in the child process)
+# ============================================
+def run_stub_server(args):
+    sys.path.insert(0, REPO_ROOT)
+    import uvicorn
+    import yt_dlp
+    import main
+
+    # Tiny but decodable source; faststart so it can be read while still being written
+    source_path = os.path.abspath("loadtest_source.mp4")
+    subprocess.run([
+        main.get_ffmpeg_path(), '-v', 'error',
+        '-f', 'lavfi', '-i', 'testsrc=size=160x90:rate=10',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100',
+        '-t', '5', '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-shortest', '-movflags', '+faststart', '-y', source_path
+    ], check=True)
+    with open(source_path, 'rb') as f:
+        source_bytes = f.read()
+
+    class SyntheticYoutubeDL:
+        """Stands in for yt_dlp.YoutubeDL: instant extraction, paced synthetic progress"""
+
+        def __init__(self, params=None, *a, **kw):
+            self.params = params or {}
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def close(self):
+            pass
+
+        def extract_info(self, url, download=False, **kw):
+            video_id = url.rstrip('/').rsplit('/', 1)[-1]
+            return {
+                'id': video_id,
+                'title': f"loadtest {video_id}",
+                'webpage_url': url,
+                'extractor': 'generic',
+                'formats': [{'format_id': '18', 'ext': 'mp4', 'height': 360, 'width': 640,
+                             'vcodec': 'avc1', 'acodec': 'mp4a', 'tbr': 500}],
+            }
+
+        def _output_paths(self):
+            outtmpl = self.params.get('outtmpl', os.path.join(main.DOWNLOADS_DIR, 'loadtest.%(ext)s'))
+            if isinstance(outtmpl, dict):
+                outtmpl = outtmpl.get('default')
+            name = outtmpl.replace('%(ext)s', 'mp4')
+            # Relative templates resolve like yt-dlp's: written under paths['temp'], moved to paths['home']
+            paths = self.params.get('paths') or {}
+            home = paths.get('home', '')
+            return os.path.join(home, paths.get('temp', ''), name), os.path.join(home, name)
+
+        def download(self, urls):
+            temp_path, path = self._output_paths()
+            part_path = temp_path + '.part'
+            os.makedirs(os.path.dirname(part_path) or '.', exist_ok=True)
+            written = 0
+            total = args.stub_bytes
+            interval = args.stub_duration / args.stub_events
+            hooks = self.params.get('progress_hooks', [])
+            started = time.time()
+            for seq in range(1, args.stub_events + 1):
+                time.sleep(interval)
+                downloaded = total * seq // args.stub_events
+                # The real bytes trail the reported ones proportionally
+                target = len(source_bytes) * seq // args.stub_events
+                with open(part_path, 'ab') as f:
+                    f.write(source_bytes[written:target])
+                written = target
+                event = {
+                    'status': 'downloading',
+                    'filename': path,
+                    'tmpfilename': part_path,
+                    'downloaded_bytes': downloaded,
+                    'total_bytes': total,
+                    'elapsed': time.time() - started,
+                    '_percent_str': f"{downloaded / total * 100:.2f}%",
+                    '_total_bytes_str': f"{total / 1048576:.2f}MiB",
+                    '_speed_str': f"{time.time():.6f}",
+                    '_eta_str': f"{(args.stub_events - seq) * interval:.1f}s",
+                    'fragment_index': seq,
+                    'fragment_count': args.stub_events,
+                }
+                for hook in hooks:
+                    hook(event)
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            os.replace(part_path, path)
+            for hook in hooks:
+                hook({'status': 'finished', 'filename': path, 'downloaded_bytes': total,
+                      'total_bytes': total, 'elapsed': time.time() - started})
+            for hook in self.params.get('post_hooks', []):
+                hook(os.path.abspath(path))
+            return 0
+
+    yt_dlp.YoutubeDL = SyntheticYoutubeDL
+    main.yt_dlp.YoutubeDL = SyntheticYoutubeDL
+
+    loop_lag = main.Histogram("loadtest_event_loop_lag_seconds", "Event loop scheduling lag",
+                              buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+    loop_lag_max = main.Gauge("loadtest_event_loop_lag_max_seconds", "Largest observed event loop lag")
+
+    async def monitor_loop_lag():
+        peak = 0.0
+        while True:
+            expected = time.perf_counter() + 0.05
+            await asyncio.sleep(0.05)
+            lag = max(0.0, time.perf_counter() - expected)
+            loop_lag.observe(lag)
+            peak = max(peak, lag)
+            loop_lag_max.set(peak)
+
+    @main.app.on_event("startup")
+    async def start_lag_monitor():
+        asyncio.get_event_loop().create_task(monitor_loop_lag())
+
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning",
+                ws_max_size=1 << 20, backlog=4096)
+
+
+# ============================================
+# Load generator
+# ============================================
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def read_rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))]
+
+class ClientStats:
+    def __init__(self, reconnecting: bool):
+        self.reconnecting = reconnecting
+        self.connected = False
+        self.connect_error: Optional[str] = None
+        self.completed = False
+        self.latencies: List[float] = []
+        self.seqs = set()
+        self.resume_seq: Optional[int] = None
+        self.reconnected = False
+
+async def run_client(index: int, args, ws_base: str, stats: ClientStats, all_connected: asyncio.Event):
+    import websockets
+
+    download_id = f"loadtest-{index}-{random.randrange(1 << 30)}"
+    url = f"https://loadtest.invalid/{download_id}"
+
+    async def consume(ws, stop_after: Optional[int] = None) -> bool:
+        received = 0
+        async for raw in ws:
+            now = time.time()
+            msg = json.loads(raw)
+            status = msg.get("status")
+            if status == "downloading":
+                seq = msg.get("fragment_index")
+                stats.seqs.add(seq)
+                if stats.reconnected and stats.resume_seq is None:
+                    stats.resume_seq = seq
+                try:
+                    stats.latencies.append(now - float(msg.get("speed")))
+                except (TypeError, ValueError):
+                    pass
+                received += 1
+                if stop_after and received >= stop_after:
+                    return False
+            elif status == "completed":
+                stats.completed = True
+                return True
+            elif status in ("error", "cancelled"):
+                stats.connect_error = msg.get("message")
+                return True
+        return True
+
+    try:
+        ws = await websockets.connect(f"{ws_base}/ws/download/{download_id}", max_size=None, open_timeout=args.timeout)
+    except Exception as e:
+        stats.connect_error = f"{type(e).__name__}: {e}"
+        return
+    stats.connected = True
+    try:
+        await all_connected.wait()
+        await ws.send(json.dumps({"url": url, "type": args.job_type, "quality": "360p", "format": "mp3"}))
+        if stats.reconnecting:
+            finished = await consume(ws, stop_after=max(1, args.stub_events // 3))
+            await ws.close()
+            if finished:
+                return
+            await asyncio.sleep(args.reconnect_delay)
+            ws = await websockets.connect(f"{ws_base}/ws/download/{download_id}", max_size=None, open_timeout=args.timeout)
+            stats.reconnected = True
+        await asyncio.wait_for(consume(ws), timeout=args.stub_duration * 4 + args.timeout)
+    except Exception as e:
+        stats.connect_error = stats.connect_error or f"{type(e).__name__}: {e}"
+    finally:
+        await ws.close()
+
+def parse_metrics(text: str) -> Dict[str, float]:
+    values = {}
+    for line in text.splitlines():
+        if line.startswith("#") or not line.strip():
+            continue
+        match = re.match(r'^([a-zA-Z_:][\w:]*)(\{[^}]*\})?\s+(\S+)$', line)
+        if match:
+            key = match.group(1) + (match.group(2) or "")
+            values[key] = float(match.group(3))
+    return values
+
+async def run_load(args) -> Dict[str, Any]:
+    import httpx
+
+    scratch = tempfile.mkdtemp(prefix="uvd-wsload-")
+    port = args.port or free_port()
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+         "--stub-duration", str(args.stub_duration), "--stub-events", str(args.stub_events),
+         "--stub-bytes", str(args.stub_bytes)],
+        cwd=scratch, env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=base) as http:
+            for _ in range(600):
+                if server.poll() is not None:
+                    raise RuntimeError("stub server exited during startup")
+                try:
+                    await http.get("/", timeout=1)
+                    break
+                except httpx.HTTPError:
+                    await asyncio.sleep(0.1)
+
+            rss_idle = read_rss_kb(server.pid)
+            reconnect_count = int(args.clients * args.reconnect_ratio)
+            stats = [ClientStats(reconnecting=i < reconnect_count) for i in range(args.clients)]
+            random.shuffle(stats)
+            all_connected = asyncio.Event()
+
+            tasks = []
+            ramp_started = time.perf_counter()
+            for i, st in enumerate(stats):
+                tasks.append(asyncio.create_task(run_client(i, args, base.replace("http://", "ws://"), st, all_connected)))
+                if args.ramp and (i + 1) % args.ramp == 0:
+                    await asyncio.sleep(1)
+            while sum(1 for s in stats if s.connected or s.connect_error) < args.clients:
+                await asyncio.sleep(0.05)
+            ramp_seconds = time.perf_counter() - ramp_started
+            rss_connected = read_rss_kb(server.pid)
+            all_connected.set()
+
+            run_started = time.perf_counter()
+            rss_peak = rss_connected
+            pending = set(tasks)
+            while pending:
+                _, pending = await asyncio.wait(pending, timeout=0.5)
+                rss_peak = max(rss_peak, read_rss_kb(server.pid))
+            run_seconds = time.perf_counter() - run_started
+
+            metrics = parse_metrics((await http.get("/metrics")).text)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    connected = [s for s in stats if s.connected]
+    latencies = sorted(l for s in connected for l in s.latencies)
+    steady = [s for s in connected if not s.reconnecting]
+    reconnecting = [s for s in connected if s.reconnecting and s.reconnected]
+    steady_dropped = sum(args.stub_events - len(s.seqs) for s in steady)
+    # After a reconnect every event from the first one seen onwards should arrive
+    reconnect_dropped = sum(
+        len([q for q in range(s.resume_seq, args.stub_events + 1) if q not in s.seqs])
+        for s in reconnecting if s.resume_seq is not None
+    )
+    lag_count = metrics.get("loadtest_event_loop_lag_seconds_count", 0)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    connections = max(1, len(connected))
+    return {
+        "config": vars(args),
+        "clients": args.clients,
+        "connected": len(connected),
+        "connect_errors": args.clients - len(connected),
+        "completed": sum(1 for s in connected if s.completed),
+        "client_errors": [s.connect_error for s in stats if s.connect_error][:5],
+        "ramp_seconds": round(ramp_seconds, 2),
+        "run_seconds": round(run_seconds, 2),
+        "messages_received": len(latencies),
+        "send_latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1]) if latencies else None,
+        },
+        "dropped_messages": {
+            "steady_clients": steady_dropped,
+            "after_reconnect": reconnect_dropped,
+            "reconnected_clients": len(reconnecting),
+            "reconnects_without_progress": sum(1 for s in reconnecting if s.resume_seq is None and not s.completed),
+        },
+        "server_ws_send_failures": metrics.get("downloader_websocket_send_failures_total", 0),
+        "event_loop_lag_ms": {
+            "mean": ms(metrics.get("loadtest_event_loop_lag_seconds_sum", 0) / lag_count) if lag_count else None,
+            "max": ms(metrics.get("loadtest_event_loop_lag_max_seconds")),
+        },
+        "server_memory": {
+            "idle_rss_mb": round(rss_idle / 1024, 1),
+            "connected_rss_mb": round(rss_connected / 1024, 1),
+            "peak_rss_mb": round(rss_peak / 1024, 1),
+            "kb_per_connection": round((rss_connected - rss_idle) / connections, 1),
+            "peak_kb_per_job": round((rss_peak - rss_idle) / connections, 1),
+        },
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--ramp", type=int, default=250, help="new connections per second (0 = all at once)")
+    parser.add_argument("--reconnect-ratio", type=float, default=0.2, help="share of clients that drop and reconnect")
+    parser.add_argument("--reconnect-delay", type=float, default=1.0)
+    parser.add_argument("--job-type", default="video", choices=["audio", "video"],
+                        help="video keeps post-download work to a quality probe; audio (mp3) also runs "
+                             "the pipelined encode of the synthetic source")
+    parser.add_argument("--stub-duration", type=float, default=20.0, help="seconds each synthetic job runs")
+    parser.add_argument("--stub-events", type=int, default=100, help="progress events per job")
+    parser.add_argument("--stub-bytes", type=int, default=50 * 1048576)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.serve:
+        run_stub_server(args)
+    else:
+        report = asyncio.run(run_load(args))
+        output = json.dumps(report, indent=2, default=str)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(output)
+            print(f"Results written to {args.output}")
+        print(output)
@@ -1,26 +1,39 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse
+import time
+STARTUP_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, BackgroundTasks, WebSocket, WebSocketDisconnect, Request
+from fastapi.responses import FileResponse, PlainTextResponse, JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import yt_dlp
-import requests
 import logging
 import re
-import imageio_ffmpeg
 from fastapi import UploadFile, File, Form
 import aiofiles
 import os
-import subprocess
-import zipfile
 import shutil
 import glob
-from typing import Optional, List, Dict, Any
-from urllib.parse import urlparse
+from typing import Optional, List, Dict, Any, Union
+from urllib.parse import urlparse, urljoin
 import asyncio
 import uuid
 import json
+import hashlib
+import gzip
+import math
+import socket
+import ipaddress
+import sqlite3
+import random
+import sys
+import collections
 from datetime import datetime
-import time
+import importlib
+import types
+import contextvars
+import threading
+import functools
+import abc
+from contextlib import contextmanager, asynccontextmanager
 
 # ============================================
 # Step 1: Server Setup & Configuration
@@ -42,8 +55,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# FFmpeg path detection
-FFMPEG_PATH = imageio_ffmpeg.get_ffmpeg_exe()
+# Heavy modules are imported on first use (or by the background warm-up) to keep cold start fast
+STARTUP_TIMINGS: Dict[str, float] = {}
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "1") != "0"
+
+class LazyModule(types.ModuleType):
+    """Module proxy that imports the real module on first attribute access"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._module is not None
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    STARTUP_TIMINGS[f"import_{self.__name__}_seconds"] = round(time.perf_counter() - started, 4)
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+yt_dlp = LazyModule("yt_dlp")
+httpx = LazyModule("httpx")
+imageio_ffmpeg = LazyModule("imageio_ffmpeg")
+zipfile = LazyModule("zipfile")
+
+# FFmpeg path detection (resolved lazily)
+@functools.lru_cache(maxsize=None)
+def get_ffmpeg_path() -> str:
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+@functools.lru_cache(maxsize=None)
+def get_ffprobe_path() -> str:
+    ffmpeg_path = get_ffmpeg_path()
+    # Only rename the binary itself; the imageio_ffmpeg directory name also contains "ffmpeg"
+    candidate = os.path.join(os.path.dirname(ffmpeg_path), os.path.basename(ffmpeg_path).replace('ffmpeg', 'ffprobe'))
+    if os.path.exists(candidate):
+        return candidate
+    return shutil.which('ffprobe') or candidate
 
 # Downloads directory creation
 DOWNLOADS_DIR = "./downloads"
@@ -57,7 +115,6 @@ os.makedirs(DOWNLOADS_DIR, exist_ok=True)
 BASE_YDL_OPTS = {
     'quiet': True,
     'no_warnings': True,
-    'ffmpeg_location': FFMPEG_PATH,
     'extract_flat': False,
     'ignoreerrors': False,
     'no_color': True,
@@ -82,23 +139,22 @@ user_settings: Dict[str, Any] = {
 download_sessions: Dict[str, Dict[str, Any]] = {}
 
 # Load settings from file
-def load_sessions():
-    global download_sessions
+def load_sessions() -> Dict[str, Dict[str, Any]]:
     try:
         if os.path.exists(SESSION_FILE):
             with open(SESSION_FILE, "r") as f:
-                download_sessions = json.load(f)
-            logger.info(f"✓ Loaded {len(download_sessions)} sessions from {SESSION_FILE}")
-        else:
-            download_sessions = {}
+                sessions = json.load(f)
+            logger.info(f"✓ Loaded {len(sessions)} sessions from {SESSION_FILE}")
+            return sessions
     except Exception as e:
         logger.error(f"Failed to load sessions: {e}")
-        download_sessions = {}
+    return {}
 
-def save_sessions():
+def save_sessions(*download_ids: str):
+    """Persist sessions; pass the ids that changed (none means all) so the change feed can advance"""
+    session_feed.record(download_ids or list(download_sessions))
     try:
-        with open(SESSION_FILE, "w") as f:
-            json.dump(download_sessions, f, indent=2)
+        state_backend.save_sessions(download_sessions)
     except Exception as e:
         logger.error(f"Failed to save sessions: {e}")
 
@@ -136,6 +192,948 @@ def load_history():
             return json.load(f)
     return []
 
+# ============================================
+# Shared Job State Backend (multi-worker support)
+# ============================================
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "memory")  # memory | sqlite
+STATE_DB_PATH = os.environ.get("STATE_DB_PATH", "./state.db")
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+WORKER_HEARTBEAT_INTERVAL = 10
+WORKER_STALE_AFTER = 30  # seconds without a heartbeat before a worker's jobs can be claimed
+ACTIVE_SESSION_STATUSES = ("initializing", "downloading", "processing")
+
+class Subscription(abc.ABC):
+    """Handle for one pub/sub channel subscription"""
+
+    @abc.abstractmethod
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next message, or None if nothing arrived within timeout"""
+
+    def close(self):
+        pass
+
+class StateBackend(abc.ABC):
+    """
+    Job state shared between workers. download_sessions stays the in-process view of the
+    jobs this worker runs; the backend mirrors it so any worker can list, follow or cancel
+    a job. A Redis implementation would map sessions to a hash with an owner field,
+    publish/subscribe to PUBLISH/SUBSCRIBE and heartbeats to keys with a TTL.
+    """
+
+    @abc.abstractmethod
+    def save_sessions(self, sessions: Dict[str, Dict[str, Any]]):
+        ...
+
+    @abc.abstractmethod
+    def get_session(self, download_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abc.abstractmethod
+    def list_sessions(self) -> Dict[str, Dict[str, Any]]:
+        ...
+
+    @abc.abstractmethod
+    def claim_orphaned_sessions(self, worker_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Take ownership of unfinished jobs whose worker is gone and return only the newly
+        claimed ones. Called at startup and after every heartbeat, so it must be cheap
+        and never return jobs this worker already runs.
+        """
+
+    def heartbeat(self, worker_id: str):
+        pass
+
+    def retire(self, worker_id: str):
+        """Called on clean shutdown so this worker's jobs can be claimed right away"""
+        pass
+
+    @abc.abstractmethod
+    def publish(self, channel: str, message: Dict[str, Any]):
+        """Thread-safe; may be called from yt-dlp worker threads"""
+
+    @abc.abstractmethod
+    def subscribe(self, channel: str) -> Subscription:
+        ...
+
+class MemorySubscription(Subscription):
+    def __init__(self, backend: "MemoryStateBackend", channel: str):
+        self.backend = backend
+        self.channel = channel
+        self.loop = asyncio.get_event_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        with self.backend._lock:
+            subscribers = self.backend._subscribers.get(self.channel, [])
+            if self in subscribers:
+                subscribers.remove(self)
+
+class MemoryStateBackend(StateBackend):
+    """Single-process default: state lives in download_sessions, journaled to sessions.json"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[MemorySubscription]] = {}
+        self._journal_claimed = False
+
+    def save_sessions(self, sessions: Dict[str, Dict[str, Any]]):
+        with open(SESSION_FILE, "w") as f:
+            json.dump(sessions, f, indent=2)
+
+    def get_session(self, download_id: str) -> Optional[Dict[str, Any]]:
+        return download_sessions.get(download_id)
+
+    def list_sessions(self) -> Dict[str, Dict[str, Any]]:
+        return dict(download_sessions)
+
+    def claim_orphaned_sessions(self, worker_id: str) -> Dict[str, Dict[str, Any]]:
+        # The only orphans are the journal left by the previous process, replayed once
+        with self._lock:
+            if self._journal_claimed:
+                return {}
+            self._journal_claimed = True
+        return load_sessions()
+
+    def publish(self, channel: str, message: Dict[str, Any]):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, []))
+        for sub in subscribers:
+            sub.loop.call_soon_threadsafe(sub.queue.put_nowait, message)
+
+    def subscribe(self, channel: str) -> Subscription:
+        sub = MemorySubscription(self, channel)
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(sub)
+        return sub
+
+class SQLiteSubscription(Subscription):
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, backend: "SQLiteStateBackend", channel: str):
+        self.backend = backend
+        self.channel = channel
+        self.buffer: collections.deque = collections.deque()
+        row = backend._conn().execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()
+        self.last_id = row[0]
+
+    def _fetch(self):
+        return self.backend._conn().execute(
+            "SELECT id, payload FROM messages WHERE channel = ? AND id > ? ORDER BY id LIMIT 500",
+            (self.channel, self.last_id)
+        ).fetchall()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.buffer:
+            rows = await asyncio.to_thread(self._fetch)
+            for message_id, payload in rows:
+                self.last_id = message_id
+                self.buffer.append(json.loads(payload))
+            if self.buffer:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(self.POLL_INTERVAL)
+        return self.buffer.popleft()
+
+class SQLiteStateBackend(StateBackend):
+    """Shared state for several workers on one host (uvicorn --workers N) via a WAL-mode SQLite file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._written: Dict[str, str] = {}
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                download_id TEXT PRIMARY KEY, owner TEXT, status TEXT, data TEXT, updated_at REAL);
+            CREATE TABLE IF NOT EXISTS workers (worker_id TEXT PRIMARY KEY, last_seen REAL);
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT, payload TEXT, created_at REAL);
+            CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel, id);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save_sessions(self, sessions: Dict[str, Dict[str, Any]]):
+        snapshot = {download_id: json.dumps(session) for download_id, session in list(sessions.items())}
+        with self._lock:
+            changed = {k: v for k, v in snapshot.items() if self._written.get(k) != v}
+            removed = [k for k in self._written if k not in snapshot]
+            if not changed and not removed:
+                return
+            conn = self._conn()
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for download_id, data in changed.items():
+                    conn.execute(
+                        "INSERT OR REPLACE INTO sessions (download_id, owner, status, data, updated_at) VALUES (?, ?, ?, ?, ?)",
+                        (download_id, WORKER_ID, sessions.get(download_id, {}).get("status"), data, now)
+                    )
+                for download_id in removed:
+                    conn.execute("DELETE FROM sessions WHERE download_id = ? AND owner = ?", (download_id, WORKER_ID))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._written.update(changed)
+            for download_id in removed:
+                self._written.pop(download_id, None)
+
+    def get_session(self, download_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT data FROM sessions WHERE download_id = ?", (download_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_sessions(self) -> Dict[str, Dict[str, Any]]:
+        rows = self._conn().execute("SELECT download_id, data FROM sessions").fetchall()
+        return {download_id: json.loads(data) for download_id, data in rows}
+
+    def claim_orphaned_sessions(self, worker_id: str) -> Dict[str, Dict[str, Any]]:
+        conn = self._conn()
+        alive_since = time.time() - WORKER_STALE_AFTER
+        placeholders = ",".join("?" * len(ACTIVE_SESSION_STATUSES))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            orphaned = "(owner IS NULL OR owner NOT IN (SELECT worker_id FROM workers WHERE last_seen > ?))"
+            conn.execute(f"DELETE FROM sessions WHERE status NOT IN ({placeholders}) AND {orphaned}",
+                         (*ACTIVE_SESSION_STATUSES, alive_since))
+            rows = conn.execute(
+                f"SELECT download_id, data FROM sessions WHERE status IN ({placeholders}) AND {orphaned} "
+                f"AND (owner IS NULL OR owner != ?)",
+                (*ACTIVE_SESSION_STATUSES, alive_since, worker_id)
+            ).fetchall()
+            conn.executemany("UPDATE sessions SET owner = ? WHERE download_id = ?",
+                             [(worker_id, download_id) for download_id, _ in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {download_id: json.loads(data) for download_id, data in rows}
+
+    def heartbeat(self, worker_id: str):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO workers (worker_id, last_seen) VALUES (?, ?)", (worker_id, now))
+        conn.execute("DELETE FROM workers WHERE last_seen < ?", (now - WORKER_STALE_AFTER * 10,))
+        conn.execute("DELETE FROM messages WHERE created_at < ?", (now - 120,))
+
+    def retire(self, worker_id: str):
+        self._conn().execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def publish(self, channel: str, message: Dict[str, Any]):
+        self._conn().execute(
+            "INSERT INTO messages (channel, payload, created_at) VALUES (?, ?, ?)",
+            (channel, json.dumps(message), time.time())
+        )
+
+    def subscribe(self, channel: str) -> Subscription:
+        return SQLiteSubscription(self, channel)
+
+def create_state_backend() -> StateBackend:
+    if STATE_BACKEND == "sqlite":
+        logger.info(f"✓ Using SQLite state backend at {STATE_DB_PATH} (worker {WORKER_ID})")
+        return SQLiteStateBackend(STATE_DB_PATH)
+    return MemoryStateBackend()
+
+state_backend = create_state_backend()
+
+# ============================================
+# Progress Hub (in-process pub/sub for job updates)
+# ============================================
+PROGRESS_QUEUE_SIZE = int(os.environ.get("PROGRESS_QUEUE_SIZE", "16"))
+TERMINAL_STATUSES = ("completed", "cancelled", "error")
+
+class ProgressHub:
+    """
+    Fans job updates out to any number of subscribers (browser tabs). Each subscriber has a
+    bounded queue; when it is full the oldest pending update is dropped so a slow socket
+    never blocks the yt-dlp thread. The last update per job is replayed to new subscribers.
+    """
+
+    def __init__(self, maxsize: int = PROGRESS_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._last_state: Dict[str, Dict[str, Any]] = {}
+        self.dropped = 0
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+
+    def publish(self, job_id: str, msg: Optional[Dict[str, Any]]):
+        """Safe to call from worker threads; delivery happens on the event loop"""
+        if self.loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._dispatch(job_id, msg)
+        else:
+            self.loop.call_soon_threadsafe(self._dispatch, job_id, msg)
+
+    def _dispatch(self, job_id: str, msg: Optional[Dict[str, Any]]):
+        if msg is not None:
+            self._last_state[job_id] = msg
+        for queue in self._subscribers.get(job_id, []):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(msg)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.maxsize)
+        last = self._last_state.get(job_id)
+        if last is not None:
+            queue.put_nowait(last)
+        self._subscribers.setdefault(job_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id, [])
+        if queue in subscribers:
+            subscribers.remove(queue)
+        if not subscribers:
+            self._subscribers.pop(job_id, None)
+
+    def subscriber_count(self, job_id: str) -> int:
+        return len(self._subscribers.get(job_id, []))
+
+    def finish(self, job_id: str):
+        """Job is gone: wake remaining subscribers with a None sentinel and forget its state"""
+        self.publish(job_id, None)
+        self._last_state.pop(job_id, None)
+
+progress_hub = ProgressHub()
+
+@app.on_event("startup")
+async def bind_progress_hub():
+    progress_hub.bind_loop(asyncio.get_running_loop())
+
+# ============================================
+# Active Downloads Change Feed (versioned deltas)
+# ============================================
+FEED_TOMBSTONE_LIMIT = 1000
+FEED_MAX_WAIT = 60
+
+class SessionChangeFeed:
+    """
+    Monotonic sequence over session mutations. Every save_sessions(download_id) bumps the
+    sequence and moves that id to the end of an ordered log, so changes since a given
+    sequence are read from the tail without touching unchanged jobs. Sequences are per
+    worker; a client whose cursor predates the retained log gets a full resync.
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self.floor = 0  # changes at or below this sequence may have been forgotten
+        self._log: "collections.OrderedDict[str, int]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed: Optional[asyncio.Event] = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self._changed = asyncio.Event()
+
+    def record(self, download_ids):
+        with self._lock:
+            for download_id in download_ids:
+                self.seq += 1
+                self._log[download_id] = self.seq
+                self._log.move_to_end(download_id)
+            self._trim()
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def _trim(self):
+        # Only ids no longer in download_sessions are droppable; they are pure tombstones
+        excess = len(self._log) - len(download_sessions) - FEED_TOMBSTONE_LIMIT
+        if excess <= 0:
+            return
+        for download_id, seq in list(self._log.items()):
+            if excess <= 0:
+                break
+            if download_id not in download_sessions:
+                del self._log[download_id]
+                self.floor = max(self.floor, seq)
+                excess -= 1
+
+    def _wake(self):
+        event, self._changed = self._changed, asyncio.Event()
+        event.set()
+
+    def changes_since(self, since: int):
+        """(seq, changed ids, removed ids), or None if the cursor is too old for a delta"""
+        with self._lock:
+            if since < self.floor or since > self.seq:
+                return None
+            changed, removed = [], []
+            for download_id, seq in reversed(self._log.items()):
+                if seq <= since:
+                    break
+                session = download_sessions.get(download_id)
+                if session and session.get("status") in ACTIVE_SESSION_STATUSES:
+                    changed.append(download_id)
+                else:
+                    removed.append(download_id)
+            return self.seq, changed, removed
+
+    async def wait_for_change(self, since: int, timeout: float) -> bool:
+        if self.seq > since or self._changed is None:
+            return self.seq > since
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.seq > since
+
+session_feed = SessionChangeFeed()
+
+@app.on_event("startup")
+async def bind_session_feed():
+    session_feed.bind_loop(asyncio.get_running_loop())
+
+def publish_progress(download_id: str, msg: Dict[str, Any]):
+    """Fan a job update out to local subscribers and to followers on other workers"""
+    progress_hub.publish(download_id, msg)
+    try:
+        state_backend.publish(f"progress:{download_id}", msg)
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to publish progress for {download_id}: {e}")
+
+async def run_worker_heartbeat():
+    while True:
+        try:
+            await asyncio.to_thread(state_backend.heartbeat, WORKER_ID)
+        except Exception as e:
+            logger.warning(f"⚠️ Worker heartbeat failed: {e}")
+        await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+        try:
+            # A worker that died after our startup (or restarted within WORKER_STALE_AFTER)
+            # only looks dead later, so its jobs are claimed here rather than at startup alone
+            await resume_interrupted_downloads()
+        except Exception as e:
+            logger.warning(f"⚠️ Claiming orphaned downloads failed: {e}")
+
+async def listen_for_control_messages():
+    """Apply cancel requests published by whichever worker received /api/cancel"""
+    subscription = state_backend.subscribe("control")
+    try:
+        while True:
+            msg = await subscription.get(timeout=None)
+            if not msg or msg.get("action") != "cancel":
+                continue
+            download_id = msg.get("download_id")
+            if cancel_job(download_id):
+                logger.info(f"❌ Cancel for {download_id} received from another worker")
+    finally:
+        subscription.close()
+
+@app.on_event("startup")
+async def start_state_backend():
+    state_backend.heartbeat(WORKER_ID)
+    app.state.heartbeat_task = asyncio.create_task(run_worker_heartbeat())
+    app.state.control_task = asyncio.create_task(listen_for_control_messages())
+
+@app.on_event("shutdown")
+async def retire_worker():
+    app.state.heartbeat_task.cancel()
+    try:
+        await asyncio.to_thread(state_backend.retire, WORKER_ID)
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to retire worker {WORKER_ID}: {e}")
+
+# ============================================
+# Metrics & Instrumentation (Prometheus text format)
+# ============================================
+DEFAULT_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+METRICS_REGISTRY: List["Metric"] = []
+
+class Metric:
+    """Minimal thread-safe metric with labels; progress hooks run in worker threads"""
+    metric_type = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, Any] = {}
+        METRICS_REGISTRY.append(self)
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> tuple:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    @staticmethod
+    def _format_labels(key: tuple, extra: tuple = ()) -> str:
+        items = list(key) + list(extra)
+        if not items:
+            return ""
+        escaped = [(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in items]
+        return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{self._format_labels(key)} {value}")
+        return lines
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = DEFAULT_DURATION_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            for key, state in self._values.items():
+                for bound, count in zip(self.buckets, state["counts"]):
+                    lines.append(f"{self.name}_bucket{self._format_labels(key, (('le', str(bound)),))} {count}")
+                lines.append(f"{self.name}_bucket{self._format_labels(key, (('le', '+Inf'),))} {state['count']}")
+                lines.append(f"{self.name}_sum{self._format_labels(key)} {state['sum']}")
+                lines.append(f"{self.name}_count{self._format_labels(key)} {state['count']}")
+        return lines
+
+STAGE_DURATION = Histogram("downloader_stage_duration_seconds", "Duration of each pipeline stage")
+HTTP_REQUEST_DURATION = Histogram("downloader_http_request_duration_seconds", "HTTP handler latency by route")
+BYTES_DOWNLOADED = Counter("downloader_bytes_downloaded_total", "Bytes transferred by yt-dlp downloads")
+JOBS_TOTAL = Counter("downloader_jobs_total", "Finished jobs by kind, platform and outcome")
+WS_SEND_FAILURES = Counter("downloader_websocket_send_failures_total", "Failed websocket sends")
+ACTIVE_JOBS = Gauge("downloader_active_jobs", "Jobs currently running by kind")
+QUEUE_DEPTH = Gauge("downloader_queue_depth", "Download sessions waiting to start transferring")
+
+@contextmanager
+def track_stage(stage: str, trace: Optional["JobTrace"] = None, **attrs):
+    start = time.perf_counter()
+    span = trace.begin_span(stage, **attrs) if trace else None
+    try:
+        yield span
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+        if span:
+            trace.end_span(span)
+
+@contextmanager
+def track_job(kind: str):
+    ACTIVE_JOBS.inc(kind=kind)
+    try:
+        yield
+    finally:
+        ACTIVE_JOBS.dec(kind=kind)
+
+def timed_stage(stage: str):
+    """Decorator form of track_stage for synchronous helpers"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track_stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def make_metrics_progress_hook(platform: str, trace: Optional["JobTrace"] = None):
+    """yt-dlp progress hook that records transferred bytes and per-file download time"""
+    last_bytes: Dict[str, int] = {}
+
+    def hook(d):
+        filename = d.get('filename') or d.get('tmpfilename') or ''
+        downloaded = d.get('downloaded_bytes') or 0
+        delta = downloaded - last_bytes.get(filename, 0)
+        if delta > 0:
+            BYTES_DOWNLOADED.inc(delta, platform=platform)
+        last_bytes[filename] = max(downloaded, last_bytes.get(filename, 0))
+        if d['status'] == 'finished' and d.get('elapsed') is not None:
+            STAGE_DURATION.observe(d['elapsed'], stage='download')
+            if trace:
+                now = time.time()
+                trace.record_span(
+                    'download', now - d['elapsed'], now,
+                    filename=os.path.basename(filename),
+                    format_id=(d.get('info_dict') or {}).get('format_id'),
+                    bytes=d.get('total_bytes') or downloaded,
+                )
+
+    return hook
+
+def make_metrics_postprocessor_hook(trace: Optional["JobTrace"] = None):
+    """yt-dlp postprocessor hook that records merge/postprocess time"""
+    started: Dict[str, float] = {}
+
+    def hook(d):
+        name = d.get('postprocessor') or 'unknown'
+        if d['status'] == 'started':
+            started[name] = time.perf_counter()
+        elif d['status'] == 'finished' and name in started:
+            elapsed = time.perf_counter() - started.pop(name)
+            STAGE_DURATION.observe(elapsed, stage='postprocess')
+            if trace:
+                now = time.time()
+                trace.record_span('postprocess', now - elapsed, now, postprocessor=name)
+
+    return hook
+
+@app.middleware("http")
+async def metrics_middleware(request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_REQUEST_DURATION.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=getattr(route, "path", "unmatched")
+    )
+    return response
+
+@app.get("/metrics")
+async def metrics():
+    QUEUE_DEPTH.set(sum(1 for s in download_sessions.values() if s.get("status") == "initializing"))
+    lines = []
+    for metric in METRICS_REGISTRY:
+        lines.extend(metric.render())
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+# ============================================
+# Per-Job Tracing & Sampling Profiler
+# ============================================
+PROFILES_DIR = "./profiles"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))  # 0.0 - 1.0 share of jobs to profile
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+MAX_TRACES = 200
+
+class SamplingProfiler:
+    """Periodically samples stacks of watched threads and writes folded stacks (flamegraph/speedscope format)"""
+
+    def __init__(self, output_path: str, job_id: str, interval: float = PROFILE_INTERVAL):
+        self.output_path = output_path
+        self.job_id = job_id
+        self.interval = interval
+        self.samples: collections.Counter = collections.Counter()
+        self.thread_ids = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch_thread(self, ident: Optional[int] = None):
+        self.thread_ids.add(ident or threading.get_ident())
+
+    def unwatch_thread(self, ident: Optional[int] = None):
+        self.thread_ids.discard(ident or threading.get_ident())
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, name="job-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.thread_ids):
+                frame = frames.get(ident)
+                if frame is None or ident == own_ident:
+                    continue
+                # Root frame tags every sample with its job, so merged profiles stay separable
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(f"job {self.job_id}")
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self) -> str:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+        os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+        with open(self.output_path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"🔬 Wrote profile with {sum(self.samples.values())} samples to {self.output_path}")
+        return self.output_path
+
+class JobTrace:
+    """Span timeline for one job; spans may be opened from the event loop or yt-dlp worker threads"""
+
+    def __init__(self, job_id: str, kind: str, **attrs):
+        self.job_id = job_id
+        self.kind = kind
+        self.status = "running"
+        self._lock = threading.Lock()
+        self.spans: List[Dict[str, Any]] = []
+        self.profiler: Optional[SamplingProfiler] = None
+        self.profile_file: Optional[str] = None
+        self.root = self.begin_span(kind, parent=None, **attrs)
+
+    def begin_span(self, name: str, parent: Optional[Dict[str, Any]] = None, **attrs) -> Dict[str, Any]:
+        with self._lock:
+            span = {
+                "span_id": len(self.spans) + 1,
+                "parent_id": parent["span_id"] if parent else (self.root["span_id"] if self.spans else None),
+                "name": name,
+                "start": time.time(),
+                "end": None,
+                "attributes": attrs,
+            }
+            self.spans.append(span)
+        return span
+
+    def end_span(self, span: Dict[str, Any], **attrs):
+        with self._lock:
+            span["attributes"].update(attrs)
+            span["end"] = time.time()
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Dict[str, Any]] = None, **attrs):
+        span = self.begin_span(name, parent, **attrs)
+        try:
+            yield span
+        finally:
+            self.end_span(span)
+
+    def record_span(self, name: str, start: float, end: float, parent: Optional[Dict[str, Any]] = None, **attrs):
+        span = self.begin_span(name, parent, **attrs)
+        with self._lock:
+            span["start"] = start
+            span["end"] = end
+
+    def set_attributes(self, **attrs):
+        with self._lock:
+            self.root["attributes"].update(attrs)
+
+    def profiled(self, func):
+        """Wrap a blocking call so the profiler samples the worker thread running it only until it returns"""
+        if not self.profiler:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = self.profiler
+            ident = threading.get_ident()
+            profiler.watch_thread(ident)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.unwatch_thread(ident)
+        return wrapper
+
+    def finish(self, status: str):
+        if self.status != "running":
+            return
+        self.status = status
+        self.end_span(self.root, status=status)
+        if self.profiler:
+            self.profile_file = self.profiler.stop()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [dict(s, attributes=dict(s["attributes"])) for s in self.spans]
+        by_id = {s["span_id"]: s for s in spans}
+        for s in spans:
+            s["duration_ms"] = round((s["end"] - s["start"]) * 1000, 2) if s["end"] else None
+            s["children"] = []
+        for s in spans:
+            if s["parent_id"] in by_id:
+                by_id[s["parent_id"]]["children"].append(s)
+        for s in spans:
+            s["children"].sort(key=lambda c: c["start"])
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "profile_file": self.profile_file,
+            "timeline": by_id[self.root["span_id"]],
+        }
+
+job_traces: "collections.OrderedDict[str, JobTrace]" = collections.OrderedDict()
+
+def start_trace(job_id: str, kind: str, **attrs) -> JobTrace:
+    trace = JobTrace(job_id, kind, **attrs)
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        # No thread is watched yet: JobTrace.profiled() adds the worker thread running each traced
+        # call, never the event loop, which every concurrent request shares
+        trace.profiler = SamplingProfiler(os.path.join(PROFILES_DIR, f"{kind}_{job_id}.folded"), job_id)
+        trace.profiler.start()
+    job_traces[job_id] = trace
+    while len(job_traces) > MAX_TRACES:
+        _, evicted = job_traces.popitem(last=False)
+        evicted.finish("evicted")
+    return trace
+
+@app.get("/api/traces")
+async def list_traces():
+    return {
+        "traces": [
+            {
+                "job_id": t.job_id,
+                "kind": t.kind,
+                "status": t.status,
+                "started_at": t.root["start"],
+                "duration_ms": round((t.root["end"] - t.root["start"]) * 1000, 2) if t.root["end"] else None,
+                "profiled": t.profiler is not None,
+            }
+            for t in reversed(job_traces.values())
+        ]
+    }
+
+@app.get("/api/traces/{job_id}")
+async def get_trace(job_id: str):
+    trace = job_traces.get(job_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace.to_dict()
+
+# ============================================
+# Fast JSON Responses (orjson, gzip/brotli, ?fields= selection)
+# ============================================
+try:
+    import orjson
+except ImportError:  # optional; stdlib json is used without it
+    orjson = None
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+JSON_COMPRESS_MIN_BYTES = int(os.environ.get("JSON_COMPRESS_MIN_BYTES", "1024"))
+JSON_COMPRESS_OFFLOAD_BYTES = 256 * 1024  # larger bodies are compressed off the event loop
+
+JSON_RESPONSE_BYTES = Counter("downloader_json_response_bytes_total", "JSON response bytes sent by content encoding")
+
+def dumps_json(payload: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload, default=str, option=orjson.OPT_NON_STR_KEYS)
+        except (TypeError, orjson.JSONEncodeError):
+            pass  # e.g. integers beyond 64 bits; the stdlib handles them
+    return json.dumps(payload, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def loads_json(data) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def parse_fields(fields: Optional[str]) -> Optional[Dict[str, Any]]:
+    """'title,video_formats.height' -> {'title': None, 'video_formats': {'height': None}}; None selects everything"""
+    if not fields:
+        return None
+    tree: Dict[str, Any] = {}
+    for path in fields.split(","):
+        parts = [p for p in path.strip().split(".") if p]
+        node = tree
+        for i, part in enumerate(parts):
+            if i == len(parts) - 1:
+                node[part] = None
+            elif node.get(part, {}) is None:
+                break  # a shorter path already selects the whole subtree
+            else:
+                node = node.setdefault(part, {})
+    return tree or None
+
+def select_fields(value: Any, tree: Optional[Dict[str, Any]]) -> Any:
+    """Keep only the selected keys; lists are transparent, so paths apply to every element"""
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [select_fields(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: select_fields(value[key], sub) for key, sub in tree.items() if key in value}
+    return value
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            offered[name] = q
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+async def json_response(request: Request, payload: Any, fields: Optional[str] = None, status_code: int = 200) -> Response:
+    """
+    Serialize straight to bytes (skipping FastAPI's jsonable_encoder pass), trim to the
+    requested fields and compress when the client accepts it and the body is worth it.
+    """
+    body = dumps_json(select_fields(payload, parse_fields(fields)))
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", "")) if len(body) >= JSON_COMPRESS_MIN_BYTES else None
+    if encoding:
+        if len(body) >= JSON_COMPRESS_OFFLOAD_BYTES:
+            body = await asyncio.to_thread(compress_body, body, encoding)
+        else:
+            body = compress_body(body, encoding)
+        headers["Content-Encoding"] = encoding
+    JSON_RESPONSE_BYTES.inc(len(body), encoding=encoding or "identity")
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
 # ============================================
 # Step 2: Enhanced Utility Functions
 # ============================================
@@ -243,12 +1241,13 @@ def extract_format_info(fmt: Dict) -> Dict[str, Any]:
         'quality_score': quality_score,
     }
 
+@timed_stage('format_selection')
 def find_best_format(formats: List[Dict], requested_height: int, format_type: str = 'video', platform: str = 'unknown') -> Optional[Dict]:
     if not formats:
         return None
     
     # ✅ FIX: Filter out HEVC/h265 formats for TikTok to avoid codec issues
-    filtered_formats = formats.copy()
+    filtered_formats = list(formats)
     if platform == 'tiktok':
         filtered_formats = [fmt for fmt in formats if 'hevc' not in (fmt.get('vcodec') or '').lower() and 'h265' not in (fmt.get('vcodec') or '').lower()]
         if not filtered_formats:
@@ -363,38 +1362,929 @@ def get_available_qualities(video_formats: List[Dict]) -> List[str]:
     return [quality_map.get(h, f"{h}p") for h in sorted_heights]
 
 # ============================================
-# Step 3: Data Models
+# Compact Media Metadata (kept by jobs instead of yt-dlp info dicts)
 # ============================================
-class VideoRequest(BaseModel):
-    url: str
+class SlotRecord:
+    """dict-style read access (get/[]/in) over __slots__, so callers written against info dicts keep working"""
+    __slots__ = ()
 
-class DownloadRequest(BaseModel):
-    url: str
-    format: str = "mp4"
-    quality: str
-    type: str = "video"
-    playlist: bool = False
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
 
-class SettingsRequest(BaseModel):
-    default_quality: str = "720p"
-    default_format: str = "mp4"
-    default_type: str = "video"
-    max_concurrent_downloads: int = 3
-    
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__ and getattr(self, key) is not None
 
+def _intern(value):
+    # ext/codec strings repeat across every format of every job
+    return sys.intern(value) if isinstance(value, str) else value
+
+class FormatRecord(SlotRecord):
+    """The fields extract_format_info, find_best_format and get_format_details read from a format"""
+    __slots__ = ('format_id', 'ext', 'height', 'width', 'resolution', 'vcodec', 'acodec', 'tbr', 'filesize', 'format_note')
+
+    def __init__(self, fmt: Dict[str, Any]):
+        self.format_id = fmt.get('format_id')
+        self.ext = _intern(fmt.get('ext'))
+        self.height = fmt.get('height')
+        self.width = fmt.get('width')
+        self.resolution = _intern(fmt.get('resolution'))
+        self.vcodec = _intern(fmt.get('vcodec'))
+        self.acodec = _intern(fmt.get('acodec'))
+        self.tbr = fmt.get('tbr')
+        self.filesize = fmt.get('filesize') or fmt.get('filesize_approx')
+        self.format_note = _intern(fmt.get('format_note'))
+
+class MediaInfo(SlotRecord):
+    """Video or playlist metadata as jobs use it; formats and entries are compacted recursively"""
+    __slots__ = ('id', '_type', 'title', 'url', 'webpage_url', 'thumbnail', 'duration', 'description', 'uploader',
+                 'upload_date', 'view_count', 'extractor_key', 'ie_key', 'formats', 'entries')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+def compact_info(info: Optional[Dict[str, Any]]) -> Optional[MediaInfo]:
+    """
+    Copy what jobs need out of a yt-dlp info dict. The dict itself (every format with its
+    URL, HTTP headers and fragment list, subtitles, thumbnails) can then be freed; for a
+    single YouTube video that is several MB, for a playlist many times more.
+    """
+    if info is None or isinstance(info, MediaInfo):
+        return info
+    entries = info.get('entries')
+    return MediaInfo(
+        id=info.get('id'),
+        _type=info.get('_type'),
+        title=info.get('title'),
+        url=info.get('url'),
+        webpage_url=info.get('webpage_url'),
+        thumbnail=info.get('thumbnail'),
+        duration=info.get('duration'),
+        description=info.get('description'),
+        uploader=info.get('uploader') or info.get('creator'),
+        upload_date=info.get('upload_date'),
+        view_count=info.get('view_count'),
+        extractor_key=_intern(info.get('extractor_key')),
+        ie_key=_intern(info.get('ie_key')),
+        formats=tuple(FormatRecord(fmt) for fmt in info.get('formats') or ()),
+        entries=[compact_info(entry) for entry in entries] if entries is not None else None,
+    )
 
 # ============================================
-# Step 4: Enhanced Video Information Endpoint
+# Reusable yt-dlp Instance Pool
 # ============================================
-@app.post("/api/video-info")
-async def get_video_info(req: VideoRequest):
+YDL_POOL_MAX_IDLE = int(os.environ.get("YDL_POOL_MAX_IDLE", "4"))  # idle instances kept per option set
+
+YDL_POOL_CHECKOUTS = Counter("downloader_ydl_pool_checkouts_total", "YoutubeDL pool checkouts by result")
+
+def build_ydl_opts(platform: str) -> Dict[str, Any]:
+    """Construction-time options shared by every job of a platform"""
+    opts = BASE_YDL_OPTS.copy()
+    opts['ffmpeg_location'] = get_ffmpeg_path()
+    opts.update(get_platform_opts(platform))
+    return opts
+
+# Extractors whose instances (and their player/signature caches) are handed from job to job
+POOLED_EXTRACTORS = {
+    'youtube': ('Youtube', 'YoutubeTab'),
+    'tiktok': ('TikTok',),
+    'twitter': ('Twitter',),
+    'instagram': ('Instagram',),
+    'facebook': ('Facebook',),
+    'reddit': ('Reddit',),
+    'vimeo': ('Vimeo',),
+    'dailymotion': ('Dailymotion',),
+}
+
+class YoutubeDLPool:
+    """
+    Every job gets a freshly constructed YoutubeDL, so per-job params (outtmpl, format,
+    hooks, postprocessors) are set up by yt-dlp itself and nothing leaks between jobs.
+    Only the expensive shared state is pooled: one cookie jar used by every instance
+    (saved back to cookies.txt on shutdown) and each platform's extractor instances,
+    which are checked out by exactly one job at a time.
+    """
+
+    def __init__(self, max_idle: int = YDL_POOL_MAX_IDLE):
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle: Dict[str, List[Dict[str, Any]]] = {}
+        self._cookiejar = None
+        self._ydl_class = None
+
+    def get_cookiejar(self):
+        with self._lock:
+            if self._cookiejar is None:
+                jar = yt_dlp.cookies.YoutubeDLCookieJar(BASE_YDL_OPTS.get('cookiefile'))
+                if jar.filename and os.path.exists(jar.filename):
+                    jar.load()
+                self._cookiejar = jar
+            return self._cookiejar
+
+    def _get_class(self):
+        if self._ydl_class is None:
+            pool = self
+
+            class PooledYoutubeDL(yt_dlp.YoutubeDL):
+                """YoutubeDL that uses the pool's cookie jar instead of loading its own"""
+
+                @property
+                def cookiejar(self):
+                    return pool.get_cookiejar()
+
+            self._ydl_class = PooledYoutubeDL
+        return self._ydl_class
+
+    @contextmanager
+    def checkout(self, platform: str, job_opts: Dict[str, Any]):
+        # The shared jar replaces per-instance cookie loading, and saving on close
+        params = {k: v for k, v in job_opts.items() if k != 'cookiefile'}
+        with self._lock:
+            idle = self._idle.get(platform)
+            extractors = idle.pop() if idle else None
+        YDL_POOL_CHECKOUTS.inc(result='hit' if extractors else 'miss')
+
+        with self._get_class()(params) as ydl:
+            for ie in (extractors or {}).values():
+                ydl.add_info_extractor(ie)
+            try:
+                yield ydl
+            finally:
+                extractors = {key: ydl.get_info_extractor(key) for key in POOLED_EXTRACTORS.get(platform, ())}
+                with self._lock:
+                    idle = self._idle.setdefault(platform, [])
+                    if extractors and len(idle) < self.max_idle:
+                        idle.append(extractors)
+
+    def close_all(self):
+        with self._lock:
+            self._idle.clear()
+            jar, self._cookiejar = self._cookiejar, None
+        if jar is not None and jar.filename:
+            try:
+                jar.save()
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to save shared cookie jar: {e}")
+
+ydl_pool = YoutubeDLPool()
+
+def run_pooled_download(platform: str, ydl_opts: Dict[str, Any], urls: List[str]):
+    with ydl_pool.checkout(platform, ydl_opts) as ydl:
+        return ydl.download(urls)
+
+@app.on_event("shutdown")
+async def close_ydl_pool():
+    # Closing saves the shared cookie jar back to cookies.txt
+    await asyncio.to_thread(ydl_pool.close_all)
+
+# ============================================
+# Per-Platform Rate Limiting (AIMD with jittered backoff)
+# ============================================
+RATE_LIMIT_MAX_RETRIES = int(os.environ.get("RATE_LIMIT_MAX_RETRIES", "4"))
+RATE_LIMIT_BASE_DELAY = 1.0
+RATE_LIMIT_MAX_DELAY = 60.0
+RATE_LIMIT_WINDOW = 60  # seconds of outcomes kept for the error/throttle ratios
+
+# (requests per second, concurrent requests, concurrent downloads) each platform starts from;
+# rate and request concurrency adapt below these, the download cap is fixed
+RATE_LIMIT_DEFAULTS: Dict[str, tuple] = {
+    "youtube": (2.0, 4, 6),
+    "tiktok": (1.0, 2, 4),
+    "instagram": (0.5, 2, 3),
+    "twitter": (1.0, 2, 4),
+    "facebook": (1.0, 2, 4),
+}
+RATE_LIMIT_FALLBACK = (2.0, 4, 6)
+
+THROTTLE_MARKERS = ("429", "too many requests", "rate limit", "rate-limit", "ratelimit",
+                    "try again later", "temporarily unavailable", "http error 503")
+
+RATE_LIMIT_RPS = Gauge("downloader_rate_limit_rps", "Current allowed requests per second by platform")
+RATE_LIMIT_CONCURRENCY = Gauge("downloader_rate_limit_concurrency", "Current allowed concurrent calls by platform")
+RATE_LIMIT_RETRIES = Counter("downloader_rate_limit_retries_total", "yt-dlp calls retried after throttling")
+
+async def wait_or_cancel(timeout: float, wakeup: Optional[asyncio.Event] = None,
+                         token: Optional["CancellationToken"] = None):
+    """Sleep up to timeout, returning early on wakeup; raises JobCancelled if the token fires meanwhile"""
+    waiters = [asyncio.ensure_future(event.wait()) for event in (wakeup, token.event if token else None) if event]
     try:
-        platform = detect_platform(req.url)
-        logger.info(f"Detected platform: {platform} for URL: {req.url}")
-        
-        opts = BASE_YDL_OPTS.copy()
-        opts.update(get_platform_opts(platform))
-        opts['noplaylist'] = True
+        if waiters:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        else:
+            await asyncio.sleep(timeout)
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+    if token:
+        token.check()
+
+class PlatformRateLimiter:
+    """
+    Token bucket for request rate plus concurrency caps, adapted AIMD-style: every success
+    adds a little back, every throttling signal halves rate and request concurrency and
+    starts a cool-down. Requests (extractions) and transfers (downloads) hold separate
+    slots, so long downloads never starve metadata requests; both need a rate token to
+    start. Callers wait on the event loop, not in worker threads.
+    """
+
+    def __init__(self, platform: str, max_rate: float, max_concurrency: int, max_downloads: int):
+        self.platform = platform
+        self.max_rate = max_rate
+        self.min_rate = 0.05
+        self.rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)
+        self.max_downloads = max_downloads
+        self.tokens = 1.0
+        self.in_flight = {"request": 0, "download": 0}
+        self.cooldown_until = 0.0
+        self.last_refill = time.monotonic()
+        self.outcomes: collections.deque = collections.deque()
+        self.totals = {"ok": 0, "throttled": 0, "error": 0, "cancelled": 0}
+        self._wakeup = asyncio.Event()
+        self._publish()
+
+    def _refill(self, now: float):
+        self.tokens = min(1.0, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def _slot_limit(self, slot: str) -> int:
+        return self.max_downloads if slot == "download" else max(1, int(self.concurrency))
+
+    async def acquire(self, slot: str = "request", token: Optional["CancellationToken"] = None):
+        while True:
+            if token:
+                token.check()
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.cooldown_until:
+                wait = self.cooldown_until - now
+            elif self.in_flight[slot] >= self._slot_limit(slot):
+                wait = 1.0
+            elif self.tokens < 1.0:
+                wait = (1.0 - self.tokens) / self.rate
+            else:
+                self.tokens -= 1.0
+                self.in_flight[slot] += 1
+                return
+            await wait_or_cancel(min(wait, 1.0), self._wakeup, token)
+
+    def release(self, slot: str, outcome: str, retry_after: Optional[float] = None):
+        now = time.monotonic()
+        self.in_flight[slot] -= 1
+        self.totals[outcome] += 1
+        # Cancelled calls say nothing about the platform: they free the slot and nothing else
+        if outcome != "cancelled":
+            self.outcomes.append((now, outcome))
+        while self.outcomes and self.outcomes[0][0] < now - RATE_LIMIT_WINDOW:
+            self.outcomes.popleft()
+
+        if outcome == "throttled":
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.concurrency = max(1.0, self.concurrency / 2)
+            cooldown = retry_after if retry_after else 1.0 / self.rate
+            self.cooldown_until = max(self.cooldown_until, now + min(cooldown, RATE_LIMIT_MAX_DELAY))
+            logger.warning(f"🐢 {self.platform} throttled: {self.rate:.2f} req/s, concurrency {int(self.concurrency)}")
+        elif outcome == "ok":
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+            self.concurrency = min(float(self.max_concurrency), self.concurrency + 1.0 / max(1.0, self.concurrency))
+        self._publish()
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    def _publish(self):
+        RATE_LIMIT_RPS.set(round(self.rate, 3), platform=self.platform)
+        RATE_LIMIT_CONCURRENCY.set(int(self.concurrency), platform=self.platform)
+
+    def state(self) -> Dict[str, Any]:
+        recent = collections.Counter(outcome for _, outcome in self.outcomes)
+        total = sum(recent.values())
+        return {
+            "platform": self.platform,
+            "rate": round(self.rate, 3),
+            "max_rate": self.max_rate,
+            "concurrency": int(self.concurrency),
+            "max_concurrency": self.max_concurrency,
+            "max_downloads": self.max_downloads,
+            "in_flight": self.in_flight["request"],
+            "downloads_in_flight": self.in_flight["download"],
+            "cooldown_remaining": round(max(0.0, self.cooldown_until - time.monotonic()), 2),
+            "recent": dict(recent),
+            "throttle_ratio": round(recent.get("throttled", 0) / total, 3) if total else 0.0,
+            "error_ratio": round(recent.get("error", 0) / total, 3) if total else 0.0,
+            "totals": dict(self.totals),
+        }
+
+rate_limiters: Dict[str, PlatformRateLimiter] = {}
+
+def get_rate_limiter(platform: str) -> PlatformRateLimiter:
+    if platform not in rate_limiters:
+        rate, concurrency, downloads = RATE_LIMIT_DEFAULTS.get(platform, RATE_LIMIT_FALLBACK)
+        rate_limiters[platform] = PlatformRateLimiter(platform, rate, concurrency, downloads)
+    return rate_limiters[platform]
+
+def classify_platform_error(e: Exception) -> tuple:
+    """('throttled', retry_after) for 429-style failures, ('error', None) otherwise"""
+    causes, current = [], e
+    while current is not None and len(causes) < 5:
+        causes.append(current)
+        exc_info = getattr(current, 'exc_info', None)
+        current = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else current.__cause__
+    for cause in causes:
+        status = getattr(cause, 'status', None) or getattr(cause, 'code', None)
+        if status == 429 or any(marker in str(cause).lower() for marker in THROTTLE_MARKERS):
+            retry_after = None
+            headers = getattr(getattr(cause, 'response', None), 'headers', None) or getattr(cause, 'headers', None)
+            try:
+                retry_after = float(headers.get('Retry-After')) if headers and headers.get('Retry-After') else None
+            except (TypeError, ValueError):
+                pass
+            return "throttled", retry_after
+    return "error", None
+
+async def run_rate_limited(platform: str, slot: str, func, *args, **kwargs):
+    """Run a blocking yt-dlp call in a worker thread once the limiter grants a slot, retrying throttling with jittered backoff"""
+    limiter = get_rate_limiter(platform)
+    token = current_cancel_token.get()
+    for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+        await limiter.acquire(slot, token)
+        call = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+        try:
+            result = await asyncio.shield(call)
+        except asyncio.CancelledError:
+            # The worker thread runs on; its slot is freed once the call really returns
+            def release_when_done(done: asyncio.Future):
+                if not done.cancelled():
+                    done.exception()
+                limiter.release(slot, "cancelled")
+            call.add_done_callback(release_when_done)
+            raise
+        except Exception as e:
+            if isinstance(e, JobCancelled) or type(e).__name__ == 'DownloadCancelled' or (token and token.cancelled):
+                limiter.release(slot, "cancelled")
+                raise
+            outcome, retry_after = classify_platform_error(e)
+            limiter.release(slot, outcome, retry_after)
+            if outcome != "throttled" or attempt == RATE_LIMIT_MAX_RETRIES:
+                raise
+            ceiling = min(RATE_LIMIT_MAX_DELAY, RATE_LIMIT_BASE_DELAY * 2 ** attempt)
+            delay = max(random.uniform(ceiling / 2, ceiling), retry_after or 0)
+            RATE_LIMIT_RETRIES.inc(platform=platform)
+            logger.info(f"🔁 {platform} throttled, retry {attempt + 1}/{RATE_LIMIT_MAX_RETRIES} in {delay:.1f}s")
+            await wait_or_cancel(delay, token=token)
+            continue
+        limiter.release(slot, "ok")
+        return result
+
+async def call_with_rate_limit(platform: str, func, *args, **kwargs):
+    """Metadata requests (extraction); they hold a request slot"""
+    return await run_rate_limited(platform, "request", func, *args, **kwargs)
+
+async def download_with_rate_limit(platform: str, func, *args, **kwargs):
+    """Transfers hold a download slot, so extraction requests keep flowing while they run"""
+    return await run_rate_limited(platform, "download", func, *args, **kwargs)
+
+def extract_info_pooled(platform: str, ydl_opts: Dict[str, Any], url: str, **kwargs) -> Dict[str, Any]:
+    with ydl_pool.checkout(platform, ydl_opts) as ydl:
+        return ydl.extract_info(url, download=False, **kwargs)
+
+def extract_compact_info(platform: str, ydl_opts: Dict[str, Any], url: str) -> MediaInfo:
+    # Compacted inside the worker thread, so the full info dict never outlives the extraction
+    return compact_info(extract_info_pooled(platform, ydl_opts, url))
+
+@app.get("/api/rate-limits")
+async def get_rate_limits():
+    return {"platforms": [limiter.state() for limiter in list(rate_limiters.values())]}
+
+# ============================================
+# Media Process Runner (every ffmpeg/ffprobe call goes through here)
+# ============================================
+MEDIA_PROCESS_CONCURRENCY = int(os.environ.get("MEDIA_PROCESS_CONCURRENCY", str(os.cpu_count() or 2)))
+FFPROBE_TIMEOUT = float(os.environ.get("FFPROBE_TIMEOUT", "30"))
+FFMPEG_TIMEOUT = float(os.environ.get("FFMPEG_TIMEOUT", "3600"))
+MEDIA_STDERR_LIMIT = 64 * 1024
+MEDIA_STDOUT_LIMIT = 16 * 1024 * 1024
+
+MEDIA_PROCESSES = Gauge("downloader_media_processes", "ffmpeg/ffprobe processes currently running")
+MEDIA_PROCESS_KILLS = Counter("downloader_media_process_kills_total", "Media processes killed by reason")
+
+_media_semaphore: Optional[asyncio.Semaphore] = None
+
+class MediaProcessError(Exception):
+    def __init__(self, message: str, returncode: Optional[int] = None, stderr: str = ""):
+        super().__init__(message)
+        self.returncode = returncode
+        self.stderr = stderr
+
+class MediaProcessTimeout(MediaProcessError):
+    pass
+
+class MediaProcessResult:
+    __slots__ = ("returncode", "stdout", "stderr", "elapsed")
+
+    def __init__(self, returncode: int, stdout: bytes, stderr: str, elapsed: float):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.elapsed = elapsed
+
+def get_media_semaphore() -> asyncio.Semaphore:
+    global _media_semaphore
+    if _media_semaphore is None:
+        _media_semaphore = asyncio.Semaphore(max(1, MEDIA_PROCESS_CONCURRENCY))
+    return _media_semaphore
+
+def kill_process_tree(process: asyncio.subprocess.Process):
+    """Processes start in their own session, so the whole group (ffmpeg helpers included) goes"""
+    if process.returncode is not None:
+        return
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, 9)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+async def run_media_process(cmd: List[str], *, timeout: Optional[float], stage: Optional[str] = None,
+                            trace: Optional["JobTrace"] = None, on_stdout_line=None, stdin_feeder=None,
+                            check: bool = True) -> MediaProcessResult:
+    """
+    Run ffmpeg/ffprobe without blocking the event loop. Concurrency is capped by a global
+    semaphore, stderr is kept to its last MEDIA_STDERR_LIMIT bytes, and on timeout or task
+    cancellation the process group is killed. on_stdout_line (sync or async) receives decoded
+    stdout lines instead of them being buffered; stdin_feeder is awaited with the stdin writer.
+    """
+    async with get_media_semaphore():
+        started = time.perf_counter()
+        span = trace.begin_span(stage) if trace and stage else None
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE if stdin_feeder else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=hasattr(os, "killpg"),
+        )
+        MEDIA_PROCESSES.inc()
+        token = current_cancel_token.get()
+        if token:
+            token.attach_process(process)
+        stdout_buf = bytearray()
+        stderr_buf = bytearray()
+
+        async def read_stdout():
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                if on_stdout_line is not None:
+                    result = on_stdout_line(line.decode(errors='replace').strip())
+                    if asyncio.iscoroutine(result):
+                        await result
+                elif len(stdout_buf) < MEDIA_STDOUT_LIMIT:
+                    stdout_buf.extend(line)
+
+        async def read_stderr():
+            while True:
+                chunk = await process.stderr.read(8192)
+                if not chunk:
+                    break
+                stderr_buf.extend(chunk)
+                if len(stderr_buf) > MEDIA_STDERR_LIMIT:
+                    del stderr_buf[:len(stderr_buf) - MEDIA_STDERR_LIMIT]
+
+        async def feed_stdin():
+            try:
+                await stdin_feeder(process.stdin)
+            except (BrokenPipeError, ConnectionResetError) as e:
+                logger.warning(f"⚠️ Media process stopped reading input: {e}")
+            finally:
+                if not process.stdin.is_closing():
+                    process.stdin.close()
+
+        workers = [read_stdout(), read_stderr()]
+        if stdin_feeder:
+            workers.append(feed_stdin())
+        try:
+            await asyncio.wait_for(asyncio.gather(*workers, process.wait()), timeout)
+        except asyncio.TimeoutError:
+            kill_process_tree(process)
+            await process.wait()
+            MEDIA_PROCESS_KILLS.inc(reason='timeout')
+            raise MediaProcessTimeout(f"{os.path.basename(cmd[0])} timed out after {timeout}s",
+                                      stderr=stderr_buf.decode(errors='replace'))
+        except BaseException as e:
+            # Cancelled task or a failing line callback: never leave the process behind
+            kill_process_tree(process)
+            MEDIA_PROCESS_KILLS.inc(reason='cancelled' if isinstance(e, asyncio.CancelledError) else 'error')
+            raise
+        finally:
+            MEDIA_PROCESSES.dec()
+            if token:
+                token.detach_process(process)
+            elapsed = time.perf_counter() - started
+            if stage:
+                STAGE_DURATION.observe(elapsed, stage=stage)
+            if span:
+                trace.end_span(span, returncode=process.returncode)
+
+        stderr = stderr_buf.decode(errors='replace')
+        if check and process.returncode != 0:
+            raise MediaProcessError(f"{os.path.basename(cmd[0])} exited with {process.returncode}: {stderr.strip()[-500:]}",
+                                    returncode=process.returncode, stderr=stderr)
+        return MediaProcessResult(process.returncode, bytes(stdout_buf), stderr, elapsed)
+
+# ============================================
+# Cancellation Tokens (downloads and conversions)
+# ============================================
+CANCEL_LATENCY = Histogram("downloader_cancel_latency_seconds", "Time from cancel request until the job stopped")
+
+# Set per job task; run_media_process registers its processes with it (contexts follow to_thread too)
+current_cancel_token: contextvars.ContextVar = contextvars.ContextVar("current_cancel_token", default=None)
+
+class JobCancelled(Exception):
+    pass
+
+# Downloads write every intermediate file into their own directory under here; only the
+# finished file is moved into DOWNLOADS_DIR, so cancelling one job can't touch another's files
+JOBS_TEMP_DIR = os.path.join(DOWNLOADS_DIR, ".jobs")
+
+def job_temp_dir(job_id: str) -> str:
+    return os.path.join(JOBS_TEMP_DIR, job_id)
+
+class CancellationToken:
+    """
+    Cancels every stage of one job: flags the yt-dlp progress hook, kills media processes
+    started through run_media_process and ffmpeg children yt-dlp spawned itself (merges,
+    postprocessors), and removes the partial files the job created.
+    """
+
+    def __init__(self, job_id: str, kind: str):
+        self.job_id = job_id
+        self.kind = kind
+        self.started_at = time.time()
+        self.cancelled = False
+        self.requested_at: Optional[float] = None
+        self.temp_dir: Optional[str] = None  # private to this job; yt-dlp's ffmpeg children reference it
+        self.partial_paths: List[str] = []
+        self._processes: set = set()
+        self._lock = threading.Lock()
+        # Set on cancel so waits on the event loop (rate limiter, backoff) end right away
+        self._loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def cancel(self) -> bool:
+        with self._lock:
+            if self.cancelled:
+                return False
+            self.cancelled = True
+            self.requested_at = time.perf_counter()
+            processes = list(self._processes)
+        self._loop.call_soon_threadsafe(self.event.set)
+        for process in processes:
+            kill_process_tree(process)
+        if self.temp_dir:
+            killed = kill_child_processes(self.temp_dir)
+            if killed:
+                logger.info(f"🔪 Killed {killed} yt-dlp child process(es) for {self.job_id}")
+        return True
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelled(f"{self.kind} {self.job_id} cancelled")
+
+    def attach_process(self, process):
+        with self._lock:
+            self._processes.add(process)
+            cancelled = self.cancelled
+        if cancelled:
+            kill_process_tree(process)
+
+    def detach_process(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+    def track_path(self, path: str):
+        """Register an exact output path this job writes outside its temp dir"""
+        self.partial_paths.append(path)
+
+    def remove_partials(self) -> int:
+        """Delete the job's temp dir and the tracked paths it wrote after it started"""
+        removed = 0
+        if self.temp_dir and os.path.isdir(self.temp_dir):
+            removed += sum(len(files) for _, _, files in os.walk(self.temp_dir))
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+        for path in self.partial_paths:
+            try:
+                if os.path.getmtime(path) >= self.started_at - 1:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def stopped(self) -> Optional[float]:
+        """Call once the job has actually stopped; records and returns cancel latency"""
+        if self.requested_at is None:
+            return None
+        latency = time.perf_counter() - self.requested_at
+        CANCEL_LATENCY.observe(latency, kind=self.kind)
+        return latency
+
+cancel_tokens: Dict[str, CancellationToken] = {}
+
+def create_cancel_token(job_id: str, kind: str) -> CancellationToken:
+    token = CancellationToken(job_id, kind)
+    cancel_tokens[job_id] = token
+    current_cancel_token.set(token)
+    return token
+
+def release_cancel_token(job_id: str):
+    cancel_tokens.pop(job_id, None)
+
+def cancel_job(job_id: str) -> bool:
+    """Cancel a local download or conversion; False if this worker does not know the job"""
+    found = False
+    if job_id in active_downloads:
+        # Queued jobs have no token yet; run_download_job checks these flags when it starts
+        active_downloads[job_id]["active"] = False
+        active_downloads[job_id]["cancelled"] = True
+        found = True
+    token = cancel_tokens.get(job_id)
+    if token:
+        token.cancel()
+        found = True
+    return found
+
+def kill_child_processes(temp_dir: str) -> int:
+    """
+    Kill this process's children whose command line references a job's private temp dir
+    (Linux /proc only). The dir name is the job id, so no other job's process can match.
+    """
+    if not os.path.isdir('/proc'):
+        return 0
+    own_pid = os.getpid()
+    # ".jobs/<job id>" appears in every path yt-dlp hands to ffmpeg for this job
+    match = os.path.relpath(temp_dir, DOWNLOADS_DIR)
+    killed = 0
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # "pid (comm) state ppid ..." - comm may contain spaces and parentheses
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            if ppid != own_pid:
+                continue
+            with open(f'/proc/{entry}/cmdline', 'rb') as f:
+                cmdline = f.read().replace(b'\0', b' ').decode(errors='replace')
+            if match in cmdline:
+                os.kill(int(entry), 9)
+                killed += 1
+        except (OSError, ValueError, IndexError):
+            continue
+    return killed
+
+# ============================================
+# Pipelined Audio Transcode (encode while downloading)
+# ============================================
+PIPELINED_AUDIO = os.environ.get("PIPELINED_AUDIO", "1") == "1"
+PIPE_CHUNK_SIZE = 256 * 1024
+
+# ffmpeg encoder arguments per requested audio format
+AUDIO_ENCODERS: Dict[str, List[str]] = {
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "192k"],
+    "m4a": ["-c:a", "aac", "-b:a", "192k"],
+    "aac": ["-c:a", "aac", "-b:a", "192k"],
+    "opus": ["-c:a", "libopus", "-b:a", "192k"],
+    "ogg": ["-c:a", "libvorbis", "-b:a", "192k"],
+    "flac": ["-c:a", "flac"],
+    "wav": ["-c:a", "pcm_s16le"],
+}
+
+def pipelined_audio_supported(codec: str) -> bool:
+    return PIPELINED_AUDIO and codec in AUDIO_ENCODERS
+
+async def run_pipelined_audio_download(platform: str, ydl_opts: Dict[str, Any], url: str, output_path: str, codec: str,
+                                       duration: Optional[float] = None, on_encode_progress=None,
+                                       trace: Optional["JobTrace"] = None) -> str:
+    """
+    Download bestaudio and encode it in one pass: the growing .part file is tailed into
+    ffmpeg's stdin, so encoding overlaps the transfer instead of following it. The open
+    handle survives yt-dlp's rename on completion. If ffmpeg cannot decode the stream
+    from a pipe (e.g. an mp4 with a trailing moov atom) the finished file is encoded
+    the usual way. Returns the path of the encoded file.
+    """
+    loop = asyncio.get_running_loop()
+    encode_args = AUDIO_ENCODERS[codec]
+    content_store.release(output_path)
+    cmd = [get_ffmpeg_path(), '-hide_banner', '-loglevel', 'error', '-y', '-i', 'pipe:0', '-vn',
+           *encode_args, '-progress', 'pipe:1', '-nostats', output_path]
+    source_seen = asyncio.Event()
+    download_done = asyncio.Event()
+    state: Dict[str, Any] = {"source": None, "final": None}
+
+    def pipeline_hook(d):
+        # Runs on the yt-dlp thread; events are set on the loop so ordering with the writes holds
+        if d['status'] == 'downloading' and state["source"] is None:
+            state["source"] = d.get('tmpfilename') or d.get('filename')
+            loop.call_soon_threadsafe(source_seen.set)
+        elif d['status'] == 'finished':
+            state["final"] = d.get('filename')
+            loop.call_soon_threadsafe(source_seen.set)
+
+    async def download():
+        job_opts = dict(ydl_opts)
+        job_opts['postprocessors'] = []
+        job_opts['progress_hooks'] = list(ydl_opts.get('progress_hooks') or []) + [pipeline_hook]
+        try:
+            await download_with_rate_limit(platform, trace.profiled(run_pooled_download) if trace else run_pooled_download,
+                                           platform, job_opts, [url])
+        finally:
+            download_done.set()
+
+    async def feed(stdin: asyncio.StreamWriter):
+        waiters = [asyncio.ensure_future(source_seen.wait()), asyncio.ensure_future(download_done.wait())]
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in waiters:
+            waiter.cancel()
+        path = state["source"] or state["final"]
+        if not path or not os.path.exists(path):
+            return
+        async with aiofiles.open(path, 'rb') as src:
+            while True:
+                chunk = await src.read(PIPE_CHUNK_SIZE)
+                if chunk:
+                    stdin.write(chunk)
+                    await stdin.drain()
+                elif download_done.is_set():
+                    # Everything yt-dlp wrote before signalling completion is now read
+                    break
+                else:
+                    await asyncio.sleep(0.05)
+
+    last_reported = [-1]
+
+    def on_progress_line(line: str):
+        if not line.startswith('out_time_us=') or not duration or not on_encode_progress:
+            return
+        try:
+            seconds = int(line.split('=', 1)[1]) / 1_000_000
+        except ValueError:
+            return
+        percent = min(100.0, seconds / duration * 100)
+        if int(percent) != last_reported[0]:
+            last_reported[0] = int(percent)
+            on_encode_progress(round(percent, 2))
+
+    with track_stage('audio_pipeline', trace, codec=codec):
+        # The encoder lives as long as the transfer; its timeout starts once the download is done
+        encode_task = asyncio.ensure_future(run_media_process(
+            cmd, timeout=None, stage='audio_transcode', on_stdout_line=on_progress_line,
+            stdin_feeder=feed, check=False
+        ))
+        try:
+            await download()
+            result = await asyncio.wait_for(asyncio.shield(encode_task), FFMPEG_TIMEOUT)
+        except BaseException:
+            encode_task.cancel()
+            raise
+        source = state["final"] or state["source"]
+        if not source:
+            raise Exception("Downloaded audio not found")
+
+        if result.returncode != 0:
+            logger.warning(f"⚠️ Pipelined encode failed ({result.stderr.strip()[-300:]}), encoding finished file")
+            fallback = [get_ffmpeg_path(), '-hide_banner', '-loglevel', 'error', '-y', '-i', source, '-vn', *encode_args, output_path]
+            await run_media_process(fallback, timeout=FFMPEG_TIMEOUT, stage='audio_transcode', trace=trace)
+
+    if os.path.abspath(source) != os.path.abspath(output_path) and os.path.exists(source):
+        os.remove(source)
+    return output_path
+
+# ============================================
+# Time-Range Clips (download only the requested section)
+# ============================================
+def parse_timestamp(value) -> Optional[float]:
+    """Seconds from 90, 90.5, '01:30' or '1:02:03.5'; None or '' leaves that side open"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        seconds = 0.0
+        try:
+            for part in str(value).strip().split(":"):
+                seconds = seconds * 60 + float(part)
+        except ValueError:
+            raise ValueError(f"Invalid timestamp: {value}")
+    if seconds < 0:
+        raise ValueError(f"Timestamp must not be negative: {value}")
+    return seconds
+
+def resolve_clip(clip: Optional[Dict[str, Any]], duration: Optional[float]) -> Optional[Dict[str, Any]]:
+    """Validate a requested {start, end, precise} range against the video length; None means the whole video"""
+    if not clip or (clip.get("start") in (None, "") and clip.get("end") in (None, "")):
+        return None
+    start = parse_timestamp(clip.get("start")) or 0.0
+    end = parse_timestamp(clip.get("end"))
+    if duration:
+        if start >= duration:
+            raise ValueError(f"Clip start {start:g}s is beyond the end of the video ({duration:g}s)")
+        end = min(end, float(duration)) if end is not None else float(duration)
+    if end is None:
+        raise ValueError("Clip end is required when the video length is unknown")
+    if end <= start:
+        raise ValueError("Clip end must be after its start")
+    return {"start": start, "end": end, "precise": bool(clip.get("precise"))}
+
+def clip_suffix(clip: Optional[Dict[str, Any]]) -> str:
+    # Keeps clips from colliding with the full video (and with each other) on disk
+    return f"_clip_{clip['start']:g}-{clip['end']:g}" if clip else ""
+
+FFMPEG_BIN_DIR = os.path.join(DOWNLOADS_DIR, ".bin")
+
+@functools.lru_cache(maxsize=None)
+def ensure_ffmpeg_on_path() -> bool:
+    """
+    yt-dlp picks the ffmpeg downloader that download_ranges needs by looking for a binary
+    named `ffmpeg` on PATH; ffmpeg_location is not consulted there. imageio-ffmpeg's binary
+    has a versioned name, so link it as `ffmpeg` in a directory put in front of PATH.
+    """
+    if not shutil.which("ffmpeg"):
+        link_path = os.path.join(FFMPEG_BIN_DIR, "ffmpeg.exe" if os.name == "nt" else "ffmpeg")
+        try:
+            os.makedirs(FFMPEG_BIN_DIR, exist_ok=True)
+            if not os.path.exists(link_path):
+                os.symlink(os.path.abspath(get_ffmpeg_path()), link_path)
+        except OSError:
+            # No symlinks (e.g. unprivileged Windows): a copy works just as well
+            shutil.copy2(get_ffmpeg_path(), link_path)
+        os.environ["PATH"] = os.path.abspath(FFMPEG_BIN_DIR) + os.pathsep + os.environ.get("PATH", "")
+    return yt_dlp.downloader.external.FFmpegFD.available()
+
+def apply_clip_options(ydl_opts: Dict[str, Any], clip: Dict[str, Any]):
+    """
+    download_ranges makes yt-dlp request only the section: HLS/DASH fetch just the fragments
+    covering it, progressive files are read by ffmpeg seeking over HTTP. Cuts snap to
+    keyframes unless precise is set, which re-encodes around the cut points.
+    """
+    if not ensure_ffmpeg_on_path():
+        raise HTTPException(status_code=503, detail="Clip downloads need ffmpeg, which could not be found")
+    ydl_opts['download_ranges'] = yt_dlp.utils.download_range_func(None, [(clip['start'], clip['end'])])
+    ydl_opts['force_keyframes_at_cuts'] = clip['precise']
+    logger.info(f"✂️ Clip {clip['start']:g}s-{clip['end']:g}s ({'precise' if clip['precise'] else 'keyframe'} cut)")
+
+# ============================================
+# Step 3: Data Models
+# ============================================
+class VideoRequest(BaseModel):
+    url: str
+
+class DownloadRequest(BaseModel):
+    url: str
+    format: str = "mp4"
+    quality: str
+    type: str = "video"
+    playlist: bool = False
+    sync: bool = False  # playlists only: skip entries already in the download archive
+    start: Optional[Union[float, str]] = None  # clip range, seconds or [HH:]MM:SS
+    end: Optional[Union[float, str]] = None
+    precise_cut: bool = False  # re-encode at the cut points instead of snapping to keyframes
+
+class SettingsRequest(BaseModel):
+    default_quality: str = "720p"
+    default_format: str = "mp4"
+    default_type: str = "video"
+    max_concurrent_downloads: int = 3
+
+class BatchItem(BaseModel):
+    url: str
+    type: str = "video"
+    quality: Optional[str] = None
+    format: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+    
+
+
+# ============================================
+# Step 4: Enhanced Video Information Endpoint
+# ============================================
+@app.post("/api/video-info")
+async def get_video_info(req: VideoRequest, request: Request, fields: Optional[str] = None):
+    try:
+        platform = detect_platform(req.url)
+        logger.info(f"Detected platform: {platform} for URL: {req.url}")
+        
+        opts = build_ydl_opts(platform)
+        opts['noplaylist'] = True
         
         # ✅ FIX: Special handling for Instagram and Twitter
         if platform == 'instagram':
@@ -402,8 +2292,8 @@ async def get_video_info(req: VideoRequest):
         elif platform == 'twitter':
             opts['format'] = 'bestvideo+bestaudio/best'
         
-        with yt_dlp.YoutubeDL(opts) as ydl:
-            info = ydl.extract_info(req.url, download=False)
+        with track_stage('extraction'):
+            info = await call_with_rate_limit(platform, extract_compact_info, platform, opts, req.url)
         
         video_formats, audio_formats = get_format_details(info.get('formats', []))
         available_qualities = get_available_qualities(video_formats)
@@ -425,7 +2315,7 @@ async def get_video_info(req: VideoRequest):
             "recommended_quality": recommended_quality,
         }
         
-        return response_data
+        return await json_response(request, response_data, fields)
         
     except Exception as e:
         logger.error(f"Video info error for {req.url}: {e}", exc_info=True)
@@ -434,76 +2324,29 @@ async def get_video_info(req: VideoRequest):
 # ============================================
 # Step 5: FIXED WebSocket Download System with TikTok & Twitter Support
 # ============================================
-@app.websocket("/ws/download/{download_id}")
-async def websocket_download(websocket: WebSocket, download_id: str):
-    await websocket.accept()
-    
-    loop = asyncio.get_event_loop()
+async def run_download_job(download_id: str, resume: bool = False, info: Optional[MediaInfo] = None):
+    """
+    Run the download described by download_sessions[download_id], publishing updates to the
+    progress hub. `info` skips extraction when the caller already resolved it. Returns the
+    final session state.
+    """
+    session = download_sessions[download_id]
+    url = session["url"]
+    format_type = session.get("type", "video")
+    quality = session.get("quality", user_settings.get("default_quality", "720p"))
+    audio_format = session.get("format", user_settings.get("default_format", "mp4"))
+    platform = session.get("platform") or detect_platform(url)
+
+    ACTIVE_JOBS.inc(kind='ws_download')
+    trace = start_trace(download_id, 'ws_download', platform=platform, type=format_type, quality=quality, url=url, resumed=resume)
+    token = create_cancel_token(download_id, 'download')
+    if active_downloads.get(download_id, {}).get("cancelled"):
+        # Cancelled while still queued
+        token.cancel()
     
     try:
-        existing_session = download_sessions.get(download_id)
-        is_reconnect = existing_session and existing_session.get("status") in ["initializing", "downloading", "processing"]
-        
-        if is_reconnect:
-            logger.info(f"🔄 RECONNECTION: Client reconnected to existing download: {download_id}")
-            
-            active_downloads[download_id] = {
-                "websocket": websocket,
-                "active": True,
-                "cancelled": False,
-                "reconnected_at": datetime.now().isoformat()
-            }
-            
-            current_progress = existing_session.get("progress", 0)
-            await websocket.send_json({
-                "status": "reconnected",
-                "percent": current_progress,
-                "message": f"Reconnected! Download is {current_progress:.1f}% complete",
-                "total": existing_session.get("total", "Calculating..."),
-                "speed": existing_session.get("speed", "Unknown"),
-                "eta": existing_session.get("eta", "Unknown")
-            })
-            
-            logger.info(f"✅ Successfully reconnected client to download {download_id} at {current_progress}%")
-            
-            while (download_id in active_downloads and 
-                   active_downloads[download_id].get("active", False) and
-                   not active_downloads[download_id].get("cancelled", False)):
-                await asyncio.sleep(1)
-            
-            return
-        
-        # NEW DOWNLOAD
-        data = await websocket.receive_json()
-        url = data.get("url")
-        format_type = data.get("type", "video")
-        quality = data.get("quality", user_settings.get("default_quality", "720p"))
-        audio_format = data.get("format", user_settings.get("default_format", "mp4"))
-
-        platform = detect_platform(url)
-        logger.info(f"🎬 Starting NEW download: {platform} | Quality: {quality} | Type: {format_type}")
-
-        active_downloads[download_id] = {
-            "websocket": websocket,
-            "active": True,
-            "cancelled": False
-        }
-        download_sessions[download_id] = {
-            "url": url,
-            "type": format_type,
-            "quality": quality,
-            "format": audio_format,
-            "status": "initializing",
-            "progress": 0,
-            "started_at": datetime.now().isoformat(),
-            "title": "Unknown",
-            "speed": "Unknown",
-            "eta": "Unknown"
-        }
-        save_sessions()
-
-        ydl_opts = BASE_YDL_OPTS.copy()
-        ydl_opts.update(get_platform_opts(platform))
+        token.check()
+        ydl_opts = build_ydl_opts(platform)
         ydl_opts['noplaylist'] = True
 
         # ✅ FIX: Enhanced platform-specific configuration
@@ -520,42 +2363,51 @@ async def websocket_download(websocket: WebSocket, download_id: str):
             })
             logger.info("🔧 Applied Twitter-specific download settings")
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+        if info is None:
+            with track_stage('extraction', trace):
+                info = await call_with_rate_limit(platform, trace.profiled(extract_compact_info), platform, ydl_opts, url)
 
         download_sessions[download_id]["title"] = info.get('title', 'Unknown')
-        save_sessions()
+        save_sessions(download_id)
 
-        base_filename = clean_filename(info.get('title', 'video'))
+        clip = resolve_clip(session.get("clip"), info.get('duration'))
+        base_filename = clean_filename(info.get('title', 'video') + clip_suffix(clip))
         requested_height = parse_quality_request(quality)
+        # Output templates are relative: yt-dlp works in the job's temp dir and moves the result home
+        job_dir = job_temp_dir(download_id)
+        os.makedirs(job_dir, exist_ok=True)
+        token.temp_dir = job_dir
+        ydl_opts['paths'] = {'home': DOWNLOADS_DIR, 'temp': os.path.relpath(job_dir, DOWNLOADS_DIR)}
 
         if format_type == "audio":
-            ydl_opts['outtmpl'] = os.path.join(DOWNLOADS_DIR, f"{base_filename}.%(ext)s")
             ydl_opts['format'] = 'bestaudio/best'
-            ydl_opts['postprocessors'] = [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': audio_format,
-                'preferredquality': '192',
-            }]
+            if pipelined_audio_supported(audio_format) and not clip:
+                # Encoded by run_pipelined_audio_download while the source is still downloading
+                ydl_opts['outtmpl'] = os.path.join(job_dir, f"{base_filename}.source.%(ext)s")
+            else:
+                ydl_opts['outtmpl'] = f"{base_filename}.%(ext)s"
+                ydl_opts['postprocessors'] = [{
+                    'key': 'FFmpegExtractAudio',
+                    'preferredcodec': audio_format,
+                    'preferredquality': '192',
+                }]
             final_ext = audio_format
             logger.info(f"🎵 Audio download: format={audio_format}")
 
         elif format_type == "video":
-            # Get all available formats
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-            
+            # Formats come from the extraction above; no second extract_info round-trip
+            selection_started = time.time()
             # ✅ FIX: Special handling for different platforms
             if platform in ['instagram', 'twitter']:
                 # Instagram & Twitter: Use combined format approach
-                ydl_opts['outtmpl'] = os.path.join(DOWNLOADS_DIR, f"{base_filename}_{quality}.%(ext)s")
+                ydl_opts['outtmpl'] = f"{base_filename}_{quality}.%(ext)s"
                 ydl_opts['format'] = 'bestvideo+bestaudio/best'
                 ydl_opts['merge_output_format'] = 'mp4'
                 final_ext = 'mp4'
                 logger.info(f"🎥 {platform.capitalize()} video download: Using bestvideo+bestaudio format")
             elif platform == 'tiktok':
                 # ✅ FIX: TikTok - Avoid HEVC codec and ensure audio merging
-                ydl_opts['outtmpl'] = os.path.join(DOWNLOADS_DIR, f"{base_filename}_{quality}.%(ext)s")
+                ydl_opts['outtmpl'] = f"{base_filename}_{quality}.%(ext)s"
                 
                 # Find best non-HEVC format
                 best_format = find_best_format(info.get('formats', []), requested_height, format_type, platform)
@@ -610,21 +2462,42 @@ async def websocket_download(websocket: WebSocket, download_id: str):
                     else:
                         logger.warning("⚠️ No audio stream found - video will be silent")
                 
-                ydl_opts['outtmpl'] = os.path.join(DOWNLOADS_DIR, f"{base_filename}_{quality}.%(ext)s")
+                ydl_opts['outtmpl'] = f"{base_filename}_{quality}.%(ext)s"
                 ydl_opts['format'] = format_id
                 ydl_opts['merge_output_format'] = 'mp4'
                 final_ext = 'mp4'
                 logger.info(f"🎥 Video download: {quality} -> format_id={format_id} (has_audio: {has_audio})")           
+            trace.record_span('format_selection', selection_started, time.time(), format_id=ydl_opts.get('format'))
 
         else:  # thumbnail
-            ydl_opts['outtmpl'] = os.path.join(DOWNLOADS_DIR, f"{base_filename}_thumbnail.%(ext)s")
-            ydl_opts['writethumbnail'] = True
-            ydl_opts['skip_download'] = True
+            # Thumbnail URL is already in the extracted info, fetch it through the cache
+            thumbnail_url = info.get('thumbnail')
+            if not thumbnail_url:
+                raise ValueError("No thumbnail available")
             final_ext = 'jpg'
             logger.info(f"🖼️ Thumbnail download")
 
+        if clip and format_type in ("audio", "video"):
+            apply_clip_options(ydl_opts, clip)
+
+        resume_state = download_sessions[download_id].get("resume")
+        if resume and resume_state:
+            # Keep the exact format and output template so yt-dlp finds the existing .part files
+            ydl_opts['format'] = resume_state.get('format') or ydl_opts.get('format')
+            ydl_opts['outtmpl'] = resume_state.get('outtmpl') or ydl_opts.get('outtmpl')
+            logger.info(f"♻️ Resuming {download_id} with format={ydl_opts.get('format')}")
+        else:
+            download_sessions[download_id]["resume"] = {
+                "format": ydl_opts.get('format'),
+                "outtmpl": ydl_opts.get('outtmpl'),
+            }
+            save_sessions(download_id)
+        ydl_opts['continuedl'] = True
+
+        token.check()
+
         def progress_hook(d):
-            if not active_downloads.get(download_id, {}).get("active", False):
+            if token.cancelled or not active_downloads.get(download_id, {}).get("active", False):
                 raise yt_dlp.utils.DownloadCancelled("Download cancelled")
 
             if d['status'] == 'downloading':
@@ -644,6 +2517,7 @@ async def websocket_download(websocket: WebSocket, download_id: str):
 
                 msg = {
                     "status": "downloading",
+                    "stage": "download",
                     "percent": round(percent, 2),
                     "total": clean_ansi(d.get('_total_bytes_str', 'Unknown')),
                     "speed": clean_ansi(d.get('_speed_str', 'Unknown')),
@@ -658,38 +2532,61 @@ async def websocket_download(websocket: WebSocket, download_id: str):
                     "speed": msg["speed"],
                     "eta": msg["eta"]
                 })
-                save_sessions()
-                
-                ws = active_downloads.get(download_id, {}).get("websocket")
-                if ws:
-                    try:
-                        asyncio.run_coroutine_threadsafe(ws.send_json(msg), loop)
-                    except Exception as e:
-                        logger.warning(f"⚠️ Failed to send progress (client may have switched tabs): {e}")
+                save_sessions(download_id)
+                publish_progress(download_id, msg)
                 
             elif d['status'] == 'finished':
                 download_sessions[download_id].update({
                     "status": "processing",
                     "progress": 95
                 })
-                save_sessions()
-                
-                ws = active_downloads.get(download_id, {}).get("websocket")
-                if ws:
-                    try:
-                        asyncio.run_coroutine_threadsafe(
-                            ws.send_json({"status": "processing", "message": "Finalizing download..."}),
-                            loop
-                        )
-                    except Exception as e:
-                        logger.warning(f"⚠️ Failed to send processing status: {e}")
+                save_sessions(download_id)
+                publish_progress(download_id, {"status": "processing", "message": "Finalizing download..."})
 
-        ydl_opts['progress_hooks'] = [progress_hook]
+        ydl_opts['progress_hooks'] = [progress_hook, make_metrics_progress_hook(platform, trace)]
+        ydl_opts['postprocessor_hooks'] = [make_metrics_postprocessor_hook(trace)]
+        # yt-dlp calls post hooks with the final path, after merging, extraction and the move home
+        final_paths: List[str] = []
+        ydl_opts['post_hooks'] = [final_paths.append]
 
-        await asyncio.to_thread(lambda: yt_dlp.YoutubeDL(ydl_opts).download([url]))
+        if format_type not in ("audio", "video"):
+            with trace.span('thumbnail_fetch'):
+                cached_path = await fetch_thumbnail(thumbnail_url)
+            cached_ext = os.path.splitext(cached_path)[1]
+            thumbnail_path = os.path.join(DOWNLOADS_DIR, f"{base_filename}_thumbnail{cached_ext}")
+            staged_path = os.path.join(job_dir, os.path.basename(thumbnail_path))
+            await asyncio.to_thread(shutil.copyfile, cached_path, staged_path)
+            content_store.release(thumbnail_path)
+            os.replace(staged_path, thumbnail_path)
+            final_paths.append(thumbnail_path)
+        elif format_type == "audio" and pipelined_audio_supported(audio_format) and not clip:
+            def on_encode_progress(percent: float):
+                publish_progress(download_id, {
+                    "status": "processing",
+                    "stage": "transcode",
+                    "percent": percent,
+                    "message": f"Encoding audio... {percent:.0f}%"
+                })
 
-        pattern = os.path.join(DOWNLOADS_DIR, f"{base_filename}*")
-        possible_files = glob.glob(pattern)
+            output_path = os.path.join(DOWNLOADS_DIR, f"{base_filename}.{audio_format}")
+            staged_path = os.path.join(job_dir, os.path.basename(output_path))
+            with trace.span('yt_dlp_download', format_id=ydl_opts.get('format'), pipelined=True):
+                await run_pipelined_audio_download(
+                    platform, ydl_opts, url, staged_path, audio_format,
+                    info.get('duration'), on_encode_progress, trace
+                )
+            content_store.release(output_path)
+            os.replace(staged_path, output_path)
+            final_paths.append(output_path)
+        else:
+            with trace.span('yt_dlp_download', format_id=ydl_opts.get('format')):
+                await download_with_rate_limit(platform, trace.profiled(run_pooled_download), platform, ydl_opts, [url])
+
+        possible_files = [path for path in final_paths if os.path.exists(path)]
+        if not possible_files:
+            # Only this job's exact output name, never another title or clip that shares the prefix
+            stem = ydl_opts.get('outtmpl', base_filename).replace('.%(ext)s', '')
+            possible_files = glob.glob(glob.escape(os.path.join(DOWNLOADS_DIR, stem)) + '.*')
         
         if not possible_files:
             raise Exception("Downloaded file not found")
@@ -697,21 +2594,24 @@ async def websocket_download(websocket: WebSocket, download_id: str):
         downloaded_file = max(possible_files, key=os.path.getctime)
         filename = os.path.basename(downloaded_file)
         file_size = os.path.getsize(downloaded_file)
+        with trace.span('dedup'):
+            await asyncio.to_thread(content_store.ingest, downloaded_file)
+        trace.set_attributes(filename=filename, bytes=file_size)
 
         actual_quality = quality
         if format_type == "video":
             try:
                 ffprobe_cmd = [
-                    FFMPEG_PATH.replace('ffmpeg', 'ffprobe'),
+                    get_ffprobe_path(),
                     '-v', 'error',
                     '-select_streams', 'v:0',
                     '-show_entries', 'stream=height,codec_name',
                     '-of', 'csv=p=0',
                     downloaded_file
                 ]
-                result = subprocess.run(ffprobe_cmd, capture_output=True, text=True)
+                result = await run_media_process(ffprobe_cmd, timeout=FFPROBE_TIMEOUT, stage='ffprobe', trace=trace, check=False)
                 if result.returncode == 0:
-                    lines = result.stdout.strip().split('\n')
+                    lines = result.stdout.decode(errors='replace').strip().split('\n')
                     if lines:
                         actual_height = int(lines[0].split(',')[0])
                         codec_name = lines[0].split(',')[1] if len(lines[0].split(',')) > 1 else 'unknown'
@@ -733,6 +2633,8 @@ async def websocket_download(websocket: WebSocket, download_id: str):
             "file_size": f"{round(file_size / (1024 * 1024), 2)} MB",
             "filename": filename
         }
+        if clip:
+            entry["clip"] = {"start": clip["start"], "end": clip["end"]}
         save_history_entry(entry)
 
         completion_msg = {
@@ -743,63 +2645,154 @@ async def websocket_download(websocket: WebSocket, download_id: str):
             "selected_quality": actual_quality,
             "file_url": f"http://localhost:8000/downloads/{filename}"
         }
+        if clip:
+            completion_msg["clip"] = {"start": clip["start"], "end": clip["end"]}
         
         download_sessions[download_id].update({
             "status": "completed",
             "progress": 100,
             "filename": filename
         })
-        save_sessions()
-        
-        ws = active_downloads.get(download_id, {}).get("websocket")
-        if ws:
-            try:
-                await ws.send_json(completion_msg)
-            except Exception as e:
-                logger.warning(f"⚠️ Failed to send completion message: {e}")
+        save_sessions(download_id)
+        JOBS_TOTAL.inc(kind='download', platform=platform, status='completed')
+        publish_progress(download_id, completion_msg)
 
-    except yt_dlp.utils.DownloadCancelled:
-        logger.info(f"❌ Download cancelled: {download_id}")
-        ws = active_downloads.get(download_id, {}).get("websocket")
-        if ws:
-            try:
-                await ws.send_json({"status": "cancelled", "message": "Download cancelled"})
-            except:
-                pass
+    except Exception as e:
+        if token.cancelled or isinstance(e, (yt_dlp.utils.DownloadCancelled, JobCancelled)):
+            # A killed merge or encode surfaces as an ordinary error; the token says what happened
+            token.cancel()
+            removed = await asyncio.to_thread(token.remove_partials)
+            latency = token.stopped()
+            trace.set_attributes(cancel_latency=latency, partials_removed=removed)
+            logger.info(f"❌ Download cancelled: {download_id} (stopped in {latency or 0:.3f}s, {removed} partial file(s) removed)")
+            publish_progress(download_id, {"status": "cancelled", "message": "Download cancelled"})
+            
+            if download_id in download_sessions:
+                download_sessions[download_id]["status"] = "cancelled"
+                save_sessions(download_id)
+            JOBS_TOTAL.inc(kind='download', platform=download_sessions.get(download_id, {}).get("platform", "unknown"), status='cancelled')
+        else:
+            logger.error(f"❌ WebSocket download error: {e}", exc_info=True)
+            publish_progress(download_id, {"status": "error", "message": str(e)})
+            
+            if download_id in download_sessions:
+                download_sessions[download_id]["status"] = "error"
+                download_sessions[download_id]["error"] = str(e)
+                save_sessions(download_id)
+            JOBS_TOTAL.inc(kind='download', platform=download_sessions.get(download_id, {}).get("platform", "unknown"), status='error')
+            
+    finally:
+        release_cancel_token(download_id)
+        ACTIVE_JOBS.dec(kind='ws_download')
+        trace.finish(download_sessions.get(download_id, {}).get("status", "disconnected"))
+        session = download_sessions.get(download_id)
+        final_session = dict(session) if session else None
+        if session and session.get("status") in ["completed", "cancelled", "error"]:
+            logger.info(f"🗑️ Cleaning up finished download: {download_id}")
+            shutil.rmtree(job_temp_dir(download_id), ignore_errors=True)
+            progress_hub.finish(download_id)
+            active_downloads.pop(download_id, None)
+            download_sessions.pop(download_id, None)
+            save_sessions(download_id)
+
+    return final_session
+
+def start_download_job(download_id: str, data: Dict[str, Any]):
+    """Register the session described by a client start message and launch run_download_job"""
+    url = data.get("url")
+    format_type = data.get("type", "video")
+    quality = data.get("quality", user_settings.get("default_quality", "720p"))
+    audio_format = data.get("format", user_settings.get("default_format", "mp4"))
+    clip = {"start": data.get("start"), "end": data.get("end"), "precise": bool(data.get("precise_cut"))}
+
+    platform = detect_platform(url)
+    logger.info(f"🎬 Starting NEW download: {platform} | Quality: {quality} | Type: {format_type}")
+
+    active_downloads[download_id] = {
+        "active": True,
+        "cancelled": False
+    }
+    download_sessions[download_id] = {
+        "url": url,
+        "type": format_type,
+        "quality": quality,
+        "format": audio_format,
+        "status": "initializing",
+        "progress": 0,
+        "started_at": datetime.now().isoformat(),
+        "title": "Unknown",
+        "speed": "Unknown",
+        "eta": "Unknown",
+        "platform": platform
+    }
+    if clip["start"] not in (None, "") or clip["end"] not in (None, ""):
+        # Validated against the video length once the job has extracted it
+        download_sessions[download_id]["clip"] = clip
+    save_sessions(download_id)
+
+    download_tasks[download_id] = asyncio.create_task(run_download_job(download_id))
+    download_tasks[download_id].add_done_callback(lambda _: download_tasks.pop(download_id, None))
+
+@app.websocket("/ws/download/{download_id}")
+async def websocket_download(websocket: WebSocket, download_id: str):
+    await websocket.accept()
+    
+    try:
+        existing_session = download_sessions.get(download_id)
+        is_reconnect = existing_session and existing_session.get("status") in ["initializing", "downloading", "processing"]
+        
+        if not existing_session:
+            # The job may be running on another worker; follow it over the progress channel
+            remote_session = await asyncio.to_thread(state_backend.get_session, download_id)
+            if remote_session and remote_session.get("status") in ACTIVE_SESSION_STATUSES:
+                await follow_remote_download(websocket, download_id, remote_session)
+                return
         
-        if download_id in download_sessions:
-            download_sessions[download_id]["status"] = "cancelled"
-            save_sessions()
+        if is_reconnect:
+            logger.info(f"🔄 RECONNECTION: Client reconnected to existing download: {download_id}")
             
+            # Subscribe before the snapshot so no update falls between the two
+            queue = progress_hub.subscribe(download_id)
+            try:
+                current_progress = existing_session.get("progress", 0)
+                await websocket.send_json({
+                    "status": "reconnected",
+                    "percent": current_progress,
+                    "message": f"Reconnected! Download is {current_progress:.1f}% complete",
+                    "total": existing_session.get("total", "Calculating..."),
+                    "speed": existing_session.get("speed", "Unknown"),
+                    "eta": existing_session.get("eta", "Unknown")
+                })
+                
+                logger.info(f"✅ Successfully reconnected client to download {download_id} at {current_progress}%")
+                
+                await stream_job_progress(websocket, download_id, queue)
+            finally:
+                progress_hub.unsubscribe(download_id, queue)
+            return
+        
+        # NEW DOWNLOAD
+        data = await websocket.receive_json()
+        # The job runs independently of this socket; closing the tab only stops the forwarding.
+        # Subscribing right after the start (no await in between) still precedes the job's first
+        # step, and a start that raises (e.g. no URL) leaves no queue behind in the hub
+        start_download_job(download_id, data)
+        queue = progress_hub.subscribe(download_id)
+        await stream_job_progress(websocket, download_id, queue)
+
     except WebSocketDisconnect:
         logger.info(f"🔌 WebSocket disconnected for download {download_id} (client may have switched tabs)")
-        if download_id in active_downloads:
-            active_downloads[download_id]["active"] = False
-            active_downloads[download_id]["websocket"] = None
             
     except Exception as e:
         logger.error(f"❌ WebSocket download error: {e}", exc_info=True)
-        ws = active_downloads.get(download_id, {}).get("websocket")
-        if ws:
-            try:
-                await ws.send_json({"status": "error", "message": str(e)})
-            except:
-                pass
-        
-        if download_id in download_sessions:
-            download_sessions[download_id]["status"] = "error"
-            save_sessions()
+        try:
+            await websocket.send_json({"status": "error", "message": str(e)})
+        except:
+            WS_SEND_FAILURES.inc()
             
     finally:
         session = download_sessions.get(download_id)
-        if session and session.get("status") in ["completed", "cancelled", "error"]:
-            logger.info(f"🗑️ Cleaning up finished download: {download_id}")
-            active_downloads.pop(download_id, None)
-            download_sessions.pop(download_id, None)
-            save_sessions()
-        else:
-            if download_id in active_downloads:
-                active_downloads[download_id]["active"] = False
+        if session and session.get("status") in ["initializing", "downloading", "processing"]:
             logger.info(f"💾 Keeping session for possible reconnection: {download_id}")
         
         try:
@@ -807,17 +2800,593 @@ async def websocket_download(websocket: WebSocket, download_id: str):
         except:
             pass
 
+async def stream_job_progress(websocket: WebSocket, download_id: str, queue: asyncio.Queue):
+    """Forward hub updates to one socket until the job reaches a terminal state or the client leaves"""
+    try:
+        while True:
+            try:
+                msg = await asyncio.wait_for(queue.get(), timeout=WORKER_STALE_AFTER)
+            except asyncio.TimeoutError:
+                if download_id not in download_sessions:
+                    break
+                continue
+            if msg is None:
+                break
+            try:
+                await websocket.send_json(msg)
+            except Exception as e:
+                WS_SEND_FAILURES.inc()
+                logger.warning(f"⚠️ Failed to send progress (client may have switched tabs): {e}")
+                break
+            if msg.get("status") in TERMINAL_STATUSES:
+                break
+    finally:
+        progress_hub.unsubscribe(download_id, queue)
+
+async def follow_remote_download(websocket: WebSocket, download_id: str, session: Dict[str, Any]):
+    logger.info(f"🔄 RECONNECTION: Following download {download_id} owned by another worker")
+    # Subscribe before the snapshot so no update falls between the two
+    subscription = state_backend.subscribe(f"progress:{download_id}")
+    try:
+        current_progress = session.get("progress", 0)
+        await websocket.send_json({
+            "status": "reconnected",
+            "percent": current_progress,
+            "message": f"Reconnected! Download is {current_progress:.1f}% complete",
+            "total": session.get("total", "Calculating..."),
+            "speed": session.get("speed", "Unknown"),
+            "eta": session.get("eta", "Unknown")
+        })
+        while True:
+            msg = await subscription.get(timeout=WORKER_STALE_AFTER)
+            if msg is None:
+                # Quiet channel: stop once the job is no longer tracked anywhere
+                latest = await asyncio.to_thread(state_backend.get_session, download_id)
+                if not latest or latest.get("status") not in ACTIVE_SESSION_STATUSES:
+                    break
+                continue
+            await websocket.send_json(msg)
+            if msg.get("status") in TERMINAL_STATUSES:
+                break
+    finally:
+        subscription.close()
+
+# Jobs replayed from the session journal or claimed from a dead worker
+download_tasks: Dict[str, asyncio.Task] = {}
+resume_semaphore: Optional[asyncio.Semaphore] = None
+
+async def resume_download(download_id: str, semaphore: asyncio.Semaphore):
+    async with semaphore:
+        if download_id not in download_sessions:
+            return
+        session = download_sessions[download_id]
+        session["resume_count"] = session.get("resume_count", 0) + 1
+        save_sessions(download_id)
+        try:
+            await run_download_job(download_id, resume=True)
+        finally:
+            download_tasks.pop(download_id, None)
+
+@app.on_event("startup")
+async def resume_interrupted_downloads():
+    """Claim jobs that were in flight when their worker stopped and re-queue them here"""
+    global resume_semaphore
+    claimed = await asyncio.to_thread(state_backend.claim_orphaned_sessions, WORKER_ID)
+    interrupted = []
+    for download_id, session in claimed.items():
+        # Sessions that already finished are leftovers from an unclean shutdown
+        if session.get("status") in ACTIVE_SESSION_STATUSES and download_id not in download_tasks:
+            download_sessions[download_id] = session
+            interrupted.append(download_id)
+    if claimed:
+        save_sessions()
+    
+    if not interrupted:
+        return
+    
+    if resume_semaphore is None:
+        resume_semaphore = asyncio.Semaphore(max(1, int(user_settings.get("max_concurrent_downloads", 3))))
+    semaphore = resume_semaphore
+    for download_id in interrupted:
+        download_sessions[download_id]["status"] = "initializing"
+        active_downloads[download_id] = {
+            "active": True,
+            "cancelled": False
+        }
+        download_tasks[download_id] = asyncio.create_task(resume_download(download_id, semaphore))
+    save_sessions()
+    logger.info(f"♻️ Re-queued {len(interrupted)} interrupted download(s) on worker {WORKER_ID}")
+
+# ============================================
+# Batch Submission
+# ============================================
+BATCH_RESOLVE_CONCURRENCY = int(os.environ.get("BATCH_RESOLVE_CONCURRENCY", "8"))
+MAX_BATCH_ITEMS = 1000
+MAX_BATCHES = 100
+
+batches: "collections.OrderedDict[str, Dict[str, Any]]" = collections.OrderedDict()
+batch_tasks: Dict[str, asyncio.Task] = {}
+batch_download_semaphore: Optional[asyncio.Semaphore] = None
+
+def get_batch_download_semaphore() -> asyncio.Semaphore:
+    global batch_download_semaphore
+    if batch_download_semaphore is None:
+        batch_download_semaphore = asyncio.Semaphore(max(1, int(user_settings.get("max_concurrent_downloads", 3))))
+    return batch_download_semaphore
+
+async def resolve_batch_item(url: str, platform: str) -> MediaInfo:
+    opts = build_ydl_opts(platform)
+    opts['noplaylist'] = True
+    if platform in ['instagram', 'twitter']:
+        opts['format'] = 'bestvideo+bestaudio/best'
+    with track_stage('extraction'):
+        return await call_with_rate_limit(platform, extract_compact_info, platform, opts, url)
+
+async def run_batch(batch_id: str):
+    batch = batches[batch_id]
+    resolve_semaphore = asyncio.Semaphore(BATCH_RESOLVE_CONCURRENCY)
+    seen: Dict[tuple, str] = {}
+
+    def cancelled_while_queued(job: Dict[str, Any]) -> bool:
+        if not active_downloads.get(job["download_id"], {}).get("cancelled"):
+            return False
+        job["status"] = "cancelled"
+        active_downloads.pop(job["download_id"], None)
+        return True
+
+    async def resolve(job: Dict[str, Any]):
+        async with resolve_semaphore:
+            if job.get("duplicate_of") or cancelled_while_queued(job):
+                return
+            download_id = job["download_id"]
+            session = batch["pending"][download_id]
+            try:
+                info = await resolve_batch_item(session["url"], session["platform"])
+            except Exception as e:
+                logger.error(f"❌ Batch {batch_id}: failed to resolve {session['url']}: {e}")
+                job.update({"status": "error", "error": str(e)})
+                batch["pending"].pop(download_id, None)
+                active_downloads.pop(download_id, None)
+                return
+
+            # Different URLs (short links, mobile hosts) can point at the same video
+            key = (info.get("extractor_key"), info.get("id"), session["type"], session["quality"], session["format"])
+            if info.get("id") and key in seen:
+                job.update({"status": "duplicate", "duplicate_of": seen[key], "title": info.get("title")})
+                batch["pending"].pop(download_id, None)
+                active_downloads.pop(download_id, None)
+                return
+            seen[key] = download_id
+            job["title"] = info.get("title")
+
+        async with get_batch_download_semaphore():
+            session = batch["pending"].pop(download_id)
+            if cancelled_while_queued(job):
+                return
+            # Only started items become sessions, so a restart resumes what was running,
+            # not every URL still waiting in the batch
+            session["started_at"] = datetime.now().isoformat()
+            download_sessions[download_id] = session
+            save_sessions(download_id)
+            final = await run_download_job(download_id, info=info)
+        if final:
+            job.update({k: final.get(k) for k in ("status", "filename", "error") if final.get(k) is not None})
+            if final.get("filename"):
+                job["file_url"] = f"http://localhost:8000/downloads/{final['filename']}"
+
+    await asyncio.gather(*(resolve(job) for job in batch["jobs"]))
+    batch["finished_at"] = datetime.now().isoformat()
+    logger.info(f"📦 Batch {batch_id} finished ({len(batch['jobs'])} item(s))")
+
+@app.post("/api/batch")
+async def submit_batch(req: BatchRequest):
+    """Queue many downloads at once; returns job ids immediately, resolution and downloads run in the background"""
+    if not req.items:
+        raise HTTPException(status_code=400, detail="No URLs provided")
+    if len(req.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ITEMS} URLs per batch")
+
+    batch_id = str(uuid.uuid4())
+    jobs = []
+    pending: Dict[str, Dict[str, Any]] = {}
+    by_request: Dict[tuple, str] = {}
+    for item in req.items:
+        quality = item.quality or user_settings.get("default_quality", "720p")
+        audio_format = item.format or user_settings.get("default_format", "mp4")
+        download_id = str(uuid.uuid4())
+        job = {"download_id": download_id, "url": item.url, "type": item.type, "quality": quality, "format": audio_format}
+
+        # Identical submissions are collapsed without touching the network
+        request_key = (item.url.strip(), item.type, quality, audio_format)
+        if request_key in by_request:
+            job.update({"status": "duplicate", "duplicate_of": by_request[request_key]})
+            jobs.append(job)
+            continue
+        by_request[request_key] = download_id
+
+        active_downloads[download_id] = {
+            "active": True,
+            "cancelled": False
+        }
+        pending[download_id] = {
+            "url": item.url,
+            "type": item.type,
+            "quality": quality,
+            "format": audio_format,
+            "status": "initializing",
+            "progress": 0,
+            "started_at": datetime.now().isoformat(),
+            "title": "Unknown",
+            "speed": "Unknown",
+            "eta": "Unknown",
+            "platform": detect_platform(item.url),
+            "batch_id": batch_id
+        }
+        job["status"] = "queued"
+        jobs.append(job)
+
+    batches[batch_id] = {"batch_id": batch_id, "created_at": datetime.now().isoformat(), "finished_at": None,
+                         "jobs": jobs, "pending": pending}
+    while len(batches) > MAX_BATCHES:
+        batches.popitem(last=False)
+    # Keep a reference so the running batch can't be garbage-collected
+    batch_tasks[batch_id] = asyncio.create_task(run_batch(batch_id))
+    batch_tasks[batch_id].add_done_callback(lambda _: batch_tasks.pop(batch_id, None))
+
+    logger.info(f"📦 Batch {batch_id} queued with {len(jobs)} item(s)")
+    return {"batch_id": batch_id, "jobs": [{"download_id": j["download_id"], "url": j["url"], "status": j["status"]} for j in jobs]}
+
+@app.get("/api/batch/{batch_id}")
+async def get_batch_status(batch_id: str):
+    batch = batches.get(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    jobs = []
+    counts: Dict[str, int] = {}
+    for job in batch["jobs"]:
+        entry = dict(job)
+        session = download_sessions.get(job["download_id"])
+        if session:
+            # Still queued or running: live values come from the session
+            entry.update({
+                "status": "queued" if session.get("status") == "initializing" and job["status"] == "queued" else session.get("status"),
+                "progress": session.get("progress", 0),
+                "title": session.get("title") if session.get("title") != "Unknown" else job.get("title"),
+            })
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        jobs.append(entry)
+
+    return {
+        "batch_id": batch_id,
+        "created_at": batch["created_at"],
+        "finished_at": batch["finished_at"],
+        "total": len(jobs),
+        "counts": counts,
+        "jobs": jobs
+    }
+
+# ============================================
+# Download Archive (incremental playlist/channel sync)
+# ============================================
+ARCHIVE_DB_PATH = os.environ.get("ARCHIVE_DB_PATH", "./download_archive.db")
+
+class DownloadArchive:
+    """
+    Index of fetched entries keyed by (extractor, video id, type, quality). Unlike yt-dlp's
+    own download_archive file, the same video in another type or quality is a distinct entry.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS archive (
+                extractor TEXT, video_id TEXT, type TEXT, quality TEXT,
+                title TEXT, playlist TEXT, filename TEXT, added_at REAL,
+                PRIMARY KEY (extractor, video_id, type, quality));
+            CREATE INDEX IF NOT EXISTS archive_playlist ON archive (playlist);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def contains(self, extractor: str, video_id: str, type_: str, quality: str) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM archive WHERE extractor = ? AND video_id = ? AND type = ? AND quality = ?",
+            (extractor, video_id, type_, quality)
+        ).fetchone()
+        return row is not None
+
+    def add(self, extractor: str, video_id: str, type_: str, quality: str, title: Optional[str] = None,
+            playlist: Optional[str] = None, filename: Optional[str] = None):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (extractor, video_id, type_, quality, title, playlist, filename, time.time())
+        )
+
+    @staticmethod
+    def _filters(extractor: Optional[str], playlist: Optional[str], older_than: Optional[float]):
+        clauses, params = [], []
+        if extractor:
+            clauses.append("extractor = ?")
+            params.append(extractor)
+        if playlist:
+            clauses.append("playlist = ?")
+            params.append(playlist)
+        if older_than is not None:
+            clauses.append("added_at < ?")
+            params.append(older_than)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def list_entries(self, extractor: Optional[str] = None, playlist: Optional[str] = None,
+             limit: int = 100, offset: int = 0) -> Dict[str, Any]:
+        where, params = self._filters(extractor, playlist, None)
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM archive{where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT extractor, video_id, type, quality, title, playlist, filename, added_at FROM archive{where} "
+            "ORDER BY added_at DESC LIMIT ? OFFSET ?", (*params, limit, offset)
+        ).fetchall()
+        columns = ("extractor", "video_id", "type", "quality", "title", "playlist", "filename", "added_at")
+        return {"total": total, "entries": [dict(zip(columns, row)) for row in rows]}
+
+    def prune(self, extractor: Optional[str] = None, playlist: Optional[str] = None,
+              older_than_days: Optional[float] = None) -> int:
+        older_than = time.time() - older_than_days * 86400 if older_than_days is not None else None
+        where, params = self._filters(extractor, playlist, older_than)
+        return self._conn().execute(f"DELETE FROM archive{where}", params).rowcount
+
+download_archive = DownloadArchive(ARCHIVE_DB_PATH)
+
+@app.get("/api/archive")
+async def list_archive(extractor: Optional[str] = None, playlist: Optional[str] = None, limit: int = 100, offset: int = 0):
+    try:
+        return await asyncio.to_thread(download_archive.list_entries, extractor, playlist, min(max(limit, 1), 1000), max(offset, 0))
+    except Exception as e:
+        logger.error(f"Failed to list archive: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to list archive: {str(e)}")
+
+@app.delete("/api/archive")
+async def prune_archive(extractor: Optional[str] = None, playlist: Optional[str] = None, older_than_days: Optional[float] = None):
+    """Forget archived entries so the next sync fetches them again; no filters clears everything"""
+    try:
+        removed = await asyncio.to_thread(download_archive.prune, extractor, playlist, older_than_days)
+        logger.info(f"🗑️ Pruned {removed} archive entries")
+        return {"status": "success", "removed": removed}
+    except Exception as e:
+        logger.error(f"Failed to prune archive: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to prune archive: {str(e)}")
+
+# ============================================
+# Content-Addressed Media Store (hardlink deduplication)
+# ============================================
+CONTENT_STORE_DIR = os.path.join(DOWNLOADS_DIR, ".store")
+CONTENT_HASH_CHUNK = 1024 * 1024
+CONTENT_STORE_SWEEP_INTERVAL = int(os.getenv("CONTENT_STORE_SWEEP_SECONDS", "600"))
+
+DEDUP_BYTES_SAVED = Counter("downloader_dedup_bytes_saved_total", "Bytes not written twice because identical content was already stored")
+DEDUP_INGESTED = Counter("downloader_dedup_ingested_total", "Files added to the content store by outcome")
+
+class ContentStore:
+    """
+    Every finished media file is kept once under .store/<aa>/<sha256>; the names in
+    DOWNLOADS_DIR and in playlist folders are hardlinks to that blob, so the same content
+    under different titles, quality suffixes or upload ids costs disk only once. A blob
+    whose link count is back to 1 is unreferenced and can be collected.
+    Linked files must be replaced, never rewritten in place (see release).
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(CONTENT_HASH_CHUNK)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _adopt(self, digest: str, source: str) -> bool:
+        """Make source the blob for digest; False if identical content is already stored"""
+        blob = self.blob_path(digest)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(source, blob)
+            return True
+        except FileExistsError:
+            return False
+
+    def _link_name(self, digest: str, path: str):
+        # Link next to the target and rename over it so readers never see a missing file
+        temp_link = f"{path}.{uuid.uuid4().hex[:8]}.link"
+        os.link(self.blob_path(digest), temp_link)
+        os.replace(temp_link, path)
+
+    def _record(self, path: str, size: int, is_new: bool):
+        if is_new:
+            DEDUP_INGESTED.inc(outcome='new')
+        else:
+            DEDUP_INGESTED.inc(outcome='duplicate')
+            DEDUP_BYTES_SAVED.inc(size)
+            logger.info(f"♻️ {os.path.basename(path)} matches stored content, {round(size / (1024 * 1024), 2)} MB saved")
+
+    def ingest(self, path: str) -> Optional[str]:
+        """Hash a finished file and link its name to the blob, freeing the copy if the content is known"""
+        try:
+            size = os.path.getsize(path)
+            digest = self.hash_file(path)
+            is_new = self._adopt(digest, path)
+            if not is_new:
+                if os.path.samefile(self.blob_path(digest), path):
+                    return digest
+                self._link_name(digest, path)
+            self._record(path, size, is_new)
+            return digest
+        except OSError as e:
+            # No hardlinks on this filesystem (or the file vanished): keep the plain file
+            logger.warning(f"⚠️ Could not add {os.path.basename(path)} to content store: {e}")
+            return None
+
+    async def ingest_upload(self, upload: UploadFile, path: str) -> tuple:
+        """Stream an upload to disk, hashing each chunk as it is written. Returns (digest, size)"""
+        digest = hashlib.sha256()
+        size = 0
+        temp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        try:
+            async with aiofiles.open(temp_path, "wb") as out:
+                while True:
+                    chunk = await upload.read(CONTENT_HASH_CHUNK)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await out.write(chunk)
+            hexdigest = digest.hexdigest()
+            await asyncio.to_thread(self._commit_upload, hexdigest, temp_path, path, size)
+            return hexdigest, size
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _commit_upload(self, digest: str, temp_path: str, path: str, size: int):
+        try:
+            is_new = self._adopt(digest, temp_path)
+            self._link_name(digest, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not add {os.path.basename(path)} to content store: {e}")
+            os.replace(temp_path, path)
+            return
+        self._record(path, size, is_new)
+
+    @staticmethod
+    def release(path: str):
+        """Drop a linked name before a writer truncates it (ffmpeg -y would rewrite every link)"""
+        try:
+            if os.stat(path).st_nlink > 1:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _blobs(self):
+        for dirpath, _, files in os.walk(self.root):
+            if dirpath == self.tmp_dir:
+                continue
+            for name in files:
+                blob = os.path.join(dirpath, name)
+                try:
+                    yield blob, os.stat(blob)
+                except FileNotFoundError:
+                    continue
+
+    def stats(self) -> Dict[str, Any]:
+        blobs = linked_names = stored_bytes = logical_bytes = orphans = orphan_bytes = 0
+        for _, st in self._blobs():
+            refs = st.st_nlink - 1
+            if refs < 1:
+                orphans += 1
+                orphan_bytes += st.st_size
+                continue
+            blobs += 1
+            linked_names += refs
+            stored_bytes += st.st_size
+            logical_bytes += st.st_size * refs
+        return {
+            "blobs": blobs,
+            "linked_files": linked_names,
+            "stored_bytes": stored_bytes,
+            "logical_bytes": logical_bytes,
+            "bytes_saved": logical_bytes - stored_bytes,
+            "orphaned_blobs": orphans,
+            "orphaned_bytes": orphan_bytes,
+        }
+
+    def collect_orphans(self) -> Dict[str, int]:
+        removed = freed = 0
+        for blob, st in self._blobs():
+            if st.st_nlink == 1:
+                try:
+                    os.remove(blob)
+                    removed += 1
+                    freed += st.st_size
+                except OSError as e:
+                    logger.warning(f"⚠️ Could not remove orphaned blob {blob}: {e}")
+        return {"removed": removed, "bytes_freed": freed}
+
+content_store = ContentStore(CONTENT_STORE_DIR)
+
+@app.get("/api/storage/dedup")
+async def get_dedup_stats():
+    try:
+        return await asyncio.to_thread(content_store.stats)
+    except Exception as e:
+        raise HTTPException(500, detail=f"Storage stats failed: {str(e)}")
+
+@app.delete("/api/storage/orphans")
+async def collect_storage_orphans():
+    try:
+        result = await asyncio.to_thread(content_store.collect_orphans)
+        logger.info(f"🧹 Removed {result['removed']} orphaned blob(s), {result['bytes_freed']} bytes freed")
+        return result
+    except Exception as e:
+        raise HTTPException(500, detail=f"Orphan cleanup failed: {str(e)}")
+
+async def sweep_content_store():
+    """Names are removed all over the place (cleanup tasks, upload deletes, history); collect their blobs here"""
+    while True:
+        await asyncio.sleep(CONTENT_STORE_SWEEP_INTERVAL)
+        try:
+            result = await asyncio.to_thread(content_store.collect_orphans)
+            if result["removed"]:
+                logger.info(f"🧹 Swept {result['removed']} orphaned blob(s), {result['bytes_freed']} bytes freed")
+        except Exception as e:
+            logger.warning(f"⚠️ Content store sweep failed: {e}")
+
+@app.on_event("startup")
+async def start_content_store_sweep():
+    app.state.store_sweep_task = asyncio.create_task(sweep_content_store())
+
+@app.on_event("shutdown")
+async def stop_content_store_sweep():
+    app.state.store_sweep_task.cancel()
+
 # ============================================
 # Step 6: Enhanced HTTP Download Endpoint
 # ============================================
 @app.post("/api/download")
 async def download_video(req: DownloadRequest, background_tasks: BackgroundTasks):
+    requested_clip = {"start": req.start, "end": req.end, "precise": req.precise_cut}
+    if req.playlist and (req.start is not None or req.end is not None):
+        raise HTTPException(status_code=400, detail="Clip ranges are only supported for single videos")
+    try:
+        parse_timestamp(req.start)
+        parse_timestamp(req.end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ACTIVE_JOBS.inc(kind='http_download')
+    trace_id = str(uuid.uuid4())
+    trace = start_trace(trace_id, 'http_download', url=req.url, type=req.type, quality=req.quality)
+    trace_status = "error"
     try:
         platform = detect_platform(req.url)
+        trace.set_attributes(platform=platform)
         logger.info(f"Starting download from {platform}: {req.url} | Quality: {req.quality}")
         
-        ydl_opts = BASE_YDL_OPTS.copy()
-        ydl_opts.update(get_platform_opts(platform))
+        ydl_opts = build_ydl_opts(platform)
         ydl_opts['noplaylist'] = not req.playlist
         
         # ✅ FIX: Platform-specific configuration
@@ -828,11 +3397,16 @@ async def download_video(req: DownloadRequest, background_tasks: BackgroundTasks
             ydl_opts['format'] = 'bestvideo+bestaudio/best'
             ydl_opts['merge_output_format'] = 'mp4'
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(req.url, download=False)
+        # Playlists are only enumerated here; entries are resolved one by one when downloaded
+        listing_opts = dict(ydl_opts, extract_flat='in_playlist') if req.playlist else ydl_opts
+        with track_stage('extraction', trace):
+            info = await call_with_rate_limit(platform, trace.profiled(extract_compact_info), platform, listing_opts, req.url)
         
         if req.playlist and info.get("_type") == "playlist":
-            return await handle_playlist_download(req, info, ydl_opts, background_tasks)
+            response = await handle_playlist_download(req, info, ydl_opts, background_tasks, trace)
+            response.headers["X-Trace-Id"] = trace_id
+            trace_status = "completed"
+            return response
         
         if info.get("_type") == "playlist":
             info = next((e for e in info['entries'] if e), None)
@@ -840,26 +3414,38 @@ async def download_video(req: DownloadRequest, background_tasks: BackgroundTasks
                 raise ValueError("Playlist is empty")
         
         url = info.get('webpage_url') or info.get('url') or req.url
-        base_filename = clean_filename(info['title'])
+        try:
+            clip = resolve_clip(requested_clip, info.get('duration')) if req.type != "thumbnail" else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        file_title = info['title'] + clip_suffix(clip)
+        base_filename = clean_filename(file_title)
         requested_height = parse_quality_request(req.quality)
+        selection_started = time.time()
 
         if req.type == "audio":
-            filename = clean_filename(f"{info['title']}.{req.quality}")
+            filename = clean_filename(f"{file_title}.{req.quality}")
             full_path = os.path.join(DOWNLOADS_DIR, filename)
-            ydl_opts.update({
-                'outtmpl': full_path,
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': req.quality,
-                    'preferredquality': '192',
-                }],
-            })
+            if pipelined_audio_supported(req.quality) and not clip:
+                ydl_opts.update({
+                    'outtmpl': os.path.splitext(full_path)[0] + '.source.%(ext)s',
+                    'format': 'bestaudio/best',
+                })
+            else:
+                ydl_opts.update({
+                    'outtmpl': full_path,
+                    'format': 'bestaudio/best',
+                    'postprocessors': [{
+                        'key': 'FFmpegExtractAudio',
+                        'preferredcodec': req.quality,
+                        'preferredquality': '192',
+                    }],
+                })
             
         elif req.type == "video":
             # ✅ FIX: Special handling for different platforms
             if platform in ['instagram', 'twitter']:
-                filename = clean_filename(f"{info['title']}_{req.quality}.mp4")
+                filename = clean_filename(f"{file_title}_{req.quality}.mp4")
                 full_path = os.path.join(DOWNLOADS_DIR, filename)
                 ydl_opts.update({
                     'outtmpl': full_path.replace('.mp4', '.%(ext)s'),
@@ -868,7 +3454,7 @@ async def download_video(req: DownloadRequest, background_tasks: BackgroundTasks
                 })
             elif platform == 'tiktok':
                 # ✅ FIX: TikTok - Avoid HEVC and ensure audio
-                filename = clean_filename(f"{info['title']}_{req.quality}.mp4")
+                filename = clean_filename(f"{file_title}_{req.quality}.mp4")
                 full_path = os.path.join(DOWNLOADS_DIR, filename)
                 
                 # Find best non-HEVC format
@@ -913,7 +3499,7 @@ async def download_video(req: DownloadRequest, background_tasks: BackgroundTasks
                         audio_format_id = audio_format_obj.get('format_id')
                         format_id = f"{format_id}+{audio_format_id}"
                 
-                filename = clean_filename(f"{info['title']}_{req.quality}.mp4")
+                filename = clean_filename(f"{file_title}_{req.quality}.mp4")
                 full_path = os.path.join(DOWNLOADS_DIR, filename)
                 ydl_opts.update({
                     'outtmpl': full_path.replace('.mp4', '.%(ext)s'),
@@ -927,17 +3513,28 @@ async def download_video(req: DownloadRequest, background_tasks: BackgroundTasks
             thumbnail_url = info.get('thumbnail')
             if not thumbnail_url:
                 raise ValueError("No thumbnail available")
-            response = requests.get(thumbnail_url, stream=True, timeout=30)
-            response.raise_for_status()
-            with open(full_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            return FileResponse(path=full_path, media_type="image/jpeg", filename=filename)
+            with trace.span('thumbnail_fetch'):
+                cached_path = await fetch_thumbnail(thumbnail_url)
+            content_store.release(full_path)
+            await asyncio.to_thread(shutil.copyfile, cached_path, full_path)
+            trace_status = "completed"
+            return FileResponse(path=full_path, media_type="image/jpeg", filename=filename, headers={"X-Trace-Id": trace_id})
 
         if req.type != "thumbnail":
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
+            trace.record_span('format_selection', selection_started, time.time(), format_id=ydl_opts.get('format'))
+            ydl_opts['progress_hooks'] = [make_metrics_progress_hook(platform, trace)]
+            ydl_opts['postprocessor_hooks'] = [make_metrics_postprocessor_hook(trace)]
+            if clip:
+                apply_clip_options(ydl_opts, clip)
+            if req.type == "audio" and pipelined_audio_supported(req.quality) and not clip:
+                with trace.span('yt_dlp_download', format_id=ydl_opts.get('format'), pipelined=True):
+                    await run_pipelined_audio_download(
+                        platform, ydl_opts, url, full_path, req.quality,
+                        info.get('duration'), None, trace
+                    )
+            else:
+                with trace.span('yt_dlp_download', format_id=ydl_opts.get('format')):
+                    await download_with_rate_limit(platform, trace.profiled(run_pooled_download), platform, ydl_opts, [url])
 
             if not os.path.exists(full_path):
                 base = os.path.splitext(full_path)[0]
@@ -949,6 +3546,8 @@ async def download_video(req: DownloadRequest, background_tasks: BackgroundTasks
                         break
                 else:
                     raise HTTPException(status_code=500, detail="File not found after download")
+            with trace.span('dedup'):
+                await asyncio.to_thread(content_store.ingest, full_path)
 
         ext = os.path.splitext(filename)[1].lower()
         media_types = {
@@ -975,27 +3574,43 @@ async def download_video(req: DownloadRequest, background_tasks: BackgroundTasks
                 "file_size": f"{round(total_size / (1024*1024), 2)} MB" if total_size else None,
                 "filename": filename
             }
+            if clip:
+                entry["clip"] = {"start": clip["start"], "end": clip["end"]}
             save_history_entry(entry)
         except Exception as e:
             logger.error(f"Failed to save history entry: {e}")
 
+        JOBS_TOTAL.inc(kind='download', platform=platform, status='completed')
+        trace_status = "completed"
+        trace.set_attributes(filename=filename, bytes=os.path.getsize(full_path))
         return FileResponse(
             path=full_path,
             media_type=media_type,
-            filename=filename
+            filename=filename,
+            headers={"X-Trace-Id": trace_id}
         )
         
+    except HTTPException as e:
+        if e.status_code >= 500:
+            JOBS_TOTAL.inc(kind='download', platform=detect_platform(req.url), status='error')
+        raise
     except Exception as e:
         logger.error(f"Download error for {req.url}: {e}", exc_info=True)
+        JOBS_TOTAL.inc(kind='download', platform=detect_platform(req.url), status='error')
         raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
+    finally:
+        ACTIVE_JOBS.dec(kind='http_download')
+        trace.finish(trace_status)
 
-async def handle_playlist_download(req: DownloadRequest, info: Dict, ydl_opts: Dict, background_tasks: BackgroundTasks):
+async def handle_playlist_download(req: DownloadRequest, info: MediaInfo, ydl_opts: Dict, background_tasks: BackgroundTasks, trace: Optional[JobTrace] = None):
     playlist_title = info.get("title", "playlist")
     subdir = os.path.join(DOWNLOADS_DIR, clean_filename(playlist_title))
     os.makedirs(subdir, exist_ok=True)
     zip_filename = clean_filename(f"{playlist_title}.zip")
     zip_path = os.path.join(DOWNLOADS_DIR, zip_filename)
     
+    platform = detect_platform(req.url)
+    requested_height = parse_quality_request(req.quality)
     ydl_opts["outtmpl"] = os.path.join(subdir, "%(playlist_index)s_%(title)s.%(ext)s")
     
     if req.type == "audio":
@@ -1008,37 +3623,79 @@ async def handle_playlist_download(req: DownloadRequest, info: Dict, ydl_opts: D
             }],
         })
     else:
-        requested_height = parse_quality_request(req.quality)
-        # Select best format for each video in the playlist with audio merging
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(req.url, download=False)
-            format_ids = []
-            for entry in info.get('entries', []):
-                best_format = find_best_format(entry.get('formats', []), requested_height, req.type, detect_platform(req.url))
-                if best_format:
-                    format_id = best_format.get('format_id')
-                    # Check if format has audio
-                    has_audio = best_format.get('acodec') != 'none'
-                    
-                    if not has_audio:
-                        # Find best audio format for this entry
-                        audio_format = find_best_format(entry.get('formats', []), 0, 'audio', detect_platform(req.url))
-                        if audio_format:
-                            audio_format_id = audio_format.get('format_id')
-                            format_id = f"{format_id}+{audio_format_id}"
-                    
-                    format_ids.append(format_id)
-                else:
-                    format_ids.append('bestvideo[height<={requested_height}]+bestaudio/best')
-        
-        ydl_opts.update({
-            'format': '+'.join(format_ids) if format_ids else 'bestvideo+bestaudio/best',
-            'merge_output_format': 'mp4',
-        })
+        ydl_opts['merge_output_format'] = 'mp4'
+    ydl_opts['progress_hooks'] = [make_metrics_progress_hook(platform, trace)]
+    ydl_opts['postprocessor_hooks'] = [make_metrics_postprocessor_hook(trace)]
+    
+    profiled = trace.profiled if trace else (lambda func: func)
     
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([req.url])
+    async def resolve_entry(entry: MediaInfo) -> Dict[str, Any]:
+        # process=False: fetch the entry's metadata only, format selection happens at download time
+        entry_url = entry.get('url') or entry.get('webpage_url')
+        with track_stage('extraction', trace):
+            return await call_with_rate_limit(platform, profiled(extract_info_pooled), platform, {**ydl_opts, 'noplaylist': True},
+                                              entry_url, ie_key=entry.get('ie_key'), process=False)
     
+    async def download_entry(index: int, entry_info: Dict[str, Any]):
+        entry_opts = dict(ydl_opts)
+        if req.type != "audio":
+            # Select best format for this video with audio merging
+            best_format = find_best_format(entry_info.get('formats') or [], requested_height, req.type, platform)
+            if best_format:
+                format_id = best_format.get('format_id')
+                # Check if format has audio
+                if best_format.get('acodec') == 'none':
+                    audio_format = find_best_format(entry_info.get('formats') or [], 0, 'audio', platform)
+                    if audio_format:
+                        format_id = f"{format_id}+{audio_format.get('format_id')}"
+                entry_opts['format'] = format_id
+            else:
+                entry_opts['format'] = f'bestvideo[height<={requested_height}]+bestaudio/best'
+        entry_info = dict(entry_info, playlist_index=index, playlist_title=playlist_title)
+        def process_entry():
+            with ydl_pool.checkout(platform, entry_opts) as ydl:
+                ydl.process_ie_result(entry_info, download=True)
+        await download_with_rate_limit(platform, profiled(process_entry))
+    
+    # (playlist position, flat entry); positions survive sync filtering below
+    entries = [(index, e) for index, e in enumerate(info.get('entries') or [], 1) if e]
+    logger.info(f"📃 Playlist '{playlist_title}': {len(entries)} entries listed")
+    
+    def archive_key(entry: MediaInfo):
+        return (entry.get('ie_key') or entry.get('extractor_key'), entry.get('id'), req.type, req.quality)
+    
+    if req.sync:
+        # Flat entries already carry extractor and id, so known items cost no extraction
+        known = await asyncio.to_thread(
+            lambda: {i for i, e in entries if all(archive_key(e)) and download_archive.contains(*archive_key(e))}
+        )
+        entries = [(i, e) for i, e in entries if i not in known]
+        logger.info(f"🔁 Sync: {len(known)} already archived, {len(entries)} new")
+        if not entries:
+            shutil.rmtree(subdir, ignore_errors=True)
+            return JSONResponse({"status": "up_to_date", "playlist": playlist_title, "new_entries": 0, "skipped": len(known)})
+    
+    # Resolve the next entry while the current one downloads
+    pending = asyncio.ensure_future(resolve_entry(entries[0][1])) if entries else None
+    for position, (index, entry) in enumerate(entries, 1):
+        try:
+            entry_info = await pending
+        except Exception as e:
+            logger.warning(f"⚠️ Skipping playlist entry {index}: {e}")
+            entry_info = None
+        pending = asyncio.ensure_future(resolve_entry(entries[position][1])) if position < len(entries) else None
+        if entry_info is None:
+            continue
+        try:
+            await download_entry(index, entry_info)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to download playlist entry {index}: {e}")
+            continue
+        key = (entry.get('ie_key') or entry_info.get('extractor_key'), entry.get('id') or entry_info.get('id'), req.type, req.quality)
+        if all(key):
+            await asyncio.to_thread(download_archive.add, *key, title=entry_info.get('title'), playlist=playlist_title)
+    
+    # Not ingested into the content store: the folder and the zip are deleted once the response is sent
     with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
         for root, _, files in os.walk(subdir):
             for file in files:
@@ -1075,8 +3732,8 @@ async def serve_download(filename: str):
     return FileResponse(path=file_path, media_type=media_type, filename=filename)
 
 @app.get("/api/history")
-async def get_history():
-    return {"history": load_history()}
+async def get_history(request: Request, fields: Optional[str] = None):
+    return await json_response(request, {"history": await asyncio.to_thread(load_history)}, fields)
 
 @app.delete("/api/history/{record_id}")
 async def delete_history_record(record_id: str):
@@ -1100,31 +3757,110 @@ async def clear_all_history():
         logger.error(f"Failed to clear history: {e}")
         raise HTTPException(status_code=500, detail="Failed to clear history")
 
+def active_download_entry(download_id: str, session: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "download_id": download_id,
+        "status": session.get("status", "unknown"),
+        "url": session.get("url"),
+        "title": session.get("title", "Unknown"),
+        "progress": session.get("progress", 0),
+        "quality": session.get("quality"),
+        "type": session.get("type"),
+        "started_at": session.get("started_at")
+    }
+
+async def active_downloads_snapshot() -> Dict[str, Any]:
+    seq = session_feed.seq
+    # Includes jobs running on other workers when a shared backend is configured
+    sessions = await asyncio.to_thread(state_backend.list_sessions)
+    active = [
+        active_download_entry(download_id, session)
+        for download_id, session in sessions.items()
+        if session.get("status") in ACTIVE_SESSION_STATUSES
+    ]
+    return {"seq": seq, "active_downloads": active}
+
+def active_downloads_delta(since: int) -> Optional[Dict[str, Any]]:
+    """Jobs changed or gone since `since`; None when the client needs a full snapshot"""
+    if STATE_BACKEND != "memory":
+        # Sequence numbers are per worker, so they cannot describe jobs owned elsewhere
+        return None
+    changes = session_feed.changes_since(since)
+    if changes is None:
+        return None
+    seq, changed, removed = changes
+    return {
+        "seq": seq,
+        "changed": [
+            active_download_entry(download_id, download_sessions[download_id])
+            for download_id in changed if download_id in download_sessions
+        ],
+        "removed": removed
+    }
+
 @app.get("/api/active-downloads")
-async def get_active_downloads():
-    active = []
-    for download_id, session in download_sessions.items():
-        if session.get("status") in ["initializing", "downloading", "processing"]:
-            active.append({
-                "download_id": download_id,
-                "status": session.get("status", "unknown"),
-                "url": session.get("url"),
-                "title": session.get("title", "Unknown"),
-                "progress": session.get("progress", 0),
-                "quality": session.get("quality"),
-                "type": session.get("type"),
-                "started_at": session.get("started_at")
-            })
-    return {"active_downloads": active}
+async def get_active_downloads(since: Optional[int] = None, timeout: float = 25):
+    """
+    Without `since`: full list plus the current `seq`. With `since`: only jobs that changed
+    or finished after that sequence, waiting up to `timeout` seconds for a change.
+    Responses carrying `reset: true` are full snapshots replacing the client's list.
+    """
+    if since is None:
+        return await active_downloads_snapshot()
+
+    await session_feed.wait_for_change(since, min(max(timeout, 0), FEED_MAX_WAIT))
+    delta = active_downloads_delta(since)
+    if delta is None:
+        return {**(await active_downloads_snapshot()), "reset": True}
+    return delta
+
+@app.get("/api/active-downloads/stream")
+async def stream_active_downloads(request: Request):
+    """Server-Sent Events: a `snapshot` event, then a `delta` event per change (resumable via Last-Event-ID)"""
+    last_event_id = request.headers.get("last-event-id")
+
+    def sse(event: str, payload: Dict[str, Any]) -> str:
+        return f"id: {payload['seq']}\nevent: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    async def events():
+        delta = active_downloads_delta(int(last_event_id)) if last_event_id and last_event_id.isdigit() else None
+        if delta is None:
+            snapshot = await active_downloads_snapshot()
+            seq = snapshot["seq"]
+            yield sse("snapshot", snapshot)
+        else:
+            seq = delta["seq"]
+            if delta["changed"] or delta["removed"]:
+                yield sse("delta", delta)
+
+        while not await request.is_disconnected():
+            if not await session_feed.wait_for_change(seq, 15):
+                yield ": keep-alive\n\n"
+                continue
+            delta = active_downloads_delta(seq)
+            if delta is None:
+                snapshot = await active_downloads_snapshot()
+                seq = snapshot["seq"]
+                yield sse("snapshot", snapshot)
+            else:
+                seq = delta["seq"]
+                yield sse("delta", delta)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @app.post("/api/cancel/{download_id}")
 async def cancel_download(download_id: str):
-    if download_id not in active_downloads:
-        raise HTTPException(status_code=404, detail="Download not found")
+    """Cancel a download or conversion; child processes are killed and partial files removed"""
+    if not cancel_job(download_id):
+        session = await asyncio.to_thread(state_backend.get_session, download_id)
+        if not session or session.get("status") not in ACTIVE_SESSION_STATUSES:
+            raise HTTPException(status_code=404, detail="Download not found")
+        # Owned by another worker: its control listener applies the cancel
+        state_backend.publish("control", {"action": "cancel", "download_id": download_id})
+        return {"status": "cancelled", "message": f"Download {download_id} cancelled"}
     
-    active_downloads[download_id]["active"] = False
-    active_downloads[download_id]["cancelled"] = True
-    save_sessions()
+    if download_id in download_sessions:
+        save_sessions(download_id)
     return {"status": "cancelled", "message": f"Download {download_id} cancelled"}
 
 @app.get("/api/settings")
@@ -1153,14 +3889,13 @@ async def root():
     }
 
 @app.post("/api/debug-formats")
-async def debug_formats(req: VideoRequest):
+async def debug_formats(req: VideoRequest, request: Request, fields: Optional[str] = None):
     try:
         platform = detect_platform(req.url)
-        opts = BASE_YDL_OPTS.copy()
-        opts.update(get_platform_opts(platform))
+        opts = build_ydl_opts(platform)
         
-        with yt_dlp.YoutubeDL(opts) as ydl:
-            info = ydl.extract_info(req.url, download=False)
+        with track_stage('extraction'):
+            info = await call_with_rate_limit(platform, extract_compact_info, platform, opts, req.url)
         
         format_details = []
         for fmt in info.get('formats', []):
@@ -1176,11 +3911,11 @@ async def debug_formats(req: VideoRequest):
                 'has_video': fmt.get('vcodec') != 'none',
             })
         
-        return {
+        return await json_response(request, {
             "platform": platform,
             "title": info.get('title'),
             "formats": format_details
-        }
+        }, fields)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1190,38 +3925,94 @@ async def debug_formats(req: VideoRequest):
 
 class ConvertRequest(BaseModel):
     filename: str
-    output_format: str = "mp4"
+    output_format: str = "mp4"  # or "hls" / "dash" for an adaptive streaming package
     quality: str = "auto"
     resolution: str = "original"
+    conversion_id: Optional[str] = None  # lets the client cancel via /api/cancel/{conversion_id}
 
 class UploadRequest(BaseModel):
     filename: str
     original_format: str
 
 # NEW: Video conversion utility functions
-def get_video_info(file_path: str) -> Dict[str, Any]:
-    """Get video information using ffprobe"""
+FFMPEG_INPUT_RE = re.compile(r"^Input #0, (?P<format>.+?), from ", re.MULTILINE)
+FFMPEG_DURATION_RE = re.compile(r"Duration: (?P<h>\d+):(?P<m>\d+):(?P<s>\d+(?:\.\d+)?)(?:, start: [-\d.]+)?(?:, bitrate: (?P<kbps>\d+) kb/s)?")
+FFMPEG_STREAM_RE = re.compile(
+    r"^\s*Stream #0:(?P<index>\d+)(?:\[0x[0-9a-f]+\])?(?:\([^)]*\))?: (?P<type>Video|Audio|Subtitle|Data|Attachment): (?P<codec>[\w-]+)(?P<rest>.*)$",
+    re.MULTILINE)
+
+def ffprobe_available() -> bool:
+    # imageio-ffmpeg ships ffmpeg only; get_ffprobe_path() then names a file that does not exist
+    return os.path.exists(get_ffprobe_path())
+
+def parse_ffmpeg_probe(output: str) -> Dict[str, Any]:
+    """Turn the input summary ffmpeg prints to stderr into the subset of ffprobe's JSON the app reads"""
+    probe: Dict[str, Any] = {"streams": [], "format": {}}
+    match = FFMPEG_INPUT_RE.search(output)
+    if match:
+        probe["format"]["format_name"] = match.group("format")
+    match = FFMPEG_DURATION_RE.search(output)
+    if match:
+        probe["format"]["duration"] = str(int(match.group("h")) * 3600 + int(match.group("m")) * 60 + float(match.group("s")))
+        if match.group("kbps"):
+            probe["format"]["bit_rate"] = str(int(match.group("kbps")) * 1000)
+    for match in FFMPEG_STREAM_RE.finditer(output):
+        rest = match.group("rest")
+        stream = {"index": int(match.group("index")), "codec_type": match.group("type").lower(), "codec_name": match.group("codec")}
+        size = re.search(r", (\d{2,5})x(\d{2,5})\b", rest)
+        if size:
+            stream["width"], stream["height"] = int(size.group(1)), int(size.group(2))
+        rate = re.search(r", (\d+) Hz", rest)
+        if rate:
+            stream["sample_rate"] = rate.group(1)
+        probe["streams"].append(stream)
+    return probe
+
+async def get_video_info(file_path: str) -> Dict[str, Any]:
+    """Get video information using ffprobe, or ffmpeg's input summary when ffprobe is not installed"""
     try:
+        if not ffprobe_available():
+            # With no output file ffmpeg only prints the input summary and exits with 1
+            result = await run_media_process([get_ffmpeg_path(), '-hide_banner', '-i', file_path],
+                                             timeout=FFPROBE_TIMEOUT, stage='ffprobe', check=False)
+            return parse_ffmpeg_probe(result.stderr)
         ffprobe_cmd = [
-            FFMPEG_PATH.replace('ffmpeg', 'ffprobe'),
+            get_ffprobe_path(),
             '-v', 'quiet',
             '-print_format', 'json',
             '-show_format',
             '-show_streams',
             file_path
         ]
-        result = subprocess.run(ffprobe_cmd, capture_output=True, text=True)
+        result = await run_media_process(ffprobe_cmd, timeout=FFPROBE_TIMEOUT, stage='ffprobe', check=False)
         if result.returncode == 0:
-            return json.loads(result.stdout)
+            return loads_json(result.stdout)
         return {}
     except Exception as e:
         logger.error(f"Error getting video info: {e}")
         return {}
 
-def convert_video(input_path: str, output_path: str, output_format: str, quality: str, resolution: str):
+def ffmpeg_progress_parser(duration: float, on_progress):
+    """on_stdout_line callback turning `-progress pipe:1` output into on_progress(percent) calls"""
+    def on_line(line: str):
+        if on_progress and duration and line.startswith('out_time_us='):
+            try:
+                return on_progress(min(99.0, int(line.split('=', 1)[1]) / 1e6 / duration * 100))
+            except ValueError:
+                return None
+    return on_line
+
+async def convert_video(input_path: str, output_path: str, output_format: str, quality: str, resolution: str,
+                        trace: Optional[JobTrace] = None, on_progress=None):
     """Convert video to different format/quality"""
     try:
-        ffmpeg_cmd = [FFMPEG_PATH, '-i', input_path]
+        ffmpeg_cmd = [get_ffmpeg_path(), '-i', input_path]
+        on_stdout_line = None
+        if on_progress:
+            probe = await get_video_info(input_path)
+            duration = float(probe.get("format", {}).get("duration") or 0)
+            ffmpeg_cmd.extend(['-progress', 'pipe:1', '-nostats'])
+            on_stdout_line = ffmpeg_progress_parser(duration, on_progress)
         
         # Set video quality
         if quality != "auto" and quality != "original":
@@ -1268,10 +4059,12 @@ def convert_video(input_path: str, output_path: str, output_format: str, quality
         
         ffmpeg_cmd.append('-y')  # Overwrite output file
         ffmpeg_cmd.append(output_path)
-        
+        content_store.release(output_path)
+
         logger.info(f"Conversion command: {' '.join(ffmpeg_cmd)}")
         
-        result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
+        result = await run_media_process(ffmpeg_cmd, timeout=FFMPEG_TIMEOUT, stage='ffmpeg_convert', trace=trace,
+                                         on_stdout_line=on_stdout_line, check=False)
         if result.returncode != 0:
             raise Exception(f"FFmpeg error: {result.stderr}")
         
@@ -1280,6 +4073,136 @@ def convert_video(input_path: str, output_path: str, output_format: str, quality
         logger.error(f"Video conversion error: {e}")
         raise
 
+# ============================================
+# Adaptive Streaming Packaging (HLS / DASH)
+# ============================================
+STREAMS_DIR = "./streams"
+STREAMING_FORMATS = ("hls", "dash")
+STREAM_SEGMENT_SECONDS = 4
+# (height, video kbps); rungs above the source height are skipped
+STREAM_LADDER = [(1080, 5000), (720, 2800), (480, 1400), (360, 800)]
+STREAM_MAX_RUNGS = 3
+STREAM_AUDIO_BITRATE = "128k"
+STREAM_MEDIA_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.mpd': 'application/dash+xml',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4',
+    '.json': 'application/json',
+}
+os.makedirs(STREAMS_DIR, exist_ok=True)
+
+def stream_package_id(input_path: str, output_format: str) -> str:
+    """Versioned by the source's size/mtime and the ladder, so package URLs never change content"""
+    st = os.stat(input_path)
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    version = hashlib.sha256(
+        f"{st.st_size}:{st.st_mtime_ns}:{output_format}:{STREAM_LADDER}:{STREAM_SEGMENT_SECONDS}".encode()
+    ).hexdigest()[:12]
+    return f"{stem}_{output_format}_{version}"
+
+def select_stream_ladder(source_height: int) -> List[tuple]:
+    rungs = [rung for rung in STREAM_LADDER if rung[0] <= source_height][:STREAM_MAX_RUNGS]
+    return rungs or [(source_height - source_height % 2, STREAM_LADDER[-1][1])]
+
+async def package_stream(input_path: str, output_format: str, trace: Optional[JobTrace] = None,
+                         on_progress=None) -> Dict[str, Any]:
+    """
+    Encode a small bitrate ladder in one ffmpeg run and cut it into fMP4 segments with
+    keyframes aligned across renditions. "hls" writes HLS playlists; "dash" writes a DASH
+    manifest plus HLS playlists over the same CMAF segments, so one package serves both
+    kinds of player. A finished package is reused while the source is unchanged.
+    """
+    package_id = stream_package_id(input_path, output_format)
+    package_dir = os.path.join(STREAMS_DIR, package_id)
+    meta_path = os.path.join(package_dir, "package.json")
+    if os.path.exists(meta_path):
+        async with aiofiles.open(meta_path, "r") as f:
+            return {**json.loads(await f.read()), "cached": True}
+
+    probe = await get_video_info(input_path)
+    streams = probe.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if not video:
+        raise ValueError("Source has no video stream")
+    has_audio = any(s.get("codec_type") == "audio" for s in streams)
+    duration = float(probe.get("format", {}).get("duration") or 0)
+    ladder = select_stream_ladder(int(video.get("height") or 720))
+    count = len(ladder)
+
+    work_dir = f"{package_dir}.tmp-{uuid.uuid4().hex[:8]}"
+    os.makedirs(work_dir)
+    filter_graph = (
+        f"[0:v]split={count}" + "".join(f"[s{i}]" for i in range(count)) + ";"
+        + ";".join(f"[s{i}]scale=-2:{height}[v{i}]" for i, (height, _) in enumerate(ladder))
+    )
+    cmd = [get_ffmpeg_path(), '-hide_banner', '-loglevel', 'error', '-i', input_path, '-filter_complex', filter_graph]
+    for i, (_, kbps) in enumerate(ladder):
+        cmd += ['-map', f'[v{i}]', f'-c:v:{i}', 'libx264', f'-b:v:{i}', f'{kbps}k',
+                f'-maxrate:v:{i}', f'{int(kbps * 1.1)}k', f'-bufsize:v:{i}', f'{kbps * 2}k']
+    if has_audio:
+        # One audio rendition shared by every video rung
+        cmd += ['-map', '0:a:0', '-c:a', 'aac', '-b:a', STREAM_AUDIO_BITRATE, '-ac', '2']
+    cmd += ['-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-sc_threshold', '0',
+            '-force_key_frames', f'expr:gte(t,n_forced*{STREAM_SEGMENT_SECONDS})',
+            '-progress', 'pipe:1', '-nostats']
+    if output_format == "hls":
+        var_map = " ".join(f"v:{i}" + (",agroup:audio" if has_audio else "") for i in range(count))
+        if has_audio:
+            var_map += " a:0,agroup:audio"
+        cmd += ['-f', 'hls', '-hls_time', str(STREAM_SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+                '-hls_segment_type', 'fmp4', '-hls_fmp4_init_filename', 'init_%v.mp4',
+                '-hls_segment_filename', os.path.join(work_dir, 'seg_%v_%05d.m4s'),
+                '-master_pl_name', 'master.m3u8', '-var_stream_map', var_map,
+                os.path.join(work_dir, 'stream_%v.m3u8')]
+        manifests = {"hls": "master.m3u8"}
+    else:
+        cmd += ['-f', 'dash', '-seg_duration', str(STREAM_SEGMENT_SECONDS), '-use_template', '1', '-use_timeline', '1',
+                '-hls_playlist', '1', '-init_seg_name', 'init_$RepresentationID$.m4s',
+                '-media_seg_name', 'seg_$RepresentationID$_$Number%05d$.m4s',
+                '-adaptation_sets', 'id=0,streams=v' + (' id=1,streams=a' if has_audio else ''),
+                os.path.join(work_dir, 'manifest.mpd')]
+        manifests = {"dash": "manifest.mpd", "hls": "master.m3u8"}
+
+    try:
+        await run_media_process(cmd, timeout=FFMPEG_TIMEOUT, stage='ffmpeg_package', trace=trace,
+                                on_stdout_line=ffmpeg_progress_parser(duration, on_progress))
+        meta = {
+            "package_id": package_id,
+            "format": output_format,
+            "renditions": [f"{height}p" for height, _ in ladder],
+            "segment_seconds": STREAM_SEGMENT_SECONDS,
+            "size": sum(os.path.getsize(os.path.join(work_dir, name)) for name in os.listdir(work_dir)),
+            "manifests": {kind: f"http://localhost:8000/streams/{package_id}/{name}" for kind, name in manifests.items()},
+        }
+        async with aiofiles.open(os.path.join(work_dir, "package.json"), "w") as f:
+            await f.write(json.dumps(meta))
+        try:
+            os.rename(work_dir, package_dir)
+        except OSError:
+            # A concurrent request finished the same package first
+            shutil.rmtree(work_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    logger.info(f"📺 Packaged {os.path.basename(input_path)} as {output_format}: {', '.join(meta['renditions'])}")
+    return {**meta, "cached": False}
+
+@app.get("/streams/{package_id}/{asset}")
+async def serve_stream_asset(package_id: str, asset: str):
+    """Segments and manifests of packaged conversions; package ids are versioned, so they cache forever"""
+    for part in (package_id, asset):
+        if os.path.basename(part) != part or part.startswith("."):
+            raise HTTPException(status_code=400, detail="Invalid path")
+    path = os.path.join(STREAMS_DIR, package_id, asset)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(
+        path=path,
+        media_type=STREAM_MEDIA_TYPES.get(os.path.splitext(asset)[1].lower(), 'application/octet-stream'),
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
 # ============================================
 # NEW: Video Upload & Conversion Endpoints
 # ============================================
@@ -1300,20 +4223,18 @@ async def upload_video(file: UploadFile, background_tasks: BackgroundTasks):
         original_filename = f"{file_id}_original{file_extension}"
         original_path = os.path.join(DOWNLOADS_DIR, original_filename)
         
-        # Save uploaded file
-        with open(original_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # Save uploaded file (hashed while it is written; a known video is only linked)
+        _, file_size = await content_store.ingest_upload(file, original_path)
         
         # Get video info
-        video_info = get_video_info(original_path)
+        video_info = await get_video_info(original_path)
         
         # Save upload record
         upload_entry = {
             "id": file_id,
             "original_filename": file.filename,
             "stored_filename": original_filename,
-            "file_size": len(content),
+            "file_size": file_size,
             "upload_time": datetime.now().isoformat(),
             "video_info": video_info
         }
@@ -1322,7 +4243,7 @@ async def upload_video(file: UploadFile, background_tasks: BackgroundTasks):
             "file_id": file_id,
             "original_filename": file.filename,
             "stored_filename": original_filename,
-            "file_size": len(content),
+            "file_size": file_size,
             "video_info": video_info,
             "message": "Video uploaded successfully"
         }
@@ -1332,8 +4253,15 @@ async def upload_video(file: UploadFile, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 @app.post("/api/convert-video")
-async def convert_video_endpoint(req: ConvertRequest, background_tasks: BackgroundTasks):
+async def convert_video_endpoint(req: ConvertRequest, background_tasks: BackgroundTasks, request: Request):
     """Convert uploaded video to different format/quality"""
+    trace_id = req.conversion_id or str(uuid.uuid4())
+    trace = start_trace(trace_id, 'conversion', file=req.filename, output_format=req.output_format,
+                        quality=req.quality, resolution=req.resolution)
+    trace_status = "error"
+    token = create_cancel_token(trace_id, 'conversion')
+    # A client that hangs up should not leave the encoder running
+    disconnect_watcher = asyncio.create_task(cancel_on_http_disconnect(request, token))
     try:
         # Find original file
         original_pattern = os.path.join(DOWNLOADS_DIR, f"{req.filename}_original.*")
@@ -1345,23 +4273,38 @@ async def convert_video_endpoint(req: ConvertRequest, background_tasks: Backgrou
         original_path = original_files[0]
         original_extension = os.path.splitext(original_path)[1]
         
+        if req.output_format in STREAMING_FORMATS:
+            with track_job('conversion'):
+                package = await package_stream(original_path, req.output_format, trace=trace)
+            JOBS_TOTAL.inc(kind='conversion', platform='local', status='completed')
+            trace.set_attributes(bytes=package["size"], package_id=package["package_id"])
+            trace_status = "completed"
+            return {**package, "trace_id": trace_id, "message": "Video packaged for adaptive streaming"}
+        
         # Generate output filename
         output_filename = f"{req.filename}_converted.{req.output_format}"
         output_path = os.path.join(DOWNLOADS_DIR, output_filename)
+        token.track_path(output_path)
         
         # Convert video
-        await asyncio.to_thread(
-            convert_video, 
-            original_path, 
-            output_path, 
-            req.output_format, 
-            req.quality, 
-            req.resolution
-        )
+        with track_job('conversion'):
+            await convert_video(
+                original_path, 
+                output_path, 
+                req.output_format, 
+                req.quality, 
+                req.resolution,
+                trace=trace
+            )
+        JOBS_TOTAL.inc(kind='conversion', platform='local', status='completed')
+        await asyncio.to_thread(content_store.ingest, output_path)
         
         # Get converted file info
         converted_size = os.path.getsize(output_path)
-        video_info = get_video_info(output_path)
+        with trace.span('ffprobe'):
+            video_info = await get_video_info(output_path)
+        trace.set_attributes(bytes=converted_size)
+        trace_status = "completed"
         
         # Save conversion record
         conversion_entry = {
@@ -1381,15 +4324,36 @@ async def convert_video_endpoint(req: ConvertRequest, background_tasks: Backgrou
             "file_size": converted_size,
             "video_info": video_info,
             "download_url": f"http://localhost:8000/downloads/{output_filename}",
+            "trace_id": trace_id,
             "message": "Video converted successfully"
         }
         
     except Exception as e:
+        if token.cancelled:
+            await asyncio.to_thread(token.remove_partials)
+            trace.set_attributes(cancel_latency=token.stopped())
+            trace_status = "cancelled"
+            logger.info(f"❌ Conversion cancelled: {trace_id}")
+            JOBS_TOTAL.inc(kind='conversion', platform='local', status='cancelled')
+            raise HTTPException(status_code=409, detail="Conversion cancelled")
         logger.error(f"Conversion error: {e}")
+        JOBS_TOTAL.inc(kind='conversion', platform='local', status='error')
         raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
+    finally:
+        disconnect_watcher.cancel()
+        release_cancel_token(trace_id)
+        trace.finish(trace_status)
+
+async def cancel_on_http_disconnect(request: Request, token: CancellationToken, interval: float = 1.0):
+    while not token.cancelled:
+        if await request.is_disconnected():
+            logger.info(f"🔌 Client went away, cancelling {token.kind} {token.job_id}")
+            token.cancel()
+            return
+        await asyncio.sleep(interval)
 
 @app.get("/api/uploaded-videos")
-async def get_uploaded_videos():
+async def get_uploaded_videos(request: Request, fields: Optional[str] = None):
     """Get list of uploaded videos"""
     try:
         uploaded_videos = []
@@ -1399,7 +4363,7 @@ async def get_uploaded_videos():
             filename = os.path.basename(file_path)
             file_id = filename.split('_original')[0]
             file_size = os.path.getsize(file_path)
-            video_info = get_video_info(file_path)
+            video_info = await get_video_info(file_path)
             
             uploaded_videos.append({
                 "file_id": file_id,
@@ -1409,10 +4373,10 @@ async def get_uploaded_videos():
                 "upload_time": datetime.fromtimestamp(os.path.getctime(file_path)).isoformat()
             })
         
-        return {"uploaded_videos": uploaded_videos}
+        return await json_response(request, {"uploaded_videos": uploaded_videos}, fields)
     except Exception as e:
         logger.error(f"Error getting uploaded videos: {e}")
-        return {"uploaded_videos": []}
+        return await json_response(request, {"uploaded_videos": []})
 
 @app.delete("/api/uploaded-videos/{file_id}")
 async def delete_uploaded_video(file_id: str):
@@ -1447,6 +4411,9 @@ async def delete_uploaded_video(file_id: str):
 @app.websocket("/ws/convert/{conversion_id}")
 async def websocket_convert(websocket: WebSocket, conversion_id: str):
     await websocket.accept()
+    trace = None
+    token = None
+    client_watcher = None
     
     try:
         # Wait for conversion start message
@@ -1455,6 +4422,8 @@ async def websocket_convert(websocket: WebSocket, conversion_id: str):
         output_format = data.get("output_format")
         quality = data.get("quality")
         resolution = data.get("resolution")
+        trace = start_trace(conversion_id, 'ws_conversion', file=filename, output_format=output_format,
+                            quality=quality, resolution=resolution)
         
         if not filename:
             await websocket.send_json({"status": "error", "message": "No filename provided"})
@@ -1471,17 +4440,38 @@ async def websocket_convert(websocket: WebSocket, conversion_id: str):
         original_path = original_files[0]
         output_filename = f"{filename}_converted.{output_format}"
         output_path = os.path.join(DOWNLOADS_DIR, output_filename)
+        token = create_cancel_token(conversion_id, 'conversion')
+        token.track_path(output_path)
+        client_watcher = asyncio.create_task(cancel_on_websocket_close(websocket, token))
         
         await websocket.send_json({"status": "initializing", "message": "Starting conversion..."})
         
         # Enhanced conversion function with progress reporting
         async def convert_with_progress():
             try:
+                if output_format in STREAMING_FORMATS:
+                    async def on_package_progress(percent: float):
+                        await websocket.send_json({
+                            "status": "converting",
+                            "message": "Packaging for streaming...",
+                            "progress": round(percent, 1)
+                        })
+                    package = await package_stream(original_path, output_format, trace=trace, on_progress=on_package_progress)
+                    JOBS_TOTAL.inc(kind='conversion', platform='local', status='completed')
+                    trace.set_attributes(bytes=package["size"], package_id=package["package_id"])
+                    trace.finish("completed")
+                    await websocket.send_json({
+                        "status": "completed",
+                        "message": "Video packaged for adaptive streaming",
+                        **package
+                    })
+                    return
+                
                 # Get original file size for progress calculation
                 original_size = os.path.getsize(original_path)
                 
                 ffmpeg_cmd = [
-                    FFMPEG_PATH, 
+                    get_ffmpeg_path(), 
                     '-i', original_path,
                     '-progress', 'pipe:1',  # Send progress to stdout
                     '-loglevel', 'info'
@@ -1531,46 +4521,35 @@ async def websocket_convert(websocket: WebSocket, conversion_id: str):
                     ])
                 
                 ffmpeg_cmd.extend(['-y', output_path])
+                content_store.release(output_path)
                 
                 logger.info(f"Starting conversion with command: {' '.join(ffmpeg_cmd)}")
                 
-                # Start FFmpeg process
-                process = await asyncio.create_subprocess_exec(
-                    *ffmpeg_cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                
-                # Read progress from stdout
-                while True:
-                    line = await process.stdout.readline()
-                    if not line:
-                        break
-                    
-                    line_str = line.decode().strip()
-                    
-                    # Parse progress information
+                # Parse progress information from ffmpeg's stdout
+                async def on_progress_line(line_str: str):
                     if line_str.startswith('out_time='):
-                        # Extract time progress
-                        time_str = line_str.split('=')[1]
                         # Send progress update
                         await websocket.send_json({
                             "status": "converting",
                             "message": "Converting video...",
                             "progress": 50  # Estimate 50% for time-based progress
                         })
-                    
-                    elif line_str.startswith('progress='):
-                        progress_val = line_str.split('=')[1]
-                        if progress_val == 'end':
-                            break
                 
-                # Wait for process completion
-                await process.wait()
+                result = await run_media_process(
+                    ffmpeg_cmd, timeout=FFMPEG_TIMEOUT, stage='ffmpeg_convert', trace=trace,
+                    on_stdout_line=on_progress_line, check=False
+                )
                 
-                if process.returncode == 0:
+                if token.cancelled:
+                    await finish_cancelled_conversion(websocket, token, trace)
+                elif result.returncode == 0:
+                    JOBS_TOTAL.inc(kind='conversion', platform='local', status='completed')
+                    await asyncio.to_thread(content_store.ingest, output_path)
                     converted_size = os.path.getsize(output_path)
-                    video_info = get_video_info(output_path)
+                    with trace.span('ffprobe'):
+                        video_info = await get_video_info(output_path)
+                    trace.set_attributes(bytes=converted_size)
+                    trace.finish("completed")
                     
                     await websocket.send_json({
                         "status": "completed",
@@ -1581,14 +4560,18 @@ async def websocket_convert(websocket: WebSocket, conversion_id: str):
                         "download_url": f"http://localhost:8000/downloads/{output_filename}"
                     })
                 else:
-                    stderr = await process.stderr.read()
-                    error_msg = stderr.decode() if stderr else "Unknown error"
+                    JOBS_TOTAL.inc(kind='conversion', platform='local', status='error')
+                    trace.finish("error")
+                    error_msg = result.stderr or "Unknown error"
                     await websocket.send_json({
                         "status": "error", 
                         "message": f"Conversion failed: {error_msg}"
                     })
                     
             except Exception as e:
+                if token.cancelled:
+                    await finish_cancelled_conversion(websocket, token, trace)
+                    return
                 logger.error(f"Conversion error: {e}")
                 await websocket.send_json({
                     "status": "error", 
@@ -1596,7 +4579,8 @@ async def websocket_convert(websocket: WebSocket, conversion_id: str):
                 })
         
         # Start conversion
-        await convert_with_progress()
+        with track_job('conversion'):
+            await convert_with_progress()
         
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for conversion: {conversion_id}")
@@ -1607,7 +4591,805 @@ async def websocket_convert(websocket: WebSocket, conversion_id: str):
             "message": f"WebSocket error: {str(e)}"
         })
     finally:
-        await websocket.close()
+        if client_watcher:
+            client_watcher.cancel()
+        if token:
+            release_cancel_token(conversion_id)
+        if trace:
+            trace.finish("error")
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+async def cancel_on_websocket_close(websocket: WebSocket, token: CancellationToken):
+    """Cancel on an explicit {"action": "cancel"} message or when the client goes away"""
+    while True:
+        try:
+            msg = await websocket.receive_json()
+        except ValueError:
+            continue  # not JSON, ignore
+        except Exception:
+            logger.info(f"🔌 Client went away, cancelling {token.kind} {token.job_id}")
+            break
+        if isinstance(msg, dict) and msg.get("action") == "cancel":
+            break
+    token.cancel()
+
+async def finish_cancelled_conversion(websocket: WebSocket, token: CancellationToken, trace: JobTrace):
+    removed = await asyncio.to_thread(token.remove_partials)
+    latency = token.stopped()
+    trace.set_attributes(cancel_latency=latency, partials_removed=removed)
+    trace.finish("cancelled")
+    JOBS_TOTAL.inc(kind='conversion', platform='local', status='cancelled')
+    logger.info(f"❌ Conversion cancelled: {token.job_id} (stopped in {latency or 0:.3f}s)")
+    try:
+        await websocket.send_json({"status": "cancelled", "message": "Conversion cancelled"})
+    except Exception:
+        WS_SEND_FAILURES.inc()
+
+# ============================================
+# Multiplexed Job Socket (one connection for every download and conversion)
+# ============================================
+JOB_SOCKET_TICK = 0.25  # seconds; progress for all subscribed jobs goes out in one frame per tick
+JOB_SOCKET_MAX_SUBSCRIPTIONS = 500
+
+JOB_SOCKETS = Gauge("downloader_job_sockets", "Open multiplexed job websockets")
+JOB_SOCKET_FRAMES = Counter("downloader_job_socket_frames_total", "Batched progress frames sent on multiplexed sockets")
+
+conversion_tasks: Dict[str, asyncio.Task] = {}
+
+async def run_conversion_job(conversion_id: str, filename: str, output_format: str, quality: str,
+                             resolution: str) -> Dict[str, Any]:
+    """Conversion that reports through the progress hub, so it outlives the socket that started it"""
+    trace = start_trace(conversion_id, 'conversion', file=filename, output_format=output_format,
+                        quality=quality, resolution=resolution)
+    trace_status = "error"
+    token = create_cancel_token(conversion_id, 'conversion')
+
+    def on_progress(percent: float):
+        publish_progress(conversion_id, {"status": "converting", "message": "Converting video...", "progress": round(percent, 1)})
+
+    try:
+        publish_progress(conversion_id, {"status": "initializing", "message": "Starting conversion..."})
+        original_files = glob.glob(os.path.join(DOWNLOADS_DIR, f"{glob.escape(filename)}_original.*"))
+        if not original_files:
+            raise ValueError("Original video not found")
+        original_path = original_files[0]
+
+        with track_job('conversion'):
+            if output_format in STREAMING_FORMATS:
+                package = await package_stream(original_path, output_format, trace=trace, on_progress=on_progress)
+                result = {"status": "completed", "message": "Video packaged for adaptive streaming", **package}
+            else:
+                output_filename = f"{filename}_converted.{output_format}"
+                output_path = os.path.join(DOWNLOADS_DIR, output_filename)
+                token.track_path(output_path)
+                await convert_video(original_path, output_path, output_format, quality, resolution,
+                                    trace=trace, on_progress=on_progress)
+                await asyncio.to_thread(content_store.ingest, output_path)
+                result = {
+                    "status": "completed",
+                    "message": "Conversion completed successfully",
+                    "converted_filename": output_filename,
+                    "file_size": os.path.getsize(output_path),
+                    "download_url": f"http://localhost:8000/downloads/{output_filename}"
+                }
+        JOBS_TOTAL.inc(kind='conversion', platform='local', status='completed')
+        trace_status = "completed"
+    except Exception as e:
+        if token.cancelled:
+            await asyncio.to_thread(token.remove_partials)
+            trace.set_attributes(cancel_latency=token.stopped())
+            trace_status = "cancelled"
+            logger.info(f"❌ Conversion cancelled: {conversion_id}")
+            JOBS_TOTAL.inc(kind='conversion', platform='local', status='cancelled')
+            result = {"status": "cancelled", "message": "Conversion cancelled"}
+        else:
+            logger.error(f"Conversion error: {e}")
+            JOBS_TOTAL.inc(kind='conversion', platform='local', status='error')
+            result = {"status": "error", "message": f"Conversion failed: {str(e)}"}
+    finally:
+        release_cancel_token(conversion_id)
+        trace.finish(trace_status)
+    publish_progress(conversion_id, result)
+    progress_hub.finish(conversion_id)
+    return result
+
+def start_conversion_job(conversion_id: str, data: Dict[str, Any]):
+    if not data.get("filename"):
+        raise ValueError("No filename provided")
+    conversion_tasks[conversion_id] = asyncio.create_task(run_conversion_job(
+        conversion_id, data["filename"], data.get("output_format", "mp4"),
+        data.get("quality", "auto"), data.get("resolution", "original")
+    ))
+    conversion_tasks[conversion_id].add_done_callback(lambda _: conversion_tasks.pop(conversion_id, None))
+
+def is_local_job(job_id: str) -> bool:
+    return job_id in download_sessions or job_id in conversion_tasks or job_id in cancel_tokens
+
+class JobSocketClient:
+    """
+    State of one multiplexed socket: a forwarding task per subscribed job copies its updates
+    into `pending` (latest update per job wins), and a flusher sends everything pending as a
+    single frame once per tick, so 30 busy jobs cost one send per tick instead of 30.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.subscriptions: Dict[str, asyncio.Task] = {}
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.has_pending = asyncio.Event()
+        self.send_lock = asyncio.Lock()
+
+    async def send(self, frame: Dict[str, Any]):
+        async with self.send_lock:
+            await self.websocket.send_text(dumps_json(frame).decode("utf-8"))
+
+    def enqueue(self, job_id: str, msg: Dict[str, Any]):
+        self.pending[job_id] = msg
+        self.has_pending.set()
+
+    def subscribe(self, job_id: str) -> bool:
+        if job_id in self.subscriptions:
+            return True
+        if len(self.subscriptions) >= JOB_SOCKET_MAX_SUBSCRIPTIONS:
+            return False
+        # Join the hub now rather than when the task first runs: a job started just before this
+        # call may fail at once, and its terminal update must already have somewhere to go
+        queue = progress_hub.subscribe(job_id) if is_local_job(job_id) else None
+        task = asyncio.create_task(self._forward(job_id, queue))
+        self.subscriptions[job_id] = task
+
+        def forward_done(t: asyncio.Task):
+            if queue is not None:
+                progress_hub.unsubscribe(job_id, queue)
+            if self.subscriptions.get(job_id) is t:
+                self.subscriptions.pop(job_id, None)
+        task.add_done_callback(forward_done)
+        return True
+
+    def unsubscribe(self, job_id: str):
+        task = self.subscriptions.pop(job_id, None)
+        if task:
+            task.cancel()
+        self.pending.pop(job_id, None)
+
+    async def _forward(self, job_id: str, queue: Optional[asyncio.Queue]):
+        if queue is not None:
+            await self._forward_local(job_id, queue)
+            return
+        session = await asyncio.to_thread(state_backend.get_session, job_id)
+        if session and session.get("status") in ACTIVE_SESSION_STATUSES:
+            await self._forward_remote(job_id, session)
+        else:
+            self.enqueue(job_id, {"status": "not_found", "message": "Job not found"})
+
+    async def _forward_local(self, job_id: str, queue: asyncio.Queue):
+        # The hub replays the job's last update, so a (re)subscribing client starts from current state
+        while True:
+            try:
+                msg = await asyncio.wait_for(queue.get(), timeout=WORKER_STALE_AFTER)
+            except asyncio.TimeoutError:
+                if not is_local_job(job_id):
+                    break
+                continue
+            if msg is None:
+                break
+            self.enqueue(job_id, msg)
+            if msg.get("status") in TERMINAL_STATUSES:
+                break
+
+    async def _forward_remote(self, job_id: str, session: Dict[str, Any]):
+        subscription = state_backend.subscribe(f"progress:{job_id}")
+        try:
+            self.enqueue(job_id, {
+                "status": session.get("status"),
+                "percent": session.get("progress", 0),
+                "speed": session.get("speed", "Unknown"),
+                "eta": session.get("eta", "Unknown")
+            })
+            while True:
+                msg = await subscription.get(timeout=WORKER_STALE_AFTER)
+                if msg is None:
+                    latest = await asyncio.to_thread(state_backend.get_session, job_id)
+                    if not latest or latest.get("status") not in ACTIVE_SESSION_STATUSES:
+                        break
+                    continue
+                self.enqueue(job_id, msg)
+                if msg.get("status") in TERMINAL_STATUSES:
+                    break
+        finally:
+            subscription.close()
+
+    async def flush_loop(self):
+        while True:
+            await self.has_pending.wait()
+            await asyncio.sleep(JOB_SOCKET_TICK)  # let the rest of this tick's updates coalesce
+            self.has_pending.clear()
+            updates, self.pending = self.pending, {}
+            if updates:
+                await self.send({"type": "progress", "jobs": updates})
+                JOB_SOCKET_FRAMES.inc()
+
+    async def cancel(self, job_id: str) -> bool:
+        if job_id in conversion_tasks and job_id not in cancel_tokens:
+            # Started but not yet running, so there is no token to trip
+            conversion_tasks[job_id].cancel()
+            publish_progress(job_id, {"status": "cancelled", "message": "Conversion cancelled"})
+            return True
+        if cancel_job(job_id):
+            if job_id in download_sessions:
+                save_sessions(job_id)
+            return True
+        session = await asyncio.to_thread(state_backend.get_session, job_id)
+        if session and session.get("status") in ACTIVE_SESSION_STATUSES:
+            # Owned by another worker: its control listener applies the cancel
+            state_backend.publish("control", {"action": "cancel", "download_id": job_id})
+            return True
+        return False
+
+    async def handle(self, msg: Dict[str, Any]):
+        action = msg.get("action")
+        reply: Dict[str, Any] = {"type": "ack", "action": action, "ref": msg.get("ref")}
+        if action in ("subscribe", "unsubscribe"):
+            job_ids = [str(job_id) for job_id in msg.get("job_ids") or []]
+            if action == "subscribe":
+                rejected = [job_id for job_id in job_ids if not self.subscribe(job_id)]
+                if rejected:
+                    reply["rejected"] = rejected
+            else:
+                for job_id in job_ids:
+                    self.unsubscribe(job_id)
+            reply["job_ids"] = job_ids
+        elif action in ("start_download", "start_conversion"):
+            # Written back so an error frame for this message carries the generated id too
+            job_id = msg["job_id"] = str(msg.get("job_id") or uuid.uuid4())
+            if is_local_job(job_id):
+                raise ValueError(f"Job {job_id} already exists")
+            if action == "start_download":
+                if not msg.get("url"):
+                    raise ValueError("No URL provided")
+                start_download_job(job_id, msg)
+            else:
+                start_conversion_job(job_id, msg)
+            self.subscribe(job_id)
+            reply["job_id"] = job_id
+        elif action == "cancel":
+            job_id = str(msg.get("job_id"))
+            if not await self.cancel(job_id):
+                raise ValueError(f"Job {job_id} not found")
+            reply["job_id"] = job_id
+        else:
+            raise ValueError(f"Unknown action: {action}")
+        await self.send(reply)
+
+    def close(self):
+        for task in list(self.subscriptions.values()):
+            task.cancel()
+        self.subscriptions.clear()
+
+@app.websocket("/ws/jobs")
+async def websocket_jobs(websocket: WebSocket):
+    """
+    One socket per client for all jobs. Client messages (an optional "ref" is echoed back):
+      {"action": "subscribe" | "unsubscribe", "job_ids": [...]}
+      {"action": "start_download", "job_id"?, "url", "type", "quality", "format", "start", "end", "precise_cut"}
+      {"action": "start_conversion", "job_id"?, "filename", "output_format", "quality", "resolution"}
+      {"action": "cancel", "job_id"}
+    Server frames: {"type": "ack", ...}, {"type": "error", "message", "ref", "job_id"} and
+      {"type": "progress", "jobs": {job_id: latest update}} at most once per tick.
+    """
+    await websocket.accept()
+    JOB_SOCKETS.inc()
+    client = JobSocketClient(websocket)
+    flusher = asyncio.create_task(client.flush_loop())
+    try:
+        while True:
+            try:
+                msg = await websocket.receive_json()
+            except ValueError:
+                await client.send({"type": "error", "message": "Invalid JSON"})
+                continue
+            if not isinstance(msg, dict):
+                await client.send({"type": "error", "message": "Expected a JSON object"})
+                continue
+            try:
+                await client.handle(msg)
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                # One bad message fails only itself; the socket and its other jobs carry on
+                if not isinstance(e, ValueError):
+                    logger.error(f"Job socket action {msg.get('action')} failed: {e}")
+                await client.send({"type": "error", "action": msg.get("action"), "ref": msg.get("ref"),
+                                   "job_id": msg.get("job_id"), "message": str(e)})
+    except WebSocketDisconnect:
+        logger.info(f"🔌 Job socket closed ({len(client.subscriptions)} subscription(s) dropped, jobs keep running)")
+    except Exception as e:
+        WS_SEND_FAILURES.inc()
+        logger.warning(f"⚠️ Job socket error: {e}")
+    finally:
+        flusher.cancel()
+        client.close()
+        JOB_SOCKETS.dec()
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+# ============================================
+# NEW: Thumbnail Proxy with Pooled HTTP Client & Disk Cache
+# ============================================
+THUMBNAIL_CACHE_DIR = "./thumbnail_cache"
+THUMBNAIL_WIDTHS = [160, 320, 480, 640, 1280]
+os.makedirs(THUMBNAIL_CACHE_DIR, exist_ok=True)
+
+THUMBNAIL_CONTENT_TYPES = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/gif': '.gif',
+}
+
+# Thumbnail CDNs of the supported platforms (a host matches itself and its subdomains);
+# anything else is refused so the proxy can't be pointed at arbitrary or internal hosts
+THUMBNAIL_ALLOWED_HOSTS = (
+    'ytimg.com', 'ggpht.com', 'googleusercontent.com',  # youtube
+    'tiktokcdn.com', 'tiktokcdn-us.com', 'tiktokcdn-eu.com', 'ibyteimg.com', 'muscdn.com',  # tiktok
+    'twimg.com',  # twitter
+    'cdninstagram.com', 'fbcdn.net',  # instagram, facebook
+    'redd.it', 'redditmedia.com', 'redditstatic.com',  # reddit
+    'vimeocdn.com',  # vimeo
+    'dmcdn.net',  # dailymotion
+)
+THUMBNAIL_MAX_BYTES = 10 * 1024 * 1024
+THUMBNAIL_MAX_REDIRECTS = 3
+THUMBNAIL_CACHE_MAX_BYTES = int(os.environ.get("THUMBNAIL_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+_http_client: Optional["httpx.AsyncClient"] = None
+
+class KeyedLocks:
+    """asyncio locks per key; an entry is dropped as soon as nobody holds or waits on it"""
+
+    def __init__(self):
+        self._locks: Dict[str, list] = {}  # key -> [lock, holders + waiters]
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+_thumbnail_locks = KeyedLocks()
+
+def get_http_client() -> "httpx.AsyncClient":
+    """Shared keep-alive HTTP client so CDN connections are reused across requests"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60),
+            # Redirects are followed by fetch_thumbnail so every hop is checked against the allowlist
+            follow_redirects=False,
+            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36'},
+        )
+    return _http_client
+
+def thumbnail_cache_key(url: str) -> str:
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+def touch_cached(path: str):
+    """Mark a cache entry as recently used (the cache evicts by mtime)"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def find_cached_thumbnail(key: str) -> Optional[str]:
+    matches = [p for p in glob.glob(os.path.join(THUMBNAIL_CACHE_DIR, f"{key}.*")) if '.tmp' not in p]
+    if matches:
+        touch_cached(matches[0])
+    return matches[0] if matches else None
+
+def prune_thumbnail_cache():
+    """Evict least recently used cache files until the cache fits THUMBNAIL_CACHE_MAX_BYTES"""
+    entries = []
+    total = 0
+    with os.scandir(THUMBNAIL_CACHE_DIR) as it:
+        for entry in it:
+            if not entry.is_file() or '.tmp' in entry.name:
+                continue
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+    if total <= THUMBNAIL_CACHE_MAX_BYTES:
+        return
+    entries.sort()
+    removed = 0
+    # Evict down to 90% so a full cache isn't rescanned on every miss
+    for _, size, path in entries:
+        if total <= THUMBNAIL_CACHE_MAX_BYTES * 0.9:
+            break
+        cleanup_file(path)
+        total -= size
+        removed += 1
+    logger.info(f"🧹 Evicted {removed} thumbnail cache files ({total / 1024 / 1024:.1f} MB left)")
+
+def is_allowed_thumbnail_host(host: str) -> bool:
+    return any(host == domain or host.endswith('.' + domain) for domain in THUMBNAIL_ALLOWED_HOSTS)
+
+async def check_thumbnail_url(url: str):
+    """Reject non-http(s) URLs, hosts outside the CDN allowlist and hosts resolving to non-public addresses"""
+    parsed = urlparse(url)
+    host = (parsed.hostname or '').lower().rstrip('.')
+    if parsed.scheme not in ("http", "https") or not host:
+        raise HTTPException(status_code=400, detail="Invalid thumbnail URL")
+    if not is_allowed_thumbnail_host(host):
+        raise HTTPException(status_code=403, detail="Thumbnail host not allowed")
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(
+            host, parsed.port or (443 if parsed.scheme == "https" else 80), type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise HTTPException(status_code=502, detail=f"Failed to resolve thumbnail host: {str(e)}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address[4][0].split('%')[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise HTTPException(status_code=403, detail="Thumbnail host resolves to a non-public address")
+
+def snap_thumbnail_width(width: int) -> int:
+    """Round requested width up to a known variant so the cache stays bounded"""
+    for allowed in THUMBNAIL_WIDTHS:
+        if width <= allowed:
+            return allowed
+    return THUMBNAIL_WIDTHS[-1]
+
+async def download_thumbnail(url: str, key: str) -> tuple:
+    """Stream the image to a temp file, following redirects only within the allowlist; returns (tmp_path, ext, size)"""
+    client = get_http_client()
+    for _ in range(THUMBNAIL_MAX_REDIRECTS + 1):
+        await check_thumbnail_url(url)
+        async with client.stream("GET", url) as response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers.get('location', ''))
+                continue
+            response.raise_for_status()
+
+            content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+            ext = THUMBNAIL_CONTENT_TYPES.get(content_type)
+            if ext is None:
+                raise HTTPException(status_code=415, detail=f"Thumbnail URL did not return an image ({content_type or 'no content type'})")
+            declared = response.headers.get('content-length')
+            if declared and declared.isdigit() and int(declared) > THUMBNAIL_MAX_BYTES:
+                raise HTTPException(status_code=413, detail="Thumbnail too large")
+
+            tmp_path = os.path.join(THUMBNAIL_CACHE_DIR, f"{key}.tmp{ext}")
+            size = 0
+            try:
+                async with aiofiles.open(tmp_path, "wb") as f:
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > THUMBNAIL_MAX_BYTES:
+                            raise HTTPException(status_code=413, detail="Thumbnail too large")
+                        await f.write(chunk)
+            except BaseException:
+                cleanup_file(tmp_path)
+                raise
+            return tmp_path, ext, size
+    raise HTTPException(status_code=502, detail="Too many thumbnail redirects")
+
+async def fetch_thumbnail(url: str) -> str:
+    """Return path of the cached original image, downloading it on a cache miss"""
+    key = thumbnail_cache_key(url)
+    async with _thumbnail_locks.hold(key):
+        cached = find_cached_thumbnail(key)
+        if cached:
+            return cached
+        
+        tmp_path, ext, size = await download_thumbnail(url, key)
+        cache_path = os.path.join(THUMBNAIL_CACHE_DIR, f"{key}{ext}")
+        os.replace(tmp_path, cache_path)
+        logger.info(f"🖼️ Cached thumbnail {key[:12]} ({size} bytes)")
+        prune_thumbnail_cache()
+        return cache_path
+
+async def get_thumbnail_variant(url: str, width: int) -> str:
+    """Return path of a resized, recompressed JPEG variant of the thumbnail"""
+    original_path = await fetch_thumbnail(url)
+    key = thumbnail_cache_key(url)
+    variant_path = os.path.join(THUMBNAIL_CACHE_DIR, f"{key}_{width}w.jpg")
+    
+    async with _thumbnail_locks.hold(f"{key}_{width}"):
+        if os.path.exists(variant_path):
+            touch_cached(variant_path)
+            return variant_path
+        
+        tmp_path = os.path.join(THUMBNAIL_CACHE_DIR, f"{key}_{width}w.tmp.jpg")
+        ffmpeg_cmd = [
+            get_ffmpeg_path(),
+            '-v', 'error',
+            '-i', original_path,
+            '-vf', f"scale='min({width},iw)':-2",
+            '-frames:v', '1',
+            '-q:v', '5',
+            '-y', tmp_path
+        ]
+        result = await run_media_process(ffmpeg_cmd, timeout=FFPROBE_TIMEOUT, stage='thumbnail_resize', check=False)
+        if result.returncode != 0:
+            cleanup_file(tmp_path)
+            raise Exception(f"FFmpeg error: {result.stderr}")
+        os.replace(tmp_path, variant_path)
+        prune_thumbnail_cache()
+        return variant_path
+
+@app.get("/api/thumbnail")
+async def thumbnail_proxy(url: str, width: Optional[int] = None):
+    """Proxy a remote thumbnail through the local cache, optionally resized"""
+    try:
+        if width:
+            path = await get_thumbnail_variant(url, snap_thumbnail_width(width))
+            media_type = 'image/jpeg'
+        else:
+            path = await fetch_thumbnail(url)
+            ext = os.path.splitext(path)[1]
+            media_type = next((ct for ct, e in THUMBNAIL_CONTENT_TYPES.items() if e == ext), 'image/jpeg')
+        
+        return FileResponse(
+            path=path,
+            media_type=media_type,
+            headers={"Cache-Control": "public, max-age=86400, immutable"}
+        )
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
+        logger.error(f"Thumbnail fetch error for {url}: {e}")
+        raise HTTPException(status_code=502, detail=f"Failed to fetch thumbnail: {str(e)}")
+    except Exception as e:
+        logger.error(f"Thumbnail proxy error for {url}: {e}")
+        raise HTTPException(status_code=500, detail=f"Thumbnail failed: {str(e)}")
+
+@app.on_event("shutdown")
+async def close_http_client():
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+
+# ============================================
+# Preview Clips & Storyboard Sprites (one keyframe-only ffmpeg pass, cached)
+# ============================================
+PREVIEW_CACHE_DIR = os.path.join(DOWNLOADS_DIR, ".previews")
+PREVIEW_FRAMES = 120  # sampled evenly over the whole file
+PREVIEW_FPS = 12  # so the preview runs PREVIEW_FRAMES / PREVIEW_FPS seconds
+PREVIEW_HEIGHT = 240
+STORYBOARD_INTERVAL = 10  # seconds between storyboard tiles by default
+STORYBOARD_COLUMNS = 10
+STORYBOARD_MAX_TILES = 100
+STORYBOARD_TILE_WIDTH = 160
+os.makedirs(PREVIEW_CACHE_DIR, exist_ok=True)
+
+_preview_locks = KeyedLocks()
+
+def resolve_download_path(filename: str) -> str:
+    if not filename or os.path.basename(filename) != filename or filename.startswith("."):
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    path = os.path.join(DOWNLOADS_DIR, filename)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return path
+
+def preview_cache_paths(filename: str, source_path: str, interval: float) -> Dict[str, str]:
+    """Cache files are keyed by name, and versioned by size/mtime so a replaced source misses the cache"""
+    name_key = hashlib.sha256(filename.encode("utf-8")).hexdigest()[:16]
+    st = os.stat(source_path)
+    version = hashlib.sha256(f"{st.st_size}:{st.st_mtime_ns}:{interval:g}".encode()).hexdigest()[:12]
+    prefix = os.path.join(PREVIEW_CACHE_DIR, f"{name_key}.{version}")
+    return {
+        "name_key": name_key,
+        "version": version,
+        "clip": f"{prefix}.preview.mp4",
+        "storyboard": f"{prefix}.storyboard.jpg",
+        "meta": f"{prefix}.json",
+    }
+
+def drop_stale_previews(name_key: str, version: str):
+    for path in glob.glob(os.path.join(PREVIEW_CACHE_DIR, f"{name_key}.*")):
+        if not os.path.basename(path).startswith(f"{name_key}.{version}."):
+            cleanup_file(path)
+
+async def build_preview(source_path: str, paths: Dict[str, str], interval: float) -> Dict[str, Any]:
+    """
+    Decode only keyframes (-skip_frame nokey) and split them into two outputs: the
+    storyboard sprite (one tile every `interval` seconds) and a silent time-lapse preview
+    clip of PREVIEW_FRAMES frames spread over the whole file.
+    """
+    probe = await get_video_info(source_path)
+    video = next((s for s in probe.get("streams", []) if s.get("codec_type") == "video"), None)
+    if not video:
+        raise HTTPException(status_code=400, detail="File has no video stream")
+    duration = float(probe.get("format", {}).get("duration") or video.get("duration") or 0)
+    if duration <= 0:
+        raise HTTPException(status_code=400, detail="Could not determine video duration")
+
+    interval = max(interval, duration / STORYBOARD_MAX_TILES)
+    tiles = max(1, math.ceil(duration / interval))
+    columns = min(STORYBOARD_COLUMNS, tiles)
+    rows = math.ceil(tiles / columns)
+    width, height = int(video.get("width") or 16), int(video.get("height") or 9)
+    tile_height = max(2, round(STORYBOARD_TILE_WIDTH * height / width / 2) * 2)
+    sample_rate = min(PREVIEW_FRAMES / duration, PREVIEW_FPS)
+
+    clip_tmp = paths["clip"] + ".tmp.mp4"
+    storyboard_tmp = paths["storyboard"] + ".tmp.jpg"
+    # eof_action=pass: a clip shorter than the interval may hold a single keyframe, which fps would drop
+    filter_graph = (
+        f"[0:v]split=2[sb][pv];"
+        f"[sb]fps=1/{interval:.4f}:eof_action=pass,scale={STORYBOARD_TILE_WIDTH}:{tile_height},tile={columns}x{rows}[storyboard];"
+        f"[pv]fps={sample_rate:.6f}:eof_action=pass,scale=-2:{PREVIEW_HEIGHT},setpts=N/({PREVIEW_FPS}*TB)[preview]"
+    )
+    cmd = [
+        get_ffmpeg_path(), '-hide_banner', '-loglevel', 'error',
+        '-skip_frame', 'nokey', '-i', source_path, '-an',
+        '-filter_complex', filter_graph,
+        '-map', '[storyboard]', '-frames:v', '1', '-q:v', '5', '-y', storyboard_tmp,
+        '-map', '[preview]', '-r', str(PREVIEW_FPS), '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '32',
+        '-pix_fmt', 'yuv420p', '-movflags', '+faststart', '-y', clip_tmp,
+    ]
+    try:
+        await run_media_process(cmd, timeout=FFMPEG_TIMEOUT, stage='preview')
+        os.replace(storyboard_tmp, paths["storyboard"])
+        os.replace(clip_tmp, paths["clip"])
+    finally:
+        cleanup_file(storyboard_tmp)
+        cleanup_file(clip_tmp)
+
+    meta = {
+        "duration": duration,
+        "storyboard": {
+            "interval": round(interval, 3),
+            "tiles": tiles,
+            "columns": columns,
+            "rows": rows,
+            "tile_width": STORYBOARD_TILE_WIDTH,
+            "tile_height": tile_height,
+        },
+        "preview": {"frames": min(PREVIEW_FRAMES, math.ceil(duration * sample_rate)), "fps": PREVIEW_FPS, "height": PREVIEW_HEIGHT},
+    }
+    async with aiofiles.open(paths["meta"], "w") as f:
+        await f.write(json.dumps(meta))
+    return meta
+
+async def get_preview(filename: str, interval: float) -> tuple:
+    """Return (paths, metadata), generating the preview on a cache miss"""
+    source_path = resolve_download_path(filename)
+    paths = preview_cache_paths(filename, source_path, interval)
+    async with _preview_locks.hold(paths["name_key"]):
+        if all(os.path.exists(paths[k]) for k in ("clip", "storyboard", "meta")):
+            async with aiofiles.open(paths["meta"], "r") as f:
+                return paths, json.loads(await f.read())
+        drop_stale_previews(paths["name_key"], paths["version"])
+        started = time.perf_counter()
+        meta = await build_preview(source_path, paths, interval)
+        logger.info(f"🎞️ Built preview for {filename} in {time.perf_counter() - started:.2f}s")
+        return paths, meta
+
+@app.get("/api/preview/{filename}")
+async def preview_info(filename: str, interval: float = STORYBOARD_INTERVAL):
+    """Preview clip and storyboard sprite for a downloaded or uploaded file"""
+    try:
+        paths, meta = await get_preview(filename, max(1.0, interval))
+        query = f"?interval={max(1.0, interval):g}&v={paths['version']}"
+        return {
+            "filename": filename,
+            **meta,
+            "preview_url": f"http://localhost:8000/api/preview/{filename}/clip{query}",
+            "storyboard_url": f"http://localhost:8000/api/preview/{filename}/storyboard{query}",
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Preview error for {filename}: {e}")
+        raise HTTPException(status_code=500, detail=f"Preview failed: {str(e)}")
+
+@app.get("/api/preview/{filename}/{asset}")
+async def preview_asset(filename: str, asset: str, interval: float = STORYBOARD_INTERVAL):
+    if asset not in ("clip", "storyboard"):
+        raise HTTPException(status_code=404, detail="Unknown preview asset")
+    try:
+        paths, _ = await get_preview(filename, max(1.0, interval))
+        return FileResponse(
+            path=paths[asset],
+            media_type="video/mp4" if asset == "clip" else "image/jpeg",
+            # URLs from preview_info carry the version, so a cached copy never goes stale
+            headers={"Cache-Control": "public, max-age=86400"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Preview error for {filename}: {e}")
+        raise HTTPException(status_code=500, detail=f"Preview failed: {str(e)}")
+
+# ============================================
+# NEW: Cold Start Warm-up & Readiness
+# ============================================
+warmup_state: Dict[str, Any] = {"started": False, "finished": False, "error": None}
+
+def warm_up():
+    """Load yt-dlp, its extractors and ffmpeg/ffprobe ahead of the first request"""
+    warmup_state["started"] = True
+    started = time.perf_counter()
+    try:
+        step = time.perf_counter()
+        extractors = list(yt_dlp.extractor.gen_extractor_classes())
+        STARTUP_TIMINGS["extractors_seconds"] = round(time.perf_counter() - step, 4)
+        warmup_state["extractors"] = len(extractors)
+
+        step = time.perf_counter()
+        get_ffmpeg_path()
+        get_ffprobe_path()
+        STARTUP_TIMINGS["ffmpeg_resolve_seconds"] = round(time.perf_counter() - step, 4)
+
+        # Build one generic instance so the first job gets a warm YoutubeDL from the pool
+        step = time.perf_counter()
+        with ydl_pool.checkout('unknown', build_ydl_opts('unknown')):
+            pass
+        STARTUP_TIMINGS["ydl_pool_seconds"] = round(time.perf_counter() - step, 4)
+
+        httpx._load()
+    except Exception as e:
+        warmup_state["error"] = str(e)
+        logger.error(f"❌ Warm-up failed: {e}", exc_info=True)
+    finally:
+        STARTUP_TIMINGS["warmup_seconds"] = round(time.perf_counter() - started, 4)
+        STARTUP_TIMINGS["time_to_ready_seconds"] = round(time.perf_counter() - STARTUP_STARTED, 4)
+        warmup_state["finished"] = True
+        logger.info(f"🔥 Warm-up finished in {STARTUP_TIMINGS['warmup_seconds']}s "
+                    f"({STARTUP_TIMINGS['time_to_ready_seconds']}s since process import)")
+
+@app.on_event("startup")
+async def schedule_warm_up():
+    STARTUP_TIMINGS["time_to_startup_seconds"] = round(time.perf_counter() - STARTUP_STARTED, 4)
+    if WARMUP_ON_STARTUP:
+        # Runs in a worker thread so the server starts accepting connections right away
+        app.state.warmup_future = asyncio.get_event_loop().run_in_executor(None, warm_up)
+
+@app.get("/api/ready")
+async def readiness():
+    ffmpeg_path = get_ffmpeg_path() if imageio_ffmpeg.is_loaded else None
+    ffprobe_path = get_ffprobe_path() if ffmpeg_path else None
+    components = {
+        "yt_dlp": yt_dlp.is_loaded,
+        "extractors": warmup_state.get("extractors", 0),
+        "ffmpeg": ffmpeg_path if ffmpeg_path and os.path.exists(ffmpeg_path) else None,
+        "ffprobe": ffprobe_path if ffprobe_path and os.path.exists(ffprobe_path) else None,
+        # Media probing falls back to ffmpeg's input summary when ffprobe is missing
+        "probe": "ffprobe" if ffprobe_path and os.path.exists(ffprobe_path) else "ffmpeg" if ffmpeg_path else None,
+        "http_client": httpx.is_loaded,
+    }
+    ready = warmup_state["finished"] if WARMUP_ON_STARTUP else True
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "warmup": warmup_state,
+            "components": components,
+            "timings": STARTUP_TIMINGS,
+        }
+    )
+
+STARTUP_TIMINGS["module_import_seconds"] = round(time.perf_counter() - STARTUP_STARTED, 4)
 
 if __name__ == "__main__":
     import uvicorn